@@ -0,0 +1,502 @@
+# encoding: utf-8
+"""价格策略离线回放：用历史 tick/K线数据重放 PriceMonitor 的告警逻辑
+
+与线上使用同一套规则（price_rules）、价格历史（PriceHistory）和告警抑制
+（AlertSuppressor），时间由数据中的时间戳驱动，不休眠、不访问网络。
+
+支持的数据格式:
+    - .ticks：TickStore 写入的二进制记录文件
+    - .csv：带表头时读取 timestamp/time/open_time 与 price/close 列；
+      无表头时 5 列及以上按币安 K 线处理（第 1 列开盘时间、第 5 列收盘价），
+      否则取前两列为时间戳和价格；毫秒时间戳自动换算为秒
+    - .parquet：需要安装 pandas，列名规则同 CSV
+
+用法:
+    python backtest.py data/BTCUSDT.ticks \\
+        --strategies '[{"interval": 60, "up_threshold": 3, "down_threshold": 3}]' \\
+        --sweep up_threshold=1,2,3 --sweep interval=60,300 --json result.json
+
+默认按轮询方式在策略到期时检查，--every-tick 按流式价格源在每个 tick 检查。
+安装了 NumPy 时使用向量化计算（--scalar 强制逐条计算），两种方式结果一致。
+"""
+import argparse
+import bisect
+import csv
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+
+from price_rules import RULE_CHANGE, RULE_DRAWDOWN, RULE_RALLY, create_rule, load_numpy
+from utils.cache import AlertSuppressor
+from utils.indicators import StreamingIndicators
+from utils.price_history import PRICE_HISTORY_MAX_AGE, PriceHistory
+
+np = load_numpy()
+
+TIMESTAMP_COLUMNS = ("timestamp", "time", "ts", "open_time", "datetime", "date")
+PRICE_COLUMNS = ("price", "close", "c", "last")
+# 大于该值的时间戳视为毫秒
+MILLISECOND_THRESHOLD = 1e11
+# 与线上配置 ALERT_COOLDOWN / ALERT_ESCALATION_STEP 的默认值一致
+DEFAULT_COOLDOWN = 300.0
+DEFAULT_ESCALATION_STEP = 2.0
+
+
+def _to_seconds(value):
+    try:
+        timestamp = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+    return timestamp / 1000 if timestamp > MILLISECOND_THRESHOLD else timestamp
+
+
+def _pick_column(names, candidates):
+    lowered = [name.strip().lower() for name in names]
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered.index(candidate)
+    return None
+
+
+def load_ticks(path):
+    """读取价格数据，返回按时间排序的 (时间戳数组, 价格数组)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".ticks":
+        records = array("d")
+        with open(path, "rb") as f:
+            data = f.read()
+        records.frombytes(data[: len(data) - len(data) % (2 * records.itemsize)])
+        timestamps, prices = records[0::2], records[1::2]
+    elif extension == ".parquet":
+        timestamps, prices = _load_parquet(path)
+    else:
+        timestamps, prices = _load_csv(path)
+
+    if any(b < a for a, b in zip(timestamps, itertools.islice(timestamps, 1, None))):
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        timestamps = array("d", (timestamps[i] for i in order))
+        prices = array("d", (prices[i] for i in order))
+    return timestamps, prices
+
+
+def _load_csv(path):
+    timestamps, prices = array("d"), array("d")
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return timestamps, prices
+        time_column = _pick_column(first, TIMESTAMP_COLUMNS)
+        price_column = _pick_column(first, PRICE_COLUMNS)
+        if time_column is None or price_column is None:
+            # 无表头
+            time_column, price_column = (0, 4) if len(first) >= 5 else (0, 1)
+            reader = itertools.chain([first], reader)
+        for row in reader:
+            if not row:
+                continue
+            timestamps.append(_to_seconds(row[time_column]))
+            prices.append(float(row[price_column]))
+    return timestamps, prices
+
+
+def _load_parquet(path):
+    try:
+        import pandas as pd
+    except ImportError:
+        raise RuntimeError("读取 Parquet 文件需要安装 pandas 和 pyarrow")
+    frame = pd.read_parquet(path)
+    time_column = _pick_column(frame.columns, TIMESTAMP_COLUMNS)
+    price_column = _pick_column(frame.columns, PRICE_COLUMNS)
+    if time_column is None or price_column is None:
+        raise ValueError(f"无法识别时间戳或价格列: {list(frame.columns)}")
+    times = frame.iloc[:, time_column]
+    if pd.api.types.is_datetime64_any_dtype(times):
+        seconds = times.astype("int64") / 1e9
+    else:
+        seconds = times.astype(float)
+        seconds = seconds.where(seconds <= MILLISECOND_THRESHOLD, seconds / 1000)
+    return (
+        array("d", seconds.to_numpy(dtype=float)),
+        array("d", frame.iloc[:, price_column].to_numpy(dtype=float)),
+    )
+
+
+def default_tolerance(timestamps):
+    """线上容差为半个拉取间隔，这里用数据的典型采样间隔代替"""
+    if len(timestamps) < 2:
+        return 0.0
+    sample = timestamps[: 100_001]
+    return statistics.median(b - a for a, b in zip(sample, sample[1:])) / 2
+
+
+def check_points(timestamps, interval, tolerance, every_tick=False):
+    """模拟时钟下策略的检查时刻（tick 下标）
+
+    与 PriceMonitor._is_rule_due 一致：首个 tick 检查，之后距上次检查
+    达到 interval - tolerance 的第一个 tick 再次检查。
+    """
+    if every_tick:
+        return range(len(timestamps))
+    search = timestamps.searchsorted if hasattr(timestamps, "searchsorted") else None
+    points = array("q")
+    index = 0
+    while index < len(timestamps):
+        points.append(index)
+        target = timestamps[index] + interval - tolerance
+        if search is not None:
+            following = int(search(target, "left"))
+        else:
+            following = bisect.bisect_left(timestamps, target, index + 1)
+        index = max(following, index + 1)
+    return points
+
+
+def _history_capacity(timestamps, max_age):
+    """任意 max_age 窗口内（含窗口前最后一条）的最大 tick 数，保证价格历史不会按容量淘汰"""
+    capacity, start = 1, 0
+    for end, timestamp in enumerate(timestamps):
+        while start < end and timestamps[start + 1] <= timestamp - max_age:
+            start += 1
+        capacity = max(capacity, end - start + 1)
+    return capacity
+
+
+def _simulated_suppressor(cooldown, escalation_step):
+    clock = [0.0]
+    suppressor = AlertSuppressor(cooldown, escalation_step, clock=lambda: clock[0])
+    return suppressor, clock
+
+
+def _suppress(strategy, candidates, cooldown, escalation_step):
+    """按时间顺序对触发的检查应用告警冷却，返回实际发送的告警"""
+    suppressor, clock = _simulated_suppressor(cooldown, escalation_step)
+    alerts = []
+    for timestamp, price, reference, change in candidates:
+        clock[0] = timestamp
+        if suppressor.should_send_price_alert(
+            "backtest",
+            change,
+            0,
+            cooldown=strategy.get("cooldown"),
+            escalation_step=strategy.get("escalation_step"),
+        ):
+            alerts.append((timestamp, price, reference, change))
+    return alerts
+
+
+def replay_scalar(timestamps, prices, strategy, tolerance, every_tick=False,
+                  cooldown=DEFAULT_COOLDOWN, escalation_step=DEFAULT_ESCALATION_STEP):
+    """逐 tick 重放：与线上相同的 PriceHistory + 规则计算"""
+    rule = create_rule(strategy)
+    max_age = max(PRICE_HISTORY_MAX_AGE, rule.window)
+    history = PriceHistory(_history_capacity(timestamps, max_age), max_age)
+    rule.prepare(history)
+    due = bytearray(len(timestamps))
+    for index in check_points(timestamps, rule.interval, tolerance, every_tick):
+        due[index] = 1
+
+    indicators = StreamingIndicators() if rule.uses_sigma else None
+    candidates = []
+    for index, (timestamp, price) in enumerate(zip(timestamps, prices)):
+        history.append(timestamp, price)
+        if indicators is not None:
+            indicators.update(timestamp, price)
+        if not due[index]:
+            continue
+        result = rule.evaluate(history, price, timestamp, tolerance)
+        volatility = indicators.volatility(rule.window) if indicators is not None else None
+        if result is not None and rule.is_triggered(result[0], volatility):
+            candidates.append((timestamp, price, result[1], result[0]))
+    return _suppress(strategy, candidates, cooldown, escalation_step)
+
+
+def _range_reduce(values, left, right, reducer, identity, block=64):
+    """批量区间查询 reducer(values[left:right + 1])
+
+    分块预计算块内前缀/后缀结果，跨块的中间部分用块级稀疏表，
+    额外内存约为原数组的 3 倍，与窗口长度无关。
+    """
+    count = len(values)
+    blocks = -(-count // block)
+    padded = np.full(blocks * block, identity)
+    padded[:count] = values
+    grid = padded.reshape(blocks, block)
+    prefix = reducer.accumulate(grid, axis=1)
+    suffix = reducer.accumulate(grid[:, ::-1], axis=1)[:, ::-1]
+    levels = [reducer.reduce(grid, axis=1)]
+    while 1 << len(levels) <= blocks:
+        previous, half = levels[-1], 1 << (len(levels) - 1)
+        levels.append(reducer(previous[:-half], previous[half:]))
+
+    left_block, right_block = left // block, right // block
+    result = np.full(len(left), identity)
+    same = left_block == right_block
+    # 同一块内的短区间：逐个偏移累积
+    rows = np.flatnonzero(same)
+    if len(rows):
+        start, stop = left[rows], right[rows]
+        partial = np.full(len(rows), identity)
+        for offset in range(block):
+            position = start + offset
+            inside = position <= stop
+            if not inside.any():
+                break
+            partial = np.where(inside, reducer(partial, values[np.minimum(position, count - 1)]), partial)
+        result[rows] = partial
+    # 跨块区间：左块后缀 + 右块前缀 + 中间整块
+    rows = np.flatnonzero(~same)
+    if len(rows):
+        lb, rb = left_block[rows], right_block[rows]
+        partial = reducer(suffix[lb, left[rows] % block], prefix[rb, right[rows] % block])
+        inner = rb - lb - 1
+        has_inner = inner > 0
+        if has_inner.any():
+            lo, length = lb[has_inner] + 1, inner[has_inner]
+            level = np.floor(np.log2(length)).astype(np.int64)
+            middle = np.empty(len(lo))
+            for k in np.unique(level):
+                selected = level == k
+                table = levels[k]
+                middle[selected] = reducer(
+                    table[lo[selected]], table[lo[selected] + length[selected] - (1 << k)]
+                )
+            partial[has_inner] = reducer(partial[has_inner], middle)
+        result[rows] = partial
+    return result
+
+
+def _volatility_at(timestamps, prices, points, window):
+    """各检查时刻规则窗口的波动率（%），样本不足为 NaN
+
+    流式指标依赖前一时刻的状态，无法向量化，逐 tick 更新后在检查时刻取值。
+    """
+    indicators = StreamingIndicators()
+    result = np.full(len(points), np.nan)
+    row = 0
+    for index, (timestamp, price) in enumerate(zip(timestamps.tolist(), prices.tolist())):
+        indicators.update(timestamp, price)
+        while row < len(points) and points[row] == index:
+            volatility = indicators.volatility(window)
+            if volatility is not None:
+                result[row] = volatility
+            row += 1
+        if row == len(points):
+            break
+    return result
+
+
+def replay_vectorized(timestamps, prices, strategy, tolerance, every_tick=False,
+                      cooldown=DEFAULT_COOLDOWN, escalation_step=DEFAULT_ESCALATION_STEP):
+    """向量化重放：一次性计算所有检查时刻的参考价格和涨跌幅
+
+    参考价格的取值规则与 PriceHistory 相同（含 max_age 淘汰），
+    只有触发阈值的检查时刻才逐条经过告警冷却判断。
+    """
+    rule = create_rule(strategy)
+    max_age = max(PRICE_HISTORY_MAX_AGE, rule.window)
+    timestamps = np.asarray(timestamps, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    points = np.asarray(
+        check_points(timestamps, rule.interval, tolerance, every_tick), dtype=np.int64
+    )
+    if not len(points):
+        return []
+    now = timestamps[points]
+    # 检查时刻价格历史中保留的最早 tick（最后一条不晚于 now - max_age 的 tick）
+    oldest = np.maximum(np.searchsorted(timestamps, now - max_age, "right") - 1, 0)
+
+    if rule.kind == RULE_CHANGE:
+        index = np.searchsorted(timestamps, now - rule.window + tolerance, "right") - 1
+        index = np.minimum(index, points)
+        valid = index >= oldest
+        references = prices[np.maximum(index, 0)]
+    elif rule.kind in (RULE_DRAWDOWN, RULE_RALLY):
+        start = np.maximum(np.searchsorted(timestamps, now - rule.window, "left"), oldest)
+        start = np.minimum(start, points)
+        if rule.kind == RULE_DRAWDOWN:
+            references = _range_reduce(prices, start, points, np.maximum, -np.inf)
+        else:
+            references = _range_reduce(prices, start, points, np.minimum, np.inf)
+        valid = np.ones(len(points), dtype=bool)
+    else:
+        raise ValueError(f"向量化回放不支持的规则类型: {rule.kind}")
+
+    current = prices[points]
+    valid &= references != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = (current - references) / references * 100
+    up, down = rule.up_threshold, rule.down_threshold
+    if rule.uses_sigma:
+        # 与 combine_threshold 一致：波动率为 NaN（样本不足）时只按百分比阈值判断
+        volatility = _volatility_at(timestamps, prices, points, rule.window)
+        known = ~np.isnan(volatility)
+        if rule.up_sigma:
+            up = np.where(
+                known, np.maximum(0.0 if math.isinf(up) else up, rule.up_sigma * volatility), up
+            )
+        if rule.down_sigma:
+            down = np.where(
+                known,
+                np.maximum(0.0 if math.isinf(down) else down, rule.down_sigma * volatility),
+                down,
+            )
+    fired = valid & ((changes >= up) | (changes <= -down))
+    rows = np.flatnonzero(fired)
+    rows = rows[
+        _suppress_rows(
+            now[rows],
+            changes[rows],
+            strategy.get("cooldown", cooldown),
+            strategy.get("escalation_step", escalation_step),
+        )
+    ]
+    return list(
+        zip(now[rows].tolist(), current[rows].tolist(), references[rows].tolist(), changes[rows].tolist())
+    )
+
+
+def _suppress_rows(times, changes, cooldown, escalation_step):
+    """与 AlertSuppressor.should_send_price_alert 等价的告警冷却，返回实际发送的行号
+
+    每个方向从一次发送跳到下一次发送：冷却期内只查找涨跌幅扩大到升级阈值的行，
+    冷却期外的第一行必然发送，避免逐行判断。
+    """
+    sent = []
+    for mask in (changes > 0, changes <= 0):
+        rows = np.flatnonzero(mask)
+        row_times, magnitudes = times[rows], np.abs(changes[rows])
+        position = 0
+        while position < len(rows):
+            sent.append(rows[position])
+            # 冷却期内（含到期时刻）的行
+            end = int(np.searchsorted(row_times, row_times[position] + cooldown, "right"))
+            escalated = magnitudes[position + 1 : end] >= magnitudes[position] + escalation_step
+            position = position + 1 + int(escalated.argmax()) if escalated.any() else end
+    return np.sort(np.array(sent, dtype=np.int64))
+
+
+def expand_sweep(strategies, sweeps):
+    """按 --sweep key=v1,v2 展开参数组合"""
+    if not sweeps:
+        return list(strategies)
+    keys, choices = [], []
+    for sweep in sweeps:
+        key, _, values = sweep.partition("=")
+        if not values:
+            raise ValueError(f"无效的参数扫描: {sweep}")
+        keys.append(key.strip())
+        choices.append([json.loads(value) for value in values.split(",")])
+    expanded = []
+    for strategy in strategies:
+        for combination in itertools.product(*choices):
+            expanded.append({**strategy, **dict(zip(keys, combination))})
+    return expanded
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def summarize(strategy, alerts, days):
+    up = sum(1 for alert in alerts if alert[3] > 0)
+    return {
+        "strategy": strategy,
+        "alerts": len(alerts),
+        "up": up,
+        "down": len(alerts) - up,
+        "alerts_per_day": len(alerts) / days if days else float(len(alerts)),
+        "alert_times": [_isoformat(alert[0]) for alert in alerts],
+    }
+
+
+def run_backtest(timestamps, prices, strategies, every_tick=False, scalar=False,
+                 tolerance=None, cooldown=DEFAULT_COOLDOWN,
+                 escalation_step=DEFAULT_ESCALATION_STEP):
+    """对每个策略重放价格数据，返回汇总结果"""
+    if tolerance is None:
+        tolerance = default_tolerance(timestamps)
+    vectorized = not scalar and np is not None
+    replay = replay_vectorized if vectorized else replay_scalar
+    if vectorized:
+        timestamps = np.asarray(timestamps, dtype=float)
+        prices = np.asarray(prices, dtype=float)
+
+    days = (timestamps[-1] - timestamps[0]) / 86400 if len(timestamps) else 0
+    results = []
+    started_at = time.perf_counter()
+    for strategy in strategies:
+        alerts = replay(timestamps, prices, strategy, tolerance, every_tick,
+                        cooldown, escalation_step)
+        results.append(summarize(strategy, alerts, days))
+    elapsed = time.perf_counter() - started_at
+    return {
+        "ticks": len(timestamps),
+        "start": _isoformat(timestamps[0]) if len(timestamps) else None,
+        "end": _isoformat(timestamps[-1]) if len(timestamps) else None,
+        "days": days,
+        "mode": "vectorized" if vectorized else "scalar",
+        "check": "every_tick" if every_tick else "interval",
+        "tolerance": tolerance,
+        "elapsed": elapsed,
+        "ticks_per_sec": len(timestamps) * len(strategies) / elapsed if elapsed else math.inf,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="价格策略离线回放")
+    parser.add_argument("data", help="价格数据文件（.ticks/.csv/.parquet）")
+    parser.add_argument(
+        "--strategies",
+        default='[{"interval": 60, "up_threshold": 3, "down_threshold": 3}]',
+        help="策略列表 JSON，格式同 PRICE_MONITOR_CONFIG 中单个交易对的策略",
+    )
+    parser.add_argument("--sweep", action="append", default=[],
+                        help="参数扫描，如 up_threshold=1,2,3，可重复")
+    parser.add_argument("--every-tick", action="store_true", help="按流式价格源在每个 tick 检查")
+    parser.add_argument("--scalar", action="store_true", help="强制逐条计算")
+    parser.add_argument("--tolerance", type=float, help="检查时间容差（秒），默认取半个采样间隔")
+    parser.add_argument("--cooldown", type=float, default=DEFAULT_COOLDOWN)
+    parser.add_argument("--escalation-step", type=float, default=DEFAULT_ESCALATION_STEP)
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    strategies = expand_sweep(json.loads(args.strategies), args.sweep)
+    timestamps, prices = load_ticks(args.data)
+    if not len(timestamps):
+        print(f"{args.data} 中没有价格数据", file=sys.stderr)
+        return 1
+
+    report = run_backtest(
+        timestamps, prices, strategies,
+        every_tick=args.every_tick,
+        scalar=args.scalar,
+        tolerance=args.tolerance,
+        cooldown=args.cooldown,
+        escalation_step=args.escalation_step,
+    )
+    print(
+        f"{report['ticks']} 个 tick，{report['days']:.1f} 天，{report['mode']} 模式，"
+        f"耗时 {report['elapsed']:.2f} 秒（{report['ticks_per_sec']:,.0f} tick/秒）"
+    )
+    for result in report["results"]:
+        print(
+            f"{json.dumps(result['strategy'], ensure_ascii=False)}: "
+            f"告警 {result['alerts']} 次（上涨 {result['up']} / 下跌 {result['down']}），"
+            f"{result['alerts_per_day']:.2f} 次/天"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
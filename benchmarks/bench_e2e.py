@@ -0,0 +1,598 @@
+# encoding: utf-8
+"""端到端基准测试：用本地模拟的币安、钉钉和 Telegram 测量告警从行情变化到送达的延迟
+
+模拟服务运行在独立进程中（CPU 和内存只统计被测进程）：
+- 币安 REST（/api/v3/ticker/price，单个交易对和 symbols 批量）和组合行情流（/stream）
+  按脚本化的价格路径报价：小幅正弦波动叠加定时跳变，每个交易对第偶数次跳变上涨、
+  第奇数次回落，跳变时刻由随机种子确定
+- 钉钉机器人接口记录每条消息的到达时间
+被测进程按 .env 的方式设置环境变量，运行真实的 PriceMonitor（价格源指向模拟服务），
+并按固定速率向 TelegramNotifier.on_channel_message 注入合成的 Telethon 频道消息，
+其中一部分命中关键词，经处理链发送钉钉通知。
+
+测量窗口结束后再等待 --drain 秒让在途告警送达，然后以 JSON 输出：
+- 价格告警端到端延迟（跳变时刻 -> 钉钉收到）和 Telegram 通知端到端延迟
+  （注入 -> 钉钉收到）的分位数，以及漏报、重复告警数
+- 每秒轮询请求数和交易对数、行情推送数、Telegram 消息数
+- 被测进程的 CPU 占用、常驻内存和事件循环延迟
+- 复现所需的全部参数和环境信息：同一参数和种子下价格路径和消息序列完全相同
+
+用法: python benchmarks/bench_e2e.py [--source rest|batch|websocket] [--symbols 200]
+      [--duration 30] [--messages-per-sec 100] [--seed 1] [--output result.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 合成消息中的关注关键词和正文
+KEYWORD = "TGE"
+FILLER = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor."
+# 价格告警和 Telegram 通知在钉钉消息中的标记（合并发送时一条消息包含多条）
+ALERT_PATTERN = re.compile(r"\*\*(\w+)价格波动告警通知\*\*.*?变化幅度：(上涨|下跌)", re.S)
+MESSAGE_PATTERN = re.compile(r"bench#(\d+)\b")
+# 等待模拟服务进程启动的最长时间（秒）
+SERVER_STARTUP = 5
+# 资源和事件循环延迟的采样间隔（秒）
+SAMPLE_INTERVAL = 0.5
+
+
+class PricePath:
+    """脚本化价格路径：基准价 × (1 + 正弦波动) × 跳变状态"""
+
+    def __init__(self, symbols, seed, start, jump_every, jump_percent, wobble_percent=0.05):
+        rng = random.Random(seed)
+        self.start = start
+        self.jump_every = jump_every
+        self.jump_factor = 1 + jump_percent / 100
+        self.wobble = wobble_percent / 100
+        # 交易对 -> (基准价, 首次跳变相对 start 的偏移, 波动相位)
+        self.params = {
+            symbol: (
+                rng.uniform(1, 1000), rng.uniform(0, jump_every), rng.uniform(0, 2 * math.pi)
+            )
+            for symbol in symbols
+        }
+
+    def price(self, symbol, timestamp):
+        base, offset, phase = self.params[symbol]
+        index = math.floor((timestamp - self.start - offset) / self.jump_every)
+        level = self.jump_factor if index >= 0 and index % 2 == 0 else 1.0
+        return base * level * (1 + self.wobble * math.sin(timestamp / 7 + phase))
+
+    def jumps(self, symbol, until):
+        """until 之前的跳变 [(时刻, 方向)]，方向 1 为上涨、-1 为回落"""
+        _, offset, _ = self.params[symbol]
+        result = []
+        index = 0
+        while self.start + offset + index * self.jump_every < until:
+            result.append((self.start + offset + index * self.jump_every, 1 - 2 * (index % 2)))
+            index += 1
+        return result
+
+
+class FakeServices:
+    """模拟的币安 REST/行情流和钉钉机器人接口"""
+
+    def __init__(self, path, ws_interval=1.0, rest_latency=0.0):
+        self.path = path
+        self.ws_interval = ws_interval
+        self.rest_latency = rest_latency
+        self.rest_requests = 0
+        self.rest_symbols = 0
+        self.ws_connections = 0
+        self.ws_messages = 0
+        # [(到达时间, 标题, 正文)]
+        self.ding = []
+
+    def app(self):
+        # 批量请求的 symbols 参数可能很长
+        app = web.Application(handler_args={"max_line_size": 1 << 20})
+        app.router.add_get("/api/v3/ticker/price", self.ticker)
+        app.router.add_get("/stream", self.stream)
+        app.router.add_post("/robot/send", self.robot)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def ticker(self, request):
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        now = time.time()
+        self.rest_requests += 1
+        single = request.query.get("symbol")
+        if single is not None:
+            symbols = [single]
+        elif "symbols" in request.query:
+            symbols = json.loads(request.query["symbols"])
+        else:
+            symbols = list(self.path.params)
+        if any(symbol not in self.path.params for symbol in symbols):
+            return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400)
+        self.rest_symbols += len(symbols)
+        data = [
+            {"symbol": symbol, "price": f"{self.path.price(symbol, now):.8f}"}
+            for symbol in symbols
+        ]
+        return web.json_response(data[0] if single is not None else data)
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.ws_connections += 1
+        streams = {name for name in request.query.get("streams", "").split("/") if name}
+        pusher = asyncio.create_task(self._push(ws, streams))
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                params = set(payload.get("params", []))
+                if payload.get("method") == "SUBSCRIBE":
+                    streams |= params
+                elif payload.get("method") == "UNSUBSCRIBE":
+                    streams -= params
+                await ws.send_json({"result": None, "id": payload.get("id")})
+        finally:
+            pusher.cancel()
+        return ws
+
+    async def _push(self, ws, streams):
+        """按固定节奏推送所有订阅交易对的 miniTicker"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while not ws.closed:
+            now = time.time()
+            for name in list(streams):
+                symbol = name.split("@")[0].upper()
+                if symbol not in self.path.params:
+                    continue
+                data = {
+                    "e": "24hrMiniTicker",
+                    "E": int(now * 1000),
+                    "s": symbol,
+                    "c": f"{self.path.price(symbol, now):.8f}",
+                }
+                await ws.send_str(json.dumps({"stream": name, "data": data}))
+                self.ws_messages += 1
+            deadline += self.ws_interval
+            await asyncio.sleep(max(deadline - loop.time(), 0))
+
+    async def robot(self, request):
+        payload = await request.json()
+        markdown = payload["markdown"]
+        self.ding.append((time.time(), markdown["title"], markdown["text"]))
+        return web.json_response({"errcode": 0, "errmsg": "ok"})
+
+    async def stats(self, request):
+        data = {
+            "rest_requests": self.rest_requests,
+            "rest_symbols": self.rest_symbols,
+            "ws_connections": self.ws_connections,
+            "ws_messages": self.ws_messages,
+            "ding_requests": len(self.ding),
+        }
+        if request.query.get("ding"):
+            data["ding"] = self.ding
+        return web.json_response(data)
+
+
+def serve(path_options, ws_interval, rest_latency, ports):
+    """模拟服务进程入口：监听随机端口，通过队列返回端口号"""
+
+    async def main():
+        services = FakeServices(PricePath(**path_options), ws_interval, rest_latency)
+        runner = web.AppRunner(services.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        ports.put(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def configure(args, symbols, channels, base_url, workdir):
+    """按 .env 的方式设置被测进程的配置，必须在导入项目模块之前调用"""
+    from telethon.tl.types import PeerChannel
+    from telethon.utils import get_peer_id
+
+    strategy = {
+        "interval": args.interval,
+        "window": args.window,
+        "up_threshold": args.threshold,
+        "down_threshold": args.threshold,
+    }
+    os.environ.update(
+        {
+            "ENV": "PROD",
+            "API_ID": "1",
+            "API_HASH": "bench",
+            "DING_URL": f"{base_url}/robot/send",
+            "DING_SECRET": "bench",
+            "DING_TOKEN": "bench",
+            "DING_RATE_LIMIT": str(args.ding_rate),
+            "BINANCE_API_HOSTS": base_url,
+            "PRICE_WS_URL": "ws" + base_url[len("http"):],
+            "PRICE_SOURCE": args.source,
+            "PRICE_MONITOR_CONFIG": json.dumps({symbol: [strategy] for symbol in symbols}),
+            # 冷却期覆盖同方向的下一次跳变之前，每次跳变只告警一次
+            "ALERT_COOLDOWN": str(args.jump_every),
+            # 路由表使用带前缀的频道 ID（与 event.chat_id 一致）
+            "TELEGRAM_ROUTES": json.dumps(
+                {
+                    str(get_peer_id(PeerChannel(channel))): ["keyword", "notify"]
+                    for channel in channels
+                }
+            ),
+            "KEY_WORDS": KEYWORD,
+            "TELEGRAM_CURSOR_FILE": os.path.join(workdir, "telegram_cursors.json"),
+            "LOG_FILE": os.path.join(workdir, "sbot.log"),
+            "TICK_STORE_DIR": "",
+            "PRICE_WORKERS": "0",
+            "METRICS_PORT": "0",
+        }
+    )
+    # 配置模块从当前目录读取 .env，切换到空目录避免本地配置覆盖以上设置
+    os.chdir(workdir)
+
+
+def make_event(client, channel, message_id, text):
+    """构造与 Telethon 推送一致的新消息事件"""
+    from telethon import events
+    from telethon.tl.types import Message, PeerChannel
+
+    message = Message(
+        id=message_id,
+        peer_id=PeerChannel(channel),
+        date=datetime.now(timezone.utc),
+        message=text,
+    )
+    event = events.NewMessage.Event(message)
+    event._set_client(client)
+    return event
+
+
+async def inject_messages(notifier, channels, args, start, end, sent):
+    """按固定速率轮流向各频道注入消息，命中关键词的消息记录注入时间"""
+    rng = random.Random(args.seed + 1)
+    message_ids = dict.fromkeys(channels, 0)
+    count = 0
+    await asyncio.sleep(max(start - time.time(), 0))
+    while True:
+        now = time.time()
+        if now >= end:
+            return count
+        due = int((now - start) * args.messages_per_sec) + 1
+        while count < due:
+            channel = channels[count % len(channels)]
+            message_ids[channel] += 1
+            matched = rng.random() < args.keyword_ratio
+            text = f"bench#{count} {KEYWORD if matched else 'update'} {FILLER}"
+            event = make_event(notifier.client, channel, message_ids[channel], text)
+            if matched:
+                sent[count] = time.time()
+            await notifier.on_channel_message(event)
+            count += 1
+        await asyncio.sleep(0.01)
+
+
+def rss_bytes():
+    """当前常驻内存（字节），没有 /proc 的平台返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def sample_resources(samples, lags):
+    """定期采样常驻内存，并记录 sleep 唤醒的延迟（事件循环被阻塞的时间）"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + SAMPLE_INTERVAL
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        lags.append(max(loop.time() - expected, 0.0))
+        rss = rss_bytes()
+        if rss is not None:
+            samples.append(rss)
+
+
+def summarize(values, scale=1e3):
+    """最近秩分位数，默认换算为毫秒"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(q):
+        return ordered[min(max(math.ceil(q * len(ordered)) - 1, 0), len(ordered) - 1)] * scale
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3),
+        "p50": round(rank(0.5), 3),
+        "p90": round(rank(0.9), 3),
+        "p99": round(rank(0.99), 3),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+
+def match_alerts(path, records, end):
+    """把钉钉收到的价格告警对应到此前最近一次同方向的跳变
+
+    返回 (测量窗口内各跳变的首次告警延迟, 窗口内跳变数, 重复告警数, 无法对应的告警数)，
+    窗口结束后的跳变在等待期间触发的告警不计入。
+    """
+    until = max((arrival for arrival, _, _ in records), default=end)
+    jumps = {symbol: path.jumps(symbol, until) for symbol in path.params}
+    first = {}
+    duplicates = unmatched = 0
+    for arrival, _, text in records:
+        for symbol, trend in ALERT_PATTERN.findall(text):
+            direction = 1 if trend == "上涨" else -1
+            candidates = [
+                (index, at)
+                for index, (at, sign) in enumerate(jumps.get(symbol, []))
+                if sign == direction and at <= arrival
+            ]
+            if not candidates:
+                unmatched += 1
+                continue
+            index, at = candidates[-1]
+            if at >= end:
+                continue
+            if (symbol, index) in first:
+                duplicates += 1
+            else:
+                first[symbol, index] = arrival - at
+    expected = sum(1 for items in jumps.values() for at, _ in items if at < end)
+    return list(first.values()), expected, duplicates, unmatched
+
+
+def match_messages(sent, records):
+    latencies = {}
+    for arrival, _, text in records:
+        for number in MESSAGE_PATTERN.findall(text):
+            number = int(number)
+            if number in sent and number not in latencies:
+                latencies[number] = arrival - sent[number]
+    return list(latencies.values())
+
+
+async def fetch_stats(session, base_url, ding=False):
+    async with session.get(f"{base_url}/stats", params={"ding": "1"} if ding else {}) as response:
+        return await response.json()
+
+
+async def run_benchmark(args, path, channels, base_url):
+    from price_monitor import PriceMonitor
+    from telegram_notifier import TelegramNotifier
+    from utils.dingtalk import close_dispatcher
+
+    monitor = PriceMonitor()
+    notifier = TelegramNotifier()
+    notifier.start_pipeline()
+    start, end = path.start, path.start + args.duration
+    sent = {}
+    rss_samples, loop_lags = [], []
+    tasks = [
+        asyncio.create_task(monitor.start_monitoring()),
+        asyncio.create_task(sample_resources(rss_samples, loop_lags)),
+    ]
+    injector = asyncio.create_task(inject_messages(notifier, channels, args, start, end, sent))
+
+    async with aiohttp.ClientSession() as session:
+        # 预热：建立连接、积累价格历史窗口
+        await asyncio.sleep(max(start - time.time(), 0))
+        before = await fetch_stats(session, base_url)
+        processed_before = notifier.pipeline.stats()["processed"]
+        cpu_before, wall_before = time.process_time(), time.perf_counter()
+        rss_samples.clear()
+        loop_lags.clear()
+
+        injected = await injector
+        await asyncio.sleep(max(end - time.time(), 0))
+        cpu, wall = time.process_time() - cpu_before, time.perf_counter() - wall_before
+        after = await fetch_stats(session, base_url)
+        pipeline = notifier.pipeline.stats()
+        peak_rss = peak_rss_bytes()
+        rss_window = list(rss_samples)
+        lag_window = list(loop_lags)
+
+        # 等待在途的告警和通知送达
+        await asyncio.sleep(args.drain)
+        records = (await fetch_stats(session, base_url, ding=True))["ding"]
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await notifier.pipeline.stop()
+    await close_dispatcher()
+
+    alert_latencies, jumps, duplicates, unmatched = match_alerts(path, records, end)
+    message_latencies = match_messages(sent, records)
+
+    def rate(key):
+        return round((after[key] - before[key]) / wall, 2)
+
+    return {
+        "alerts": {
+            "jumps": jumps,
+            "delivered": len(alert_latencies),
+            "missed": jumps - len(alert_latencies),
+            "duplicates": duplicates,
+            "unmatched": unmatched,
+            "latency_ms": summarize(alert_latencies),
+        },
+        "telegram": {
+            "injected": injected,
+            "injected_per_sec": round(injected / wall, 2),
+            "processed_per_sec": round((pipeline["processed"] - processed_before) / wall, 2),
+            "backlog": pipeline["pending"] + pipeline["in_progress"],
+            "dropped": pipeline["dropped"],
+            "notifications": len(sent),
+            "delivered": len(message_latencies),
+            "latency_ms": summarize(message_latencies),
+        },
+        "throughput": {
+            "poll_requests_per_sec": rate("rest_requests"),
+            "polled_symbols_per_sec": rate("rest_symbols"),
+            "ws_messages_per_sec": rate("ws_messages"),
+            "ding_requests_per_sec": rate("ding_requests"),
+        },
+        "process": {
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / wall * 100, 2),
+            "rss_mb": round(max(rss_window) / 2**20, 2) if rss_window else None,
+            "peak_rss_mb": round(peak_rss / 2**20, 2) if peak_rss else None,
+            "event_loop_lag_ms": summarize(lag_window),
+            "event_loop": type(asyncio.get_running_loop()).__module__.split(".")[0],
+        },
+    }
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def environment():
+    import telethon
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "aiohttp": aiohttp.__version__,
+        "telethon": telethon.__version__,
+        "revision": git_revision(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--source", choices=["rest", "batch", "websocket"], default="rest")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=1, help="策略检查间隔（秒）")
+    parser.add_argument("--window", type=float, default=5, help="涨跌幅窗口（秒）")
+    parser.add_argument("--threshold", type=float, default=3, help="涨跌幅阈值（%%）")
+    parser.add_argument("--jump", type=float, default=5, help="价格跳变幅度（%%）")
+    parser.add_argument("--jump-every", type=float, default=20, help="每个交易对的跳变间隔（秒）")
+    parser.add_argument("--ws-interval", type=float, default=1.0, help="行情流推送间隔（秒）")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="REST 响应延迟（秒）")
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--messages-per-sec", type=float, default=100)
+    parser.add_argument("--keyword-ratio", type=float, default=0.1, help="命中关键词的消息比例")
+    parser.add_argument("--ding-rate", type=int, default=100000, help="钉钉每分钟发送上限")
+    parser.add_argument("--warmup", type=float, default=8, help="预热时间（秒），应大于 --window")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--drain", type=float, default=3, help="结束后等待在途告警的时间（秒）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-logging", action="store_true", help="关闭日志（默认与线上一样写日志文件）")
+    parser.add_argument("--output", help="JSON 结果另存到文件")
+    args = parser.parse_args()
+    if args.window >= args.jump_every:
+        parser.error("--window 应小于 --jump-every，否则相邻两次跳变会互相抵消")
+
+    symbols = [f"B{index:04d}USDT" for index in range(args.symbols)]
+    channels = [1000000 + index for index in range(args.channels)]
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    # 两个进程按相同参数生成同一条价格路径，起点留出模拟服务启动和预热的时间
+    path_options = {
+        "symbols": symbols,
+        "seed": args.seed,
+        "start": time.time() + SERVER_STARTUP + args.warmup,
+        "jump_every": args.jump_every,
+        "jump_percent": args.jump,
+    }
+    output = os.path.abspath(args.output) if args.output else None
+    server = None
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="sbot-bench-")
+    stderr = sys.stderr
+    try:
+        server = context.Process(
+            target=serve,
+            args=(path_options, args.ws_interval, args.rest_latency, ports),
+            name="sbot-bench-fakes",
+        )
+        server.start()
+        base_url = f"http://127.0.0.1:{ports.get(timeout=SERVER_STARTUP)}"
+        configure(args, symbols, channels, base_url, workdir)
+        path = PricePath(**path_options)
+
+        from sbot import run_event_loop, start_logging
+        from utils.log import shutdown_logging
+
+        if args.no_logging:
+            import logging
+
+            logging.disable(logging.CRITICAL)
+        else:
+            # 控制台日志丢弃，只写日志文件
+            sys.stderr = open(os.devnull, "w")
+            start_logging()
+        try:
+            results = run_event_loop(run_benchmark(args, path, channels, base_url))
+        finally:
+            shutdown_logging()
+            if sys.stderr is not stderr:
+                sys.stderr.close()
+                sys.stderr = stderr
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "parameters": vars(args),
+        "environment": environment(),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
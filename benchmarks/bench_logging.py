@@ -0,0 +1,134 @@
+# encoding: utf-8
+"""日志基准测试：比较同步写入与后台线程批量写入对事件循环的阻塞
+
+事件循环中一个协程按固定节奏写日志（模拟价格轮询和消息处理的热路径），
+另一个协程每毫秒醒来一次，统计实际唤醒时间比预期晚了多少（事件循环停顿）。
+--flush-delay 模拟磁盘写入延迟（每次 flush 额外阻塞的毫秒数）。
+
+用法: python benchmarks/bench_logging.py [--records 20000] [--burst 20] [--flush-delay 0.5]
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import log  # noqa: E402
+from utils.log import setup_logging, shutdown_logging  # noqa: E402
+
+PAYLOAD = {"symbol": "BTCUSDT", "price": "67321.12000000"}
+
+
+async def probe(stop, lags, interval=0.001):
+    """每 interval 秒唤醒一次，记录唤醒延迟"""
+    loop = asyncio.get_running_loop()
+    expected = loop.time() + interval
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = loop.time()
+        lags.append(max(now - expected, 0.0))
+        expected = now + interval
+
+
+class SlowStream:
+    """包装文件流，每次 flush 额外阻塞 delay 秒"""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+        time.sleep(self.delay)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+async def produce(records, burst):
+    """每毫秒连续写 burst 条日志，返回调用方耗时"""
+    spent = 0.0
+    for i in range(0, records, burst):
+        began = time.perf_counter()
+        for j in range(burst):
+            logging.info(f"获取BTCUSDT价格成功，数据: {PAYLOAD} #{i + j}")
+        spent += time.perf_counter() - began
+        await asyncio.sleep(0.001)
+    return spent
+
+
+async def run_case(records, burst):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, lags))
+    await asyncio.sleep(0.01)
+    spent = await produce(records, burst)
+    stop.set()
+    await probe_task
+    return spent, lags
+
+
+def _listener_handlers():
+    return log._listener.handlers if log._listener is not None else ()
+
+
+def reset_logging():
+    handlers = list(_listener_handlers())
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers) + handlers:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--flush-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(
+        f"{'模式':<12} {'flush延迟(ms)':>13} {'单条耗时(µs)':>14} "
+        f"{'停顿p50(ms)':>12} {'停顿p99(ms)':>12} {'最大停顿(ms)':>13}"
+    )
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        cases = [
+            ("同步", dict(async_mode=False)),
+            ("异步批量", dict(async_mode=True)),
+            ("异步+JSON", dict(async_mode=True, json_format=True)),
+            ("异步+限流", dict(async_mode=True, info_rate=600)),
+        ]
+        for delay, (name, options) in itertools.product((0.0, args.flush_delay), cases):
+            # 控制台输出重定向到空设备，只保留格式化和写文件的开销
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                setup_logging(log_file=os.path.join(directory, f"{name}.log"), **options)
+                if delay:
+                    for handler in logging.getLogger().handlers + list(_listener_handlers()):
+                        if isinstance(handler, RotatingFileHandler):
+                            handler.stream = SlowStream(handler.stream, delay / 1000)
+                spent, lags = asyncio.run(run_case(args.records, args.burst))
+                reset_logging()
+            finally:
+                sys.stderr = stderr
+            lags.sort()
+            print(
+                f"{name:<12} {delay:>13g} {spent / args.records * 1e6:>14.1f} "
+                f"{statistics.median(lags) * 1e3:>12.3f} "
+                f"{lags[int(len(lags) * 0.99)] * 1e3:>12.3f} {lags[-1] * 1e3:>13.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
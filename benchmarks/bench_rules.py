@@ -0,0 +1,114 @@
+# encoding: utf-8
+"""规则检查基准测试：比较逐条计算与向量化批量计算的每秒处理 tick 数
+
+只统计规则检查耗时（参考价格查询 + 涨跌幅计算 + 阈值判断），不含价格历史写入。
+
+用法: python benchmarks/bench_rules.py [--ticks 200]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_rules import RuleBatch, create_rule, load_numpy  # noqa: E402
+from utils.price_history import PriceHistory  # noqa: E402
+
+np = load_numpy()
+
+RULES_PER_SYMBOL = 5
+STRATEGY_TEMPLATES = [
+    {"interval": 60, "up_threshold": 3, "down_threshold": 3},
+    {"interval": 60, "window": 3600, "up_threshold": 5, "down_threshold": 5},
+    {"interval": 60, "type": "drawdown", "window": 3600, "down_threshold": 5},
+    {"interval": 60, "type": "rally", "window": 3600, "up_threshold": 5},
+    {"interval": 300, "up_threshold": 2, "down_threshold": 2},
+]
+
+
+def build(rule_count, warmup_ticks=3600):
+    """构建规则和预热好的价格历史"""
+    symbol_count = max(1, math.ceil(rule_count / RULES_PER_SYMBOL))
+    symbols = [f"SYM{i}USDT" for i in range(symbol_count)]
+    entries = []
+    for i in range(rule_count):
+        symbol = symbols[i % symbol_count]
+        entries.append((symbol, create_rule(STRATEGY_TEMPLATES[i % len(STRATEGY_TEMPLATES)])))
+
+    histories = {symbol: PriceHistory(capacity=2 * warmup_ticks) for symbol in symbols}
+    for symbol, rule in entries:
+        rule.prepare(histories[symbol])
+    prices = {symbol: 100.0 for symbol in symbols}
+    for tick in range(warmup_ticks):
+        step(histories, prices, float(tick))
+    return entries, histories, prices
+
+
+def step(histories, prices, now):
+    for symbol, history in histories.items():
+        prices[symbol] *= 1 + random.gauss(0, 0.001)
+        history.append(now, prices[symbol])
+
+
+def run_scalar(entries, histories, prices, ticks, start):
+    fired = 0
+    elapsed = 0.0
+    for tick in range(ticks):
+        now = start + tick
+        step(histories, prices, now)
+        began = time.perf_counter()
+        for symbol, rule in entries:
+            result = rule.evaluate(histories[symbol], prices[symbol], now)
+            if result is not None and rule.is_triggered(result[0]):
+                fired += 1
+        elapsed += time.perf_counter() - began
+    return ticks / elapsed, fired
+
+
+def run_vectorized(entries, histories, prices, ticks, start):
+    batch = RuleBatch(entries)
+    fired = 0
+    elapsed = 0.0
+    for tick in range(ticks):
+        now = start + tick
+        step(histories, prices, now)
+        began = time.perf_counter()
+        row_prices = [prices[symbol] for symbol, _ in entries]
+        references = [
+            rule.reference_price(histories[symbol], now) or math.nan
+            for symbol, rule in entries
+        ]
+        fired += len(batch.evaluate(row_prices, references))
+        elapsed += time.perf_counter() - began
+    return ticks / elapsed, fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"NumPy: {'已安装' if np is not None else '未安装（向量化路径退化为逐条计算）'}")
+    print(f"{'规则数':>8} {'逐条 ticks/s':>14} {'向量化 ticks/s':>16} {'加速比':>8}")
+    for rule_count in (10, 100, 1000):
+        random.seed(rule_count)
+        entries, histories, prices = build(rule_count)
+        scalar_rate, scalar_fired = run_scalar(entries, histories, prices, args.ticks, 3600.0)
+
+        random.seed(rule_count)
+        entries, histories, prices = build(rule_count)
+        vector_rate, vector_fired = run_vectorized(
+            entries, histories, prices, args.ticks, 3600.0
+        )
+        assert scalar_fired == vector_fired, "两种计算方式结果不一致"
+        print(
+            f"{rule_count:>8} {scalar_rate:>14.1f} {vector_rate:>16.1f} "
+            f"{vector_rate / scalar_rate:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# encoding: utf-8
+"""调度器基准测试：比较每个任务一个休眠协程与单个时间轮调度器
+
+模拟大量交易对按不同间隔轮询，统计每次执行相对计划时间
+（首次时间 + n * 间隔）的延迟分布和整个过程的 CPU 占用。
+每个任务一个协程的方式在执行后再休眠一个间隔，延迟会随执行次数累积（漂移）。
+
+用法: python benchmarks/bench_scheduler.py [--jobs 10000] [--duration 10] [--work 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.timing_wheel import WheelScheduler  # noqa: E402
+
+INTERVALS = (0.5, 1.0, 2.0, 5.0)
+
+
+def busy(microseconds):
+    """模拟每次执行的同步开销（解析行情、检查规则）"""
+    end = time.perf_counter() + microseconds / 1e6
+    while time.perf_counter() < end:
+        pass
+
+
+def make_jobs(count, seed=1):
+    rng = random.Random(seed)
+    return [(f"SYM{i}", INTERVALS[i % len(INTERVALS)], rng.uniform(0, 1)) for i in range(count)]
+
+
+async def run_tasks(jobs, duration, work):
+    lags = []
+    started_at = time.monotonic()
+
+    async def poll(interval, phase):
+        await asyncio.sleep(phase)
+        first = time.monotonic()
+        runs = 0
+        while True:
+            lags.append(time.monotonic() - (first + runs * interval))
+            runs += 1
+            busy(work)
+            await asyncio.sleep(interval)
+
+    tasks = [asyncio.create_task(poll(interval, phase)) for _, interval, phase in jobs]
+    await asyncio.sleep(duration - (time.monotonic() - started_at))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return lags, len(lags)
+
+
+async def run_wheel(jobs, duration, work, tick):
+    lags = []
+    batches = 0
+
+    def on_due(due, now):
+        nonlocal batches
+        batches += 1
+        for job in due:
+            lags.append(job.last_lag)
+            busy(work)
+
+    scheduler = WheelScheduler(on_due, tick=tick)
+    for key, interval, phase in jobs:
+        scheduler.add(key, interval, delay=phase)
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(duration)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return lags, batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--work", type=float, default=20.0, help="每次执行的开销（微秒）")
+    parser.add_argument("--tick", type=float, default=0.05)
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.jobs)
+    print(
+        f"{'调度方式':<10} {'执行次数':>9} {'唤醒批次':>8} {'延迟p50(ms)':>12} "
+        f"{'延迟p99(ms)':>12} {'最大延迟(ms)':>13} {'CPU(s)':>8}"
+    )
+    cases = [
+        ("每任务协程", lambda: run_tasks(jobs, args.duration, args.work)),
+        ("时间轮", lambda: run_wheel(jobs, args.duration, args.work, args.tick)),
+    ]
+    for name, case in cases:
+        cpu = time.process_time()
+        lags, batches = asyncio.run(case())
+        cpu = time.process_time() - cpu
+        lags.sort()
+        print(
+            f"{name:<10} {len(lags):>9} {batches:>8} {statistics.median(lags) * 1e3:>12.2f} "
+            f"{lags[int(len(lags) * 0.99)] * 1e3:>12.2f} {lags[-1] * 1e3:>13.2f} {cpu:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# encoding: utf-8
+"""启动基准测试：统计冷启动时各入口模块的导入耗时
+
+每个场景在新的解释器中以 -X importtime 导入对应模块，解析 stderr 得到
+总导入耗时和最耗时的第三方/项目模块，并记录整个进程（含解释器启动）的耗时
+和导入后的线程数（导入不应启动后台线程）。
+多次运行取中位数（首次运行包含 .pyc 编译，单独列出）。
+
+用法: python benchmarks/bench_startup.py [--runs 5] [--top 8]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = [
+    ("config", "import config"),
+    ("sbot", "import sbot"),
+    ("价格监控", "import sbot, price_monitor"),
+    ("Telegram监听", "import sbot, telegram_notifier"),
+    ("全部服务", "import sbot, price_monitor, telegram_notifier"),
+    ("LLM处理器", "import strategy.pannews"),
+]
+
+PROBE = "; import threading, sys; print(threading.active_count(), file=sys.stdout)"
+
+
+def run_once(statement):
+    """返回 (导入耗时µs, {顶层模块: 累计耗时µs}, 线程数, 进程耗时秒)"""
+    env = dict(os.environ)
+    # 配置模块要求 API_ID 为整数
+    env.setdefault("API_ID", "0")
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement + PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started_at
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # 表头
+            continue
+        name = fields[2].rstrip()
+        # 没有缩进的是被 -c 语句直接导入的模块
+        if not name.startswith("   "):
+            total += cumulative
+        package = name.strip().split(".")[0]
+        # 同一顶层包取最外层（最大）的累计耗时
+        packages[package] = max(packages.get(package, 0), cumulative)
+    return total, packages, int(result.stdout.strip() or 0), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    print(
+        f"{'场景':<14} {'首次导入(ms)':>12} {'导入(ms)':>9} {'进程(ms)':>9} {'线程数':>6}"
+        "  最耗时的模块(ms)"
+    )
+    for name, statement in SCENARIOS:
+        try:
+            runs = [run_once(statement) for _ in range(args.runs + 1)]
+        except RuntimeError as e:
+            print(f"{name:<14} 导入失败: {e}")
+            continue
+        first, rest = runs[0], runs[1:]
+        median = statistics.median(run[0] for run in rest)
+        wall = statistics.median(run[3] for run in rest)
+        packages = {}
+        for _, timings, _, _ in rest:
+            for package, cumulative in timings.items():
+                packages.setdefault(package, []).append(cumulative)
+        heaviest = sorted(
+            ((statistics.median(values), package) for package, values in packages.items()),
+            reverse=True,
+        )[: args.top]
+        print(
+            f"{name:<14} {first[0] / 1e3:>12.1f} {median / 1e3:>9.1f} {wall * 1e3:>9.1f} "
+            f"{rest[-1][2]:>6}  "
+            + ", ".join(f"{package}={value / 1e3:.0f}" for value, package in heaviest)
+        )
+
+
+if __name__ == "__main__":
+    main()
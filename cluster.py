@@ -0,0 +1,266 @@
+# encoding: utf-8
+"""多进程模式
+
+主进程只负责管理子进程：
+- 价格监控按交易对一致性哈希分片到 PRICE_WORKERS 个工作进程
+- Telegram 监听运行在独立进程
+- 所有进程的告警经进程间队列交给唯一的通知进程，钉钉限流、告警冷却和去重全局生效
+
+工作进程数变化时（.env 热更新），各工作进程按新的哈希环重新选取交易对，
+只有约 1/N 的交易对迁移到其他进程；主进程相应地启动或停止工作进程。
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from config import CONFIG_MANAGER
+from utils.cache import AlertSuppressor
+from utils.hash_ring import HashRing
+from utils.log import shutdown_logging
+
+# 进程间告警队列容量，超出时丢弃新告警
+ALERT_QUEUE_SIZE = 10000
+# 子进程异常退出后重启前的等待时间（秒）
+RESTART_DELAY = 5
+# 停止子进程时等待其清理资源的时间（秒）
+STOP_TIMEOUT = 10
+# 检查主进程是否存活的间隔（秒）
+PARENT_CHECK_INTERVAL = 2
+
+
+def worker_name(index):
+    return f"worker-{index}"
+
+
+class Shard:
+    """工作进程负责的交易对分片：按一致性哈希从完整监控配置中选取"""
+
+    def __init__(self, index):
+        self.index = index
+        self._rings = {}
+
+    def _ring(self, workers):
+        ring = self._rings.get(workers)
+        if ring is None:
+            ring = self._rings[workers] = HashRing(worker_name(i) for i in range(workers))
+        return ring
+
+    def select(self, config):
+        """返回本分片的监控配置 {交易对: 策略列表}"""
+        workers = max(config.get("PRICE_WORKERS", 1), 1)
+        monitor_config = config.get("PRICE_MONITOR_CONFIG", {})
+        if self.index >= workers:
+            return {}
+        ring = self._ring(workers)
+        name = worker_name(self.index)
+        return {
+            symbol: strategies
+            for symbol, strategies in monitor_config.items()
+            if ring.node_for(symbol) == name
+        }
+
+
+async def forward_alerts(alerts, dedup_window=60.0):
+    """通知进程：从进程间队列读取告警，抑制重复后交给钉钉发送队列
+
+    价格告警按 (交易对, 方向, 策略) 在本进程统一冷却，交易对因 PRICE_WORKERS 变化
+    迁移到其他工作进程后不会立即重复告警；其他消息按内容去重。
+    """
+    from utils.dingtalk import get_dispatcher
+
+    dispatcher = get_dispatcher()
+    suppressor = AlertSuppressor(
+        cooldown=CONFIG_MANAGER.get("ALERT_COOLDOWN", 300),
+        escalation_step=CONFIG_MANAGER.get("ALERT_ESCALATION_STEP", 2.0),
+    )
+    loop = asyncio.get_running_loop()
+    # 带超时的阻塞读取，退出时线程池中的读取能及时结束
+    receive = functools.partial(_receive, alerts, 1.0)
+    while True:
+        item = await loop.run_in_executor(None, receive)
+        if item is None:
+            continue
+        title, message, alert = item
+        if alert is not None:
+            symbol, change, strategy_id, cooldown, escalation_step = alert
+            send = suppressor.should_send_price_alert(
+                symbol, change, strategy_id, cooldown=cooldown, escalation_step=escalation_step
+            )
+        else:
+            send = suppressor.should_send_message(f"{title}\n{message}", ttl=dedup_window)
+        if not send:
+            logging.info(f"重复告警已忽略: {title}")
+            continue
+        dispatcher.enqueue(title, message)
+
+
+def _receive(alerts, timeout):
+    try:
+        return alerts.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+async def watch_parent():
+    """主进程退出（包括被强制结束）后停止子进程，避免遗留孤儿进程"""
+    parent = multiprocessing.parent_process()
+    while parent is None or parent.is_alive():
+        await asyncio.sleep(PARENT_CHECK_INTERVAL)
+    raise RuntimeError("主进程已退出")
+
+
+async def _child_main(role, index, alerts, metrics_port):
+    from sbot import run_services
+    from utils.dingtalk import QueueDispatcher, set_dispatcher
+
+    if role == "notifier":
+        services = [
+            functools.partial(
+                forward_alerts, alerts, CONFIG_MANAGER.get("ALERT_DEDUP_WINDOW", 60)
+            )
+        ]
+    else:
+        set_dispatcher(QueueDispatcher(alerts))
+        if role == "telegram":
+            from telegram_notifier import TelegramNotifier
+
+            services = [TelegramNotifier().start_notifier]
+        else:
+            from price_monitor import PriceMonitor
+
+            services = [PriceMonitor(shard=Shard(index)).start_monitoring]
+    await run_services(services + [watch_parent], metrics_port)
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_child(name, role, index, alerts, metrics_port):
+    """子进程入口：日志写入独立文件，收到 SIGTERM 时与 Ctrl+C 一样清理后退出"""
+    from sbot import run_event_loop, start_logging
+
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    base, ext = os.path.splitext(CONFIG_MANAGER.get("LOG_FILE", "sbot.log"))
+    start_logging(f"{base}.{name}{ext}")
+    CONFIG_MANAGER.start_watching()
+    logging.info(f"子进程{name}已启动，PID: {os.getpid()}")
+    try:
+        run_event_loop(_child_main(role, index, alerts, metrics_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        CONFIG_MANAGER.stop_watching()
+        logging.info(f"子进程{name}已退出")
+        shutdown_logging()
+
+
+class Supervisor:
+    """主进程：按配置启动、重启和停止子进程"""
+
+    def __init__(self):
+        # spawn 启动的子进程不继承主进程的线程（如 .env 监听）和事件循环
+        self.context = multiprocessing.get_context("spawn")
+        self.alerts = self.context.Queue(ALERT_QUEUE_SIZE)
+        # 名称 -> multiprocessing.Process
+        self.processes = {}
+        # 名称 -> 允许重启的时间
+        self.restart_at = {}
+        self.changed = threading.Event()
+        # PRICE_WORKERS 被设为 0 时按 1 处理，只提示一次
+        self.clamped = False
+
+    def desired(self):
+        """按当前配置应运行的子进程：{名称: (角色, 分片序号, 指标端口偏移)}"""
+        children = {"notifier": ("notifier", None, 0)}
+        if CONFIG_MANAGER.get("ENABLE_TELEGRAM_LISTENER"):
+            children["telegram"] = ("telegram", None, 1)
+        if CONFIG_MANAGER.get("ENABLE_PRICE_MONITOR"):
+            workers = CONFIG_MANAGER.get("PRICE_WORKERS", 1)
+            # 与 Shard.select 一致按 1 个工作进程处理，不停止价格监控
+            if workers < 1 and not self.clamped:
+                logging.warning(
+                    "多进程模式下 PRICE_WORKERS 至少为 1，按 1 个工作进程运行；"
+                    "切换回单进程模式需要重启程序"
+                )
+            self.clamped = workers < 1
+            workers = max(workers, 1)
+            for index in range(workers):
+                children[worker_name(index)] = ("worker", index, 2 + index)
+        return children
+
+    def _start(self, name, role, index, offset):
+        # 每个子进程使用独立的指标端口：通知进程为 METRICS_PORT，其余依次递增
+        port = CONFIG_MANAGER.get("METRICS_PORT")
+        process = self.context.Process(
+            target=run_child,
+            args=(name, role, index, self.alerts, port + offset if port else 0),
+            name=f"sbot-{name}",
+        )
+        process.start()
+        self.processes[name] = process
+        logging.info(f"已启动子进程{name}，PID: {process.pid}")
+
+    def _stop(self, name):
+        process = self.processes.pop(name)
+        if process.is_alive():
+            process.terminate()
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                logging.warning(f"子进程{name}未在{STOP_TIMEOUT}秒内退出，强制结束")
+                process.kill()
+                process.join()
+        logging.info(f"已停止子进程{name}")
+
+    def reconcile(self):
+        """使运行中的子进程与配置一致，并重启异常退出的子进程"""
+        desired = self.desired()
+        for name in list(self.processes):
+            if name not in desired:
+                self._stop(name)
+        now = time.monotonic()
+        for name, (role, index, offset) in desired.items():
+            process = self.processes.get(name)
+            if process is not None:
+                if process.is_alive():
+                    continue
+                logging.error(
+                    f"子进程{name}异常退出（退出码{process.exitcode}），{RESTART_DELAY}秒后重启"
+                )
+                del self.processes[name]
+                self.restart_at[name] = now + RESTART_DELAY
+            if now >= self.restart_at.get(name, 0):
+                self._start(name, role, index, offset)
+
+    def run(self):
+        from sbot import start_logging
+
+        start_logging()
+        CONFIG_MANAGER.start_watching()
+        logging.info(f"多进程模式启动，价格监控工作进程数: {CONFIG_MANAGER.get('PRICE_WORKERS')}")
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        # 工作进程数或服务开关变化时立即调整子进程（回调在 .env 监听线程中执行）
+        CONFIG_MANAGER.subscribe(
+            lambda config, previous: self.changed.set(),
+            keys=["PRICE_WORKERS", "ENABLE_PRICE_MONITOR", "ENABLE_TELEGRAM_LISTENER"],
+        )
+        try:
+            while True:
+                self.reconcile()
+                self.changed.wait(1)
+                self.changed.clear()
+        except KeyboardInterrupt:
+            logging.info("程序被用户中断，正在关闭...")
+        finally:
+            # 先停止产生告警的进程，最后停止通知进程
+            for name in sorted(self.processes, key=lambda name: name == "notifier"):
+                self._stop(name)
+            CONFIG_MANAGER.stop_watching()
+            logging.info("程序已关闭")
+            shutdown_logging()
@@ -1,38 +1,123 @@
 import os
 import json
+import hashlib
+import logging
+import threading
 from dotenv import load_dotenv
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 
 
-class EnvFileHandler(FileSystemEventHandler):
-    def __init__(self, reload_callback):
+# 默认频道路由
+DEFAULT_TELEGRAM_ROUTES = json.dumps(
+    {
+        "1636146879": ["keyword", "notify"],  # xiaosongluo
+        "7995411861": ["keyword", "notify"],  # cqulxs
+        "-1002450025950": ["keyword", "notify"],  # Binance Wallet Anncouncements
+        # "-1001456088978": ["llm", "notify"],  # PANNews
+    }
+)
+
+
+ENV_FILE = ".env"
+# 编辑器保存时常连续触发多个文件事件，合并为一次重新加载
+RELOAD_DEBOUNCE = 0.5
+
+
+def diff_mapping(old, new):
+    """比较两个字典，返回 (新增的键, 删除的键, 值变化的键)"""
+    added = [key for key in new if key not in old]
+    removed = [key for key in old if key not in new]
+    changed = [key for key in new if key in old and old[key] != new[key]]
+    return added, removed, changed
+
+
+def _file_digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class EnvFileHandler:
+    """只处理 .env 文件的事件，并在事件停止 debounce 秒后触发一次重新加载
+
+    实现 watchdog 事件处理器的 dispatch 接口，模块导入时无需加载 watchdog。
+    """
+
+    def __init__(self, path, reload_callback, debounce=RELOAD_DEBOUNCE):
+        self.path = os.path.abspath(path)
         self.reload_callback = reload_callback
+        self.debounce = debounce
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def dispatch(self, event):
+        if event.is_directory or event.event_type not in ("created", "modified", "moved"):
+            return
+        paths = (event.src_path, getattr(event, "dest_path", None))
+        if self.path not in (os.path.abspath(path) for path in paths if path):
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.reload_callback)
+            self._timer.daemon = True
+            self._timer.start()
 
-    def on_modified(self, event):
-        if not event.is_directory and event.src_path.endswith(".env"):
-            print("检测到.env文件变更,重新加载配置...")
-            self.reload_callback()
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
 
 
 class ConfigManager:
-    def __init__(self):
+    def __init__(self, env_file=ENV_FILE):
+        self.env_file = env_file
         self.config = {}
+        self.subscribers = []
+        self.env_digest = None
         self.load_config()
         self.observer = None
-        self.start_watching()
 
     def load_config(self):
-        load_dotenv(override=True)  # 强制重新加载.env
+        self.env_digest = _file_digest(self.env_file)
+        load_dotenv(self.env_file, override=True)  # 强制重新加载.env
         self.config = {
             # 基础配置
             "ENV": os.getenv("ENV", "DEV"),
             "DING_SECRET": os.getenv("DING_SECRET"),
             "DING_TOKEN": os.getenv("DING_TOKEN"),
+            # 钉钉机器人限流（每分钟消息数）、积压时单条合并的最大消息数、接口地址
+            "DING_RATE_LIMIT": int(os.getenv("DING_RATE_LIMIT", "20")),
+            "DING_MAX_BATCH": int(os.getenv("DING_MAX_BATCH", "10")),
+            "DING_URL": os.getenv("DING_URL"),
+            # Telegram 消息转发关键词（逗号分隔），支持忽略大小写和整词匹配
+            "KEY_WORDS": [
+                keyword.strip()
+                for keyword in os.getenv("KEY_WORDS", "TGE,xiaosongluo").split(",")
+                if keyword.strip()
+            ],
+            "KEYWORD_CASE_SENSITIVE": os.getenv("KEYWORD_CASE_SENSITIVE", "True").lower()
+            == "true",
+            "KEYWORD_WHOLE_WORD": os.getenv("KEYWORD_WHOLE_WORD", "False").lower()
+            == "true",
+            # 告警冷却（秒）：冷却期内同一告警只在涨跌幅再扩大 ALERT_ESCALATION_STEP 个百分点时重发
+            "ALERT_COOLDOWN": float(os.getenv("ALERT_COOLDOWN", "300")),
+            "ALERT_ESCALATION_STEP": float(os.getenv("ALERT_ESCALATION_STEP", "2")),
+            # Telegram 转发消息按内容去重的时长（秒）
+            "MESSAGE_DEDUP_TTL": float(os.getenv("MESSAGE_DEDUP_TTL", "3600")),
             "API_ID": int(os.getenv("API_ID")),
             "API_HASH": os.getenv("API_HASH"),
             "DASHSCOPE_APP_ID": os.getenv("DASHSCOPE_APP_ID"),
             "DASHSCOPE_API_KEY": os.getenv("DASHSCOPE_API_KEY"),
+            # 百炼模型调用：并发上限、单次超时（秒）、结果缓存时长（秒）、
+            # 磁盘缓存路径（为空则只使用内存缓存）、近似重复判定的 SimHash 汉明距离
+            "LLM_CONCURRENCY": int(os.getenv("LLM_CONCURRENCY", "2")),
+            "LLM_TIMEOUT": float(os.getenv("LLM_TIMEOUT", "60")),
+            "LLM_CACHE_TTL": float(os.getenv("LLM_CACHE_TTL", "86400")),
+            "LLM_CACHE_PATH": os.getenv("LLM_CACHE_PATH"),
+            "LLM_SIMHASH_DISTANCE": int(os.getenv("LLM_SIMHASH_DISTANCE", "3")),
             "PROXY": ("http", "127.0.0.1", 7890),
             # 控制任务启停的配置项
             "ENABLE_PRICE_MONITOR": os.getenv("ENABLE_PRICE_MONITOR", "True").lower()
@@ -41,23 +126,142 @@ class ConfigManager:
                 "ENABLE_TELEGRAM_LISTENER", "True"
             ).lower()
             == "true",
+            # Telegram 消息处理流水线：工作协程数、接入容量、RPCError 最大重试次数、
+            # 重试退避的初始间隔和上限（秒）
+            "TELEGRAM_WORKERS": int(os.getenv("TELEGRAM_WORKERS", "4")),
+            "TELEGRAM_QUEUE_SIZE": int(os.getenv("TELEGRAM_QUEUE_SIZE", "1000")),
+            "TELEGRAM_MAX_RETRIES": int(os.getenv("TELEGRAM_MAX_RETRIES", "5")),
+            "TELEGRAM_RETRY_BASE": float(os.getenv("TELEGRAM_RETRY_BASE", "2")),
+            "TELEGRAM_RETRY_MAX": float(os.getenv("TELEGRAM_RETRY_MAX", "60")),
+            # Telegram 离线消息补拉：已处理消息位置文件、每个频道最多补拉条数、并发拉取的频道数
+            "TELEGRAM_CURSOR_FILE": os.getenv("TELEGRAM_CURSOR_FILE", "telegram_cursors.json"),
+            "TELEGRAM_CATCHUP_LIMIT": int(os.getenv("TELEGRAM_CATCHUP_LIMIT", "500")),
+            "TELEGRAM_CATCHUP_CONCURRENCY": int(os.getenv("TELEGRAM_CATCHUP_CONCURRENCY", "6")),
+            # Telegram 频道路由：chat_id -> 处理链（keyword/llm/notify），"default" 为默认路由
+            "TELEGRAM_ROUTES": json.loads(
+                os.getenv("TELEGRAM_ROUTES", DEFAULT_TELEGRAM_ROUTES)
+            ),
             # 价格监控参数配置
             "PRICE_MONITOR_CONFIG": json.loads(os.getenv("PRICE_MONITOR_CONFIG", '{}')),
+            # 批量拉取价格：一次请求获取全部交易对，结果在有效期（秒）内复用
+            "PRICE_BATCH_FETCH": os.getenv("PRICE_BATCH_FETCH", "False").lower()
+            == "true",
+            "PRICE_BATCH_MAX_AGE": float(os.getenv("PRICE_BATCH_MAX_AGE", "1.0")),
+            # 价格源：rest（逐个交易对轮询）、batch（批量轮询并向量化检查规则）
+            # 或 websocket（行情流，断线时回退为轮询）
+            "PRICE_SOURCE": os.getenv("PRICE_SOURCE", "rest").lower(),
+            "PRICE_WS_URL": os.getenv("PRICE_WS_URL"),
+            "PRICE_WS_STREAM": os.getenv("PRICE_WS_STREAM", "miniTicker"),
+            # 每个交易对价格历史的最大记录数（环形缓冲区容量）
+            "PRICE_HISTORY_CAPACITY": int(os.getenv("PRICE_HISTORY_CAPACITY", "86400")),
+            # 币安接口地址（逗号分隔）：按延迟选择，慢请求向次优地址对冲，失败地址熔断
+            "BINANCE_API_HOSTS": [
+                host.strip()
+                for host in os.getenv(
+                    "BINANCE_API_HOSTS",
+                    "https://api.binance.com,https://api1.binance.com,"
+                    "https://api2.binance.com,https://api3.binance.com",
+                ).split(",")
+                if host.strip()
+            ],
+            "BINANCE_HEDGE_REQUESTS": os.getenv("BINANCE_HEDGE_REQUESTS", "True").lower()
+            == "true",
+            # REST 轮询调度：时间轮 tick（秒），同一 tick 到期的交易对合并为一次批量请求；
+            # 抖动为各交易对随机初始相位占拉取间隔的比例，用于错开请求
+            "PRICE_SCHEDULER_TICK": float(os.getenv("PRICE_SCHEDULER_TICK", "0.05")),
+            "PRICE_SCHEDULER_JITTER": float(os.getenv("PRICE_SCHEDULER_JITTER", "0")),
+            # 流式波动率指标：指数加权半衰期（秒）、ATR 的 K 线周期（秒）和平滑周期、
+            # 标准差阈值生效前的最少样本数
+            "VOLATILITY_HALFLIFE": float(os.getenv("VOLATILITY_HALFLIFE", "3600")),
+            "ATR_BAR": float(os.getenv("ATR_BAR", "60")),
+            "ATR_PERIOD": int(os.getenv("ATR_PERIOD", "14")),
+            "VOLATILITY_MIN_SAMPLES": int(os.getenv("VOLATILITY_MIN_SAMPLES", "30")),
+            # 价格 tick 持久化目录，为空则不持久化
+            "TICK_STORE_DIR": os.getenv("TICK_STORE_DIR"),
+            # 日志：后台线程批量写入、JSON 格式输出、每个调用位置每分钟 INFO 日志上限（0 不限制）
+            "LOG_ASYNC": os.getenv("LOG_ASYNC", "True").lower() == "true",
+            "LOG_JSON": os.getenv("LOG_JSON", "False").lower() == "true",
+            "LOG_INFO_RATE": int(os.getenv("LOG_INFO_RATE", "0")),
+            "LOG_FILE": os.getenv("LOG_FILE", "sbot.log"),
+            # 多进程模式：价格监控工作进程数，0 为单进程运行；
+            # 多进程模式下各子进程的指标端口从 METRICS_PORT 起依次递增
+            "PRICE_WORKERS": int(os.getenv("PRICE_WORKERS", "0")),
+            # 多进程模式下通知进程丢弃相同告警的时间窗口（秒）
+            "ALERT_DEDUP_WINDOW": float(os.getenv("ALERT_DEDUP_WINDOW", "60")),
+            # 使用 uvloop 事件循环（需安装 uvloop，Windows 不支持），未安装时使用默认事件循环
+            "USE_UVLOOP": os.getenv("USE_UVLOOP", "False").lower() == "true",
+            # 本地指标服务（Prometheus 文本格式，/metrics），端口为 0 时不启动
+            "METRICS_HOST": os.getenv("METRICS_HOST", "127.0.0.1"),
+            "METRICS_PORT": int(os.getenv("METRICS_PORT", "9108")),
         }
 
     def get(self, key, default=None):
         return self.config.get(key, default)
 
+    def subscribe(self, callback, keys=None, loop=None):
+        """订阅配置重新加载
+
+        callback(config, previous) 在加载完成后调用，previous 为加载前的配置。
+        指定 keys 时只在这些配置项发生变化时调用；指定事件循环时回调在该循环中执行
+        （文件监听在后台线程中触发重新加载）。
+        """
+        self.subscribers.append((callback, tuple(keys) if keys else None, loop))
+
+    def reload(self, force=False):
+        """重新加载配置并通知订阅者，.env 内容未变化时跳过（force 为 True 时除外）"""
+        if not force and _file_digest(self.env_file) == self.env_digest:
+            logging.info(".env 内容未变化，跳过重新加载")
+            return False
+        previous = self.config
+        try:
+            self.load_config()
+        except (ValueError, TypeError) as e:
+            logging.error(f"重新加载配置失败，保留原配置: {str(e)}")
+            self.config = previous
+            return False
+        logging.info("配置已重新加载")
+        for callback, keys, loop in list(self.subscribers):
+            if keys is not None and all(
+                previous.get(key) == self.config.get(key) for key in keys
+            ):
+                continue
+            if loop is not None:
+                loop.call_soon_threadsafe(self._notify, callback, self.config, previous)
+            else:
+                self._notify(callback, self.config, previous)
+        return True
+
+    @staticmethod
+    def _notify(callback, config, previous):
+        try:
+            callback(config, previous)
+        except Exception as e:
+            logging.error(f"配置更新回调执行失败: {str(e)}")
+
     def start_watching(self):
-        event_handler = EnvFileHandler(self.load_config)
+        """监听 .env 所在目录，只响应 .env 文件本身的变更
+
+        由服务入口显式调用，导入本模块不会启动监听线程。
+        """
+        if self.observer is not None:
+            return
+        from watchdog.observers import Observer
+
+        self.event_handler = EnvFileHandler(self.env_file, self.reload)
         self.observer = Observer()
-        self.observer.schedule(event_handler, path=".", recursive=False)
+        self.observer.schedule(
+            self.event_handler,
+            path=os.path.dirname(os.path.abspath(self.env_file)),
+            recursive=False,
+        )
         self.observer.start()
 
     def stop_watching(self):
         if self.observer:
+            self.event_handler.cancel()
             self.observer.stop()
             self.observer.join()
+            self.observer = None
 
 
 # 使用单例模式创建全局配置管理器
@@ -0,0 +1,171 @@
+# encoding: utf-8
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import traceback
+from collections import deque
+
+from utils.metrics import REGISTRY
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "sbot_telegram_queue_wait_seconds", "消息从接入（或重试到期）到开始处理的等待时间"
+)
+
+
+class MessagePipeline:
+    """消息处理流水线：有界接入 -> 按频道分道 -> 并发处理 -> 延迟重试
+
+    - 接入容量有界，队列满时 submit 会等待，对上游形成背压
+    - 同一频道的消息按到达顺序依次处理，不同频道由 workers 个协程并行处理，
+      慢处理器只阻塞自己所在的频道
+    - 可重试的异常进入延迟重试队列，按指数退避（有上限）重新投递
+    """
+
+    def __init__(
+        self,
+        handle,
+        workers=4,
+        maxsize=1000,
+        max_retries=5,
+        retry_base=2.0,
+        retry_max=60.0,
+        retry_exceptions=(),
+        on_done=None,
+    ):
+        # handle: async (event) -> None
+        self.handle = handle
+        # on_done(channel, event): 消息处理结束（成功、失败或放弃重试）时调用
+        self.on_done = on_done
+        self.worker_count = workers
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.capacity = asyncio.Semaphore(maxsize)
+        # 频道 -> 待处理消息；ready 中的频道有待处理消息且当前没有协程在处理
+        self.lanes = {}
+        self.ready = asyncio.Queue()
+        self.retry_heap = []
+        self._retry_wakeup = asyncio.Event()
+        self._sequence = itertools.count()
+        self._tasks = []
+        self.pending = 0
+        self.in_progress = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"pipeline_worker_{i}")
+            for i in range(self.worker_count)
+        ]
+        self._tasks.append(asyncio.create_task(self._retry_loop(), name="pipeline_retry"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, channel, event):
+        """接入一条消息，流水线已满时等待"""
+        await self.capacity.acquire()
+        self.pending += 1
+        self._enqueue(channel, [event, 0, time.monotonic()])
+
+    def _enqueue(self, channel, item):
+        lane = self.lanes.get(channel)
+        if lane is None:
+            # 频道当前空闲，加入就绪队列
+            self.lanes[channel] = deque([item])
+            self.ready.put_nowait(channel)
+        else:
+            lane.append(item)
+
+    async def _worker(self):
+        while True:
+            channel = await self.ready.get()
+            lane = self.lanes[channel]
+            item = lane.popleft()
+            await self._process(channel, item)
+            if lane:
+                self.ready.put_nowait(channel)
+            else:
+                del self.lanes[channel]
+
+    async def _process(self, channel, item):
+        event, attempt, enqueued_at = item
+        QUEUE_WAIT.observe(time.monotonic() - enqueued_at)
+        self.pending -= 1
+        self.in_progress += 1
+        try:
+            await self.handle(event)
+            self.processed += 1
+            self._done(channel, event)
+        except self.retry_exceptions as e:
+            if attempt < self.max_retries:
+                delay = min(self.retry_base * 2**attempt, self.retry_max)
+                logging.error(f"网络错误: {str(e)}, {delay:g}秒后重试（第{attempt + 1}次）")
+                self.retried += 1
+                heapq.heappush(
+                    self.retry_heap,
+                    (time.monotonic() + delay, next(self._sequence), channel, event, attempt + 1),
+                )
+                self._retry_wakeup.set()
+            else:
+                logging.error(f"网络错误: {str(e)}, 已重试{attempt}次，放弃处理")
+                self.dropped += 1
+                self._done(channel, event)
+        except Exception as e:
+            stack_info = traceback.format_exc()
+            logging.error(f"处理消息失败: {str(e)}\n{stack_info}")
+            self.failed += 1
+            self._done(channel, event)
+        finally:
+            self.in_progress -= 1
+
+    def _done(self, channel, event):
+        self.capacity.release()
+        if self.on_done is not None:
+            try:
+                self.on_done(channel, event)
+            except Exception as e:
+                logging.error(f"消息完成回调执行失败: {str(e)}")
+
+    async def _retry_loop(self):
+        """到期的重试消息重新投递到所属频道"""
+        while True:
+            if not self.retry_heap:
+                self._retry_wakeup.clear()
+                await self._retry_wakeup.wait()
+                continue
+            delay = self.retry_heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._retry_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._retry_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, channel, event, attempt = heapq.heappop(self.retry_heap)
+            self.pending += 1
+            self._enqueue(channel, [event, attempt, time.monotonic()])
+
+    def stats(self):
+        """流水线各阶段的队列深度和消息数，等待和处理耗时见 QUEUE_WAIT 和处理链的指标"""
+        return {
+            "pending": self.pending,
+            "in_progress": self.in_progress,
+            "retry_pending": len(self.retry_heap),
+            "active_channels": len(self.lanes),
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
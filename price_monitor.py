@@ -1,21 +1,121 @@
 # sbot/price_monitor.py
 import asyncio
+import json
 import logging
-from datetime import datetime, timedelta
-from config import CONFIG_MANAGER
-from utils.dingtalk import send_dingtalk_notification
+import math
+import time
+from datetime import datetime
+from config import CONFIG_MANAGER, diff_mapping
+from price_rules import RuleBatch, create_rule, feed_interval, strategy_key
+from price_source import InvalidSymbolError, create_price_source
+from utils.cache import AlertSuppressor
+from utils.dingtalk import get_dispatcher
+from utils.host_pool import HostPool, HostUnavailableError
+from utils.indicators import StreamingIndicators
+from utils.metrics import REGISTRY
+from utils.price_history import PRICE_HISTORY_MAX_AGE, PriceHistory
+from utils.tick_store import TickStore
 import aiohttp
 
+TICKER_PRICE_PATH = "/api/v3/ticker/price"
+# 限流（429/418）和服务端错误视为主机级错误，换用其他地址
+HOST_ERROR_STATUSES = {418, 429}
+# 批量拉取请求在指标中的交易对标签
+BATCH_LABEL = "*"
+# 请求中包含无效交易对（如已下架）时币安返回的错误码
+INVALID_SYMBOL_CODE = -1121
+
+FETCH_LATENCY = REGISTRY.histogram("sbot_price_fetch_seconds", "价格拉取耗时", ["symbol"])
+FETCH_ERRORS = REGISTRY.counter("sbot_price_fetch_errors_total", "价格拉取失败次数", ["symbol"])
+INDICATORS = REGISTRY.gauge(
+    "sbot_price_indicator",
+    "交易对流式指标：1分钟收益率标准差(%)、ATR(%)、最新收益率的标准分",
+    ["symbol", "indicator"],
+)
+
 
 class PriceMonitor:
-    def __init__(self):
-        self.monitor_config = CONFIG_MANAGER.get("PRICE_MONITOR_CONFIG", {})
+    def __init__(self, shard=None):
+        # 多进程模式下只监控本分片的交易对，见 cluster.Shard
+        self.shard = shard
+        self.monitor_config = self._select_monitor_config(CONFIG_MANAGER.config)
         self.price_symbols = list(self.monitor_config.keys())
+        # 每个策略对应一条基于价格历史窗口的规则
+        self.rules = {
+            symbol: [create_rule(strategy) for strategy in strategies]
+            for symbol, strategies in self.monitor_config.items()
+        }
         self.last_prices = {symbol: None for symbol in self.price_symbols}
+        # 按策略记录检查时间
         self.last_checked = {symbol: {} for symbol in self.price_symbols}
-        self.price_history = {symbol: [] for symbol in self.price_symbols}
+        # 告警冷却：冷却期内同一策略同一方向只在涨跌幅继续扩大时再次告警
+        self.alert_suppressor = AlertSuppressor(
+            cooldown=CONFIG_MANAGER.get("ALERT_COOLDOWN", 300),
+            escalation_step=CONFIG_MANAGER.get("ALERT_ESCALATION_STEP", 2.0),
+        )
+        # 批量价格源使用的向量化规则表，首次批量检查时创建
+        self.rule_batch = None
+        # 每个交易对一个定长环形缓冲区，首次记录价格时创建
+        self.price_history = {}
+        self.history_capacity = CONFIG_MANAGER.get("PRICE_HISTORY_CAPACITY", 86400)
+        # 每个交易对的流式指标（波动率、ATR 等），用于按标准差设置告警阈值
+        self.indicators = {}
+        self.indicator_options = {
+            "halflife": CONFIG_MANAGER.get("VOLATILITY_HALFLIFE", 3600.0),
+            "bar": CONFIG_MANAGER.get("ATR_BAR", 60.0),
+            "atr_period": CONFIG_MANAGER.get("ATR_PERIOD", 14),
+            "min_samples": CONFIG_MANAGER.get("VOLATILITY_MIN_SAMPLES", 30),
+        }
+        INDICATORS.set_function(self._indicator_values)
+        # 价格 tick 持久化：重启后恢复价格历史，无需重新积累窗口数据
+        tick_store_dir = CONFIG_MANAGER.get("TICK_STORE_DIR")
+        self.tick_store = TickStore(tick_store_dir) if tick_store_dir else None
         self.proxy = self._get_proxy_config()
         self.active_tasks = []
+        self.feed_intervals = {}
+        # 价格源任务；配置热更新时按需启动或停止
+        self.source_task = None
+        self.monitoring = False
+        self._reconfigure_lock = asyncio.Lock()
+        # 长连接会话，所有请求复用同一个连接池
+        self.session = None
+        # 批量模式：一次请求拉取全部交易对价格，并在短时间内复用结果
+        self.batch_fetch = CONFIG_MANAGER.get("PRICE_BATCH_FETCH", False)
+        self.batch_max_age = CONFIG_MANAGER.get("PRICE_BATCH_MAX_AGE", 1.0)
+        self._batch_prices = {}
+        self._batch_task = None
+        # 币安接口地址池：按延迟选择地址，慢请求对冲，失败地址熔断
+        self.host_pool = HostPool(
+            CONFIG_MANAGER.get("BINANCE_API_HOSTS", ["https://api.binance.com"]),
+            hedge=CONFIG_MANAGER.get("BINANCE_HEDGE_REQUESTS", True),
+        )
+        # 价格源：默认REST轮询，可配置为WebSocket行情流
+        self.price_source = create_price_source(
+            self,
+            CONFIG_MANAGER.get("PRICE_SOURCE", "rest"),
+            url=CONFIG_MANAGER.get("PRICE_WS_URL"),
+            stream=CONFIG_MANAGER.get("PRICE_WS_STREAM", "miniTicker"),
+            tick=CONFIG_MANAGER.get("PRICE_SCHEDULER_TICK", 0.05),
+            jitter=CONFIG_MANAGER.get("PRICE_SCHEDULER_JITTER", 0.0),
+        )
+
+    def _indicator_values(self):
+        """指标采集：样本不足、尚无数值的指标不输出"""
+        values = {}
+        for symbol, indicators in self.indicators.items():
+            for name, value in (
+                ("volatility_1m", indicators.volatility(60)),
+                ("atr_percent", indicators.atr_percent()),
+                ("zscore", indicators.zscore),
+            ):
+                if value is not None:
+                    values[symbol, name] = value
+        return values
+
+    def _select_monitor_config(self, config):
+        if self.shard is not None:
+            return self.shard.select(config)
+        return config.get("PRICE_MONITOR_CONFIG", {})
 
     def _get_proxy_config(self):
         """根据环境变量获取代理配置"""
@@ -24,27 +124,55 @@ class PriceMonitor:
             return f"{scheme}://{host}:{port}"
         return None
 
+    async def _get_session(self):
+        """获取共享的HTTP会话，首次调用时创建"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self.session
+
+    async def close(self):
+        """关闭共享的HTTP会话，并写入尚未落盘的价格记录"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        if self.tick_store is not None:
+            await asyncio.to_thread(self.tick_store.close)
+
     async def start_monitoring(self):
         """开始持续监控价格波动"""
         logging.info(f"价格监控服务已启动，监控币种: {', '.join(self.price_symbols)}")
         
-        # 为每个币种的每个策略创建监控任务
+        # 每个币种的价格由价格源统一获取，再分发给该币种的所有策略
         for symbol, strategies in self.monitor_config.items():
-            for strategy in strategies:
-                task = asyncio.create_task(
-                    self._monitor_strategy(symbol, strategy),
-                    name=f"monitor_{symbol}_{strategy['interval']}"
-                )
-                self.active_tasks.append(task)
-                logging.info(
-                    f"启动{symbol}监控策略: 间隔{strategy['interval']}秒, "
-                    f"上涨阈值{strategy['up_threshold']}%, 下跌阈值{strategy['down_threshold']}%"
-                )
-        
-        # 如果没有任何监控任务，记录警告
-        if not self.active_tasks:
+            if not strategies:
+                continue
+            self.feed_intervals[symbol] = feed_interval(strategies)
+            for rule in self.rules[symbol]:
+                logging.info(f"启动{symbol}监控策略: {rule.describe()}")
+            logging.info(f"{symbol}价格拉取间隔: {self.feed_intervals[symbol]}秒")
+
+        # 批量价格源统一各交易对的拉取间隔，恢复的价格历史按实际间隔确定容量
+        self.price_source.update_intervals()
+        if self.tick_store is not None:
+            await self._restore_history(list(self.feed_intervals))
+
+        self.monitoring = True
+        if self.feed_intervals:
+            self._start_price_source()
+        else:
+            # 如果没有任何监控任务，记录警告
             logging.warning("没有配置任何监控策略，价格监控服务将保持空闲状态")
-        
+        # .env 中的监控配置（或分片数）变更时只调整受影响的交易对
+        CONFIG_MANAGER.subscribe(
+            self._on_config_changed,
+            keys=["PRICE_MONITOR_CONFIG", "PRICE_WORKERS"],
+            loop=asyncio.get_running_loop(),
+        )
+
         # 创建一个永不完成的任务，除非被取消
         # 无论是否有活动任务，都保持服务运行
         pending_forever = asyncio.create_task(asyncio.Event().wait())
@@ -63,108 +191,460 @@ class PriceMonitor:
         finally:
             if not pending_forever.done():
                 pending_forever.cancel()
+            await self.close()
+
+    def _start_price_source(self):
+        self.source_task = asyncio.create_task(self.price_source.run(), name="price_source")
+        self.active_tasks.append(self.source_task)
+        logging.info(f"价格源: {type(self.price_source).__name__}")
 
-    async def _monitor_strategy(self, symbol, strategy):
-        """执行单个监控策略"""
-        while True:
+    def _on_config_changed(self, config, previous):
+        task = asyncio.create_task(
+            self.apply_monitor_config(self._select_monitor_config(config)),
+            name="price_monitor_reconfigure",
+        )
+        self.active_tasks.append(task)
+        task.add_done_callback(self.active_tasks.remove)
+
+    async def apply_monitor_config(self, monitor_config):
+        """按新的监控配置增删或更新交易对的策略
+
+        只有新增、删除或策略变化的交易对会启动或停止拉取，其余交易对不受影响；
+        已积累的价格历史保留，新增交易对从 tick 存储恢复历史。
+        """
+        async with self._reconfigure_lock:
             try:
-                await self.check_prices(symbol, strategy)
-                await asyncio.sleep(strategy["interval"])
-            except Exception as e:
-                logging.error(f"{symbol}监控策略执行出错: {str(e)}")
-                await asyncio.sleep(60)
-
-    async def check_prices(self, symbol, strategy):
-        """检查指定交易对的价格波动"""
+                new_rules = {
+                    symbol: [create_rule(strategy) for strategy in strategies]
+                    for symbol, strategies in monitor_config.items()
+                }
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"价格监控配置有误，保留原配置: {str(e)}")
+                return
+            added, removed, changed = diff_mapping(self.monitor_config, monitor_config)
+            if not (added or removed or changed):
+                return
+            logging.info(
+                f"价格监控配置已变更: 新增{added or '无'}, 删除{removed or '无'}, 修改{changed or '无'}"
+            )
+
+            for symbol in removed:
+                self._remove_symbol(symbol)
+            for symbol in added + changed:
+                self._configure_symbol(symbol, monitor_config[symbol], new_rules[symbol])
+            self.monitor_config = dict(monitor_config)
+            self.price_symbols = list(monitor_config)
+            # 规则集合变化后重建批量规则表
+            self.rule_batch = None
+
+            self.price_source.update_intervals()
+            if self.tick_store is not None:
+                await self._restore_history([s for s in added if s in self.feed_intervals])
+            if not self.monitoring:
+                return
+            running = self.source_task is not None and not self.source_task.done()
+            if not self.feed_intervals:
+                if running:
+                    self.source_task.cancel()
+                    logging.warning("没有配置任何监控策略，价格源已停止")
+            elif not running:
+                self._start_price_source()
+            else:
+                self.price_source.reconfigure(added, removed, changed)
+
+    def _configure_symbol(self, symbol, strategies, rules):
+        """更新交易对的规则，保留价格历史和未变化策略的检查时间"""
+        self.rules[symbol] = rules
+        self.last_prices.setdefault(symbol, None)
+        keys = {strategy_key(strategy) for strategy in strategies}
+        checked_times = self.last_checked.setdefault(symbol, {})
+        for key in list(checked_times):
+            if key not in keys:
+                del checked_times[key]
+        if strategies:
+            self.feed_intervals[symbol] = feed_interval(strategies)
+            for rule in rules:
+                logging.info(f"启动{symbol}监控策略: {rule.describe()}")
+            logging.info(f"{symbol}价格拉取间隔: {self.feed_intervals[symbol]}秒")
+        else:
+            self.feed_intervals.pop(symbol, None)
+        history = self.price_history.get(symbol)
+        if history is not None:
+            self._fit_history(symbol, history)
+
+    def set_feed_interval(self, symbol, interval):
+        """由价格源调整交易对的拉取间隔（如批量拉取统一间隔），间隔缩短时按新间隔扩容价格历史"""
+        previous = self.feed_intervals.get(symbol)
+        self.feed_intervals[symbol] = interval
+        history = self.price_history.get(symbol)
+        if history is not None and previous is not None and interval < previous:
+            self._fit_history(symbol, history)
+
+    def _remove_symbol(self, symbol):
+        for state in (
+            self.rules,
+            self.last_prices,
+            self.last_checked,
+            self.feed_intervals,
+            self.price_history,
+            self.indicators,
+        ):
+            state.pop(symbol, None)
+        logging.info(f"停止{symbol}价格监控")
+
+    async def check_prices(self, symbol):
+        """获取一次指定交易对的价格，并检查到期策略的价格波动，返回价格（失败时为 None）"""
         current_time = datetime.now()
-        
+
         # 获取当前价格
         price = await self.fetch_single_price(symbol)
         if price is None:
+            return None
+
+        await self.on_price_tick(symbol, price, current_time)
+        return price
+
+    async def on_price_tick(self, symbol, price, current_time):
+        """处理一次价格更新：记录历史并检查策略"""
+        if symbol not in self.rules:
             return
 
         # 更新价格历史
         self._update_price_history(symbol, price, current_time)
+        self.last_prices[symbol] = price
 
-        # 首次检查，只记录当前价格
-        if self.last_prices[symbol] is None:
-            self.last_prices[symbol] = price
-            self.last_checked[symbol][strategy["interval"]] = current_time
-            logging.info(f"首次价格检查完成: {symbol}=${price}")
+        # 流式价格源每次推送都检查，轮询价格源只检查到期的策略
+        for rule in self.rules[symbol]:
+            if self.price_source.streaming or self._is_rule_due(
+                self.last_checked[symbol], rule, symbol, current_time
+            ):
+                await self._evaluate_rule(symbol, rule, price, current_time)
+
+    def _is_rule_due(self, checked_times, rule, symbol, current_time):
+        """判断距上次记录的时间是否已达到策略间隔（允许半个拉取间隔的误差）"""
+        last_time = checked_times.get(strategy_key(rule.strategy))
+        if last_time is None:
+            return True
+        tolerance = self.feed_intervals.get(symbol, 0) / 2
+        elapsed = (current_time - last_time).total_seconds()
+        return elapsed >= rule.interval - tolerance
+
+    def _reference_tolerance(self, symbol):
+        """查找窗口起点价格时允许的误差：轮询时为半个拉取间隔，流式推送时不放宽"""
+        if self.price_source.streaming:
+            return 0
+        return self.feed_intervals.get(symbol, 0) / 2
+
+    async def _evaluate_rule(self, symbol, rule, price, current_time):
+        """根据价格历史窗口检查策略是否触发告警"""
+        key = strategy_key(rule.strategy)
+        due = self._is_rule_due(self.last_checked[symbol], rule, symbol, current_time)
+        if due:
+            self.last_checked[symbol][key] = current_time
+
+        result = rule.evaluate(
+            self.price_history[symbol],
+            price,
+            current_time.timestamp(),
+            tolerance=self._reference_tolerance(symbol),
+        )
+        if result is None:
+            # 历史数据尚不足一个窗口
+            if due:
+                logging.info(f"首次价格检查完成: {symbol}=${price}")
             return
 
-        # 检查波动
-        old_price = self.last_prices[symbol]
-        change = self._calculate_price_change(old_price, price)
-        
-        # 使用策略特定阈值判断
-        if change >= strategy["up_threshold"] or change <= -strategy["down_threshold"]:
-            await self._send_volatility_alert(symbol, price, old_price, change, strategy)
+        change, reference = result
+        volatility = self._volatility(symbol, rule)
+        if rule.is_triggered(change, volatility):
+            await self._dispatch_alert(
+                symbol, rule, price, reference, change, current_time, volatility
+            )
 
-        # 更新最后检查价格和时间
-        self.last_prices[symbol] = price
-        self.last_checked[symbol][strategy["interval"]] = current_time
-        logging.info(f"{symbol}价格检查完成: ${price} ({change:.2f}%)")
+        if due:
+            logging.info(f"{symbol}价格检查完成: ${price} ({change:.2f}%)")
+
+    async def on_price_batch(self, prices, current_time):
+        """处理一批交易对的价格更新，并向量化检查所有到期规则"""
+        if self.rule_batch is None:
+            self.rule_batch = RuleBatch(
+                (symbol, rule)
+                for symbol, rules in self.rules.items()
+                for rule in rules
+            )
 
-    async def fetch_current_prices(self):
-        """从币安API批量获取所有交易对的当前价格"""
-        current_prices = {}
+        for symbol, price in prices.items():
+            if symbol in self.rules:
+                self._update_price_history(symbol, price, current_time)
+                self.last_prices[symbol] = price
+
+        # 收集到期规则的当前价格和参考价格，未到期或数据不足的行为 NaN
+        now = current_time.timestamp()
+        row_prices = [math.nan] * len(self.rule_batch)
+        references = [math.nan] * len(self.rule_batch)
+        volatilities = [math.nan] * len(self.rule_batch) if self.rule_batch.has_sigma else None
+        for row, (symbol, rule) in enumerate(self.rule_batch.entries):
+            if symbol not in prices:
+                continue
+            checked_times = self.last_checked[symbol]
+            if not self.price_source.streaming and not self._is_rule_due(
+                checked_times, rule, symbol, current_time
+            ):
+                continue
+            checked_times[strategy_key(rule.strategy)] = current_time
+            reference = rule.reference_price(
+                self.price_history[symbol],
+                now,
+                tolerance=self._reference_tolerance(symbol),
+            )
+            if reference:
+                row_prices[row] = prices[symbol]
+                references[row] = reference
+                if volatilities is not None and rule.uses_sigma:
+                    volatility = self._volatility(symbol, rule)
+                    if volatility is not None:
+                        volatilities[row] = volatility
+
+        fired = self.rule_batch.evaluate(row_prices, references, volatilities)
+        for row, change in fired:
+            symbol, rule = self.rule_batch.entries[row]
+            await self._dispatch_alert(
+                symbol,
+                rule,
+                row_prices[row],
+                references[row],
+                change,
+                current_time,
+                volatilities[row] if volatilities is not None and rule.uses_sigma else None,
+            )
+        logging.info(f"批量价格检查完成: {len(prices)}个交易对, {len(fired)}条规则触发")
+
+    def _volatility(self, symbol, rule):
+        """规则窗口内收益率的标准差（%），规则未使用标准差阈值或样本不足时返回 None"""
+        if not rule.uses_sigma:
+            return None
+        indicators = self.indicators.get(symbol)
+        return indicators.volatility(rule.window) if indicators is not None else None
+
+    async def _dispatch_alert(
+        self, symbol, rule, price, reference, change, current_time, volatility=None
+    ):
+        """发送规则触发的告警，冷却期内的重复告警会被抑制"""
+        if not self.alert_suppressor.should_send_price_alert(
+            symbol,
+            change,
+            strategy_key(rule.strategy),
+            cooldown=rule.strategy.get("cooldown"),
+            escalation_step=rule.strategy.get("escalation_step"),
+        ):
+            logging.info(f"{symbol}告警处于冷却期，已抑制: {change:.2f}%")
+            return
+        await self._send_volatility_alert(
+            symbol, price, reference, change, rule.strategy, rule, volatility
+        )
+
+    async def fetch_current_prices(self, symbols=None):
+        """从币安API批量获取交易对的当前价格（单次请求），默认获取全部交易对
+
+        请求被限流、服务端或网络出错时返回 None；币安因无效交易对拒绝请求时
+        抛出 InvalidSymbolError，只有这种情况需要逐个拉取。
+        """
+        symbols = self.price_symbols if symbols is None else symbols
+        if not symbols:
+            return {}
+        started_at = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                for symbol in self.price_symbols:
-                    url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}"
-                    async with session.get(url, proxy=self.proxy) as response:
-                        if response.status != 200:
-                            logging.error(
-                                f"获取{symbol}价格失败，状态码: {response.status}"
-                            )
-                            continue
-                        data = await response.json()
-                        current_prices[symbol] = float(data["price"])
-
-                return current_prices
+            params = {"symbols": json.dumps(symbols, separators=(",", ":"))}
+            status, data = await self._get_ticker_price(params)
+            if status != 200:
+                FETCH_ERRORS.inc(BATCH_LABEL)
+                logging.error(f"批量获取价格失败，状态码: {status}，响应: {data}")
+                if status == 400 and isinstance(data, dict):
+                    if data.get("code") == INVALID_SYMBOL_CODE:
+                        raise InvalidSymbolError(data.get("msg"))
+                return None
+            return {item["symbol"]: float(item["price"]) for item in data}
+        except InvalidSymbolError:
+            raise
         except Exception as e:
+            FETCH_ERRORS.inc(BATCH_LABEL)
             logging.error(f"获取价格时发生错误: {str(e)}")
             return None
+        finally:
+            FETCH_LATENCY.observe(time.perf_counter() - started_at, BATCH_LABEL)
 
     async def fetch_single_price(self, symbol):
         """从币安API获取单个交易对的当前价格"""
+        if self.batch_fetch:
+            return await self._fetch_batched_price(symbol)
+        started_at = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}"
-                async with session.get(url, proxy=self.proxy) as response:
-                    if response.status != 200:
-                        logging.error(
-                            f"获取{symbol}价格失败，状态码: {response.status}"
-                        )
-                        return None
-                    logging.info(f"获取{symbol}价格成功，数据: {await response.json()}")
-                    data = await response.json()
-                    return float(data["price"])
+            status, data = await self._get_ticker_price({"symbol": symbol})
+            if status != 200:
+                FETCH_ERRORS.inc(symbol)
+                logging.error(f"获取{symbol}价格失败，状态码: {status}")
+                return None
+            logging.info(f"获取{symbol}价格成功，数据: {data}")
+            return float(data["price"])
         except Exception as e:
+            FETCH_ERRORS.inc(symbol)
             logging.error(f"获取{symbol}价格时发生错误: {str(e)}")
             return None
+        finally:
+            FETCH_LATENCY.observe(time.perf_counter() - started_at, symbol)
+
+    async def _get_ticker_price(self, params):
+        """通过地址池请求 ticker/price，返回 (状态码, 响应数据)"""
+        session = await self._get_session()
+
+        async def fetch(base_url):
+            async with session.get(
+                base_url + TICKER_PRICE_PATH, params=params, proxy=self.proxy
+            ) as response:
+                if response.status in HOST_ERROR_STATUSES or response.status >= 500:
+                    raise HostUnavailableError(f"状态码: {response.status}")
+                if response.status == 400:
+                    # 错误响应中的错误码用于区分无效交易对
+                    return response.status, await response.json(content_type=None)
+                if response.status != 200:
+                    return response.status, None
+                return response.status, await response.json()
+
+        return await self.host_pool.request(fetch)
+
+    async def _fetch_batched_price(self, symbol):
+        """批量模式下获取价格：并发请求共享同一次批量拉取"""
+        cached = self._batch_prices.get(symbol)
+        if cached is not None and time.monotonic() - cached[0] < self.batch_max_age:
+            return cached[1]
+
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._refresh_batch_prices())
+        prices = await asyncio.shield(self._batch_task)
+        return prices.get(symbol)
+
+    async def _refresh_batch_prices(self):
+        """执行一次批量拉取并刷新价格缓存"""
+        try:
+            prices = await self.fetch_current_prices()
+        except InvalidSymbolError:
+            return {}
+        if not prices:
+            return {}
+        fetched_at = time.monotonic()
+        for symbol, price in prices.items():
+            self._batch_prices[symbol] = (fetched_at, price)
+        logging.info(f"批量获取{len(prices)}个交易对价格成功")
+        return prices
+
+    def _get_history(self, symbol):
+        """获取交易对的价格历史，首次使用时创建"""
+        history = self.price_history.get(symbol)
+        if history is None:
+            history = self.price_history[symbol] = self._new_history(symbol)
+        return history
+
+    def _new_history(self, symbol):
+        max_age = self._history_max_age(symbol)
+        capacity = self._history_capacity(symbol, max_age)
+        history = PriceHistory(capacity, max_age, self._history_resolution(capacity, max_age))
+        for rule in self.rules[symbol]:
+            rule.prepare(history)
+        self._check_history_span(symbol, history)
+        return history
+
+    def _history_max_age(self, symbol):
+        return max([PRICE_HISTORY_MAX_AGE] + [rule.window for rule in self.rules[symbol]])
+
+    def _fit_history(self, symbol, history):
+        """策略变化后调整价格历史：保留时长或容量不足时迁移到新的缓冲区，注销不再使用的窗口"""
+        max_age = self._history_max_age(symbol)
+        capacity = self._history_capacity(symbol, max_age)
+        if history.max_age < max_age or history.capacity < capacity:
+            capacity, max_age = max(capacity, history.capacity), max(max_age, history.max_age)
+            resized = PriceHistory(
+                capacity, max_age, self._history_resolution(capacity, max_age)
+            )
+            for timestamp, price in history.items():
+                resized.append(timestamp, price)
+            history = self.price_history[symbol] = resized
+        # 规则删除或窗口修改后，旧窗口的单调队列不再随每次推送维护
+        windows = {seconds for rule in self.rules[symbol] for seconds in rule.windows()}
+        history.retain_windows(windows)
+        for rule in self.rules[symbol]:
+            rule.prepare(history)
+        self._check_history_span(symbol, history)
 
     def _update_price_history(self, symbol, price, timestamp):
-        """更新价格历史记录"""
-        if symbol not in self.price_history:
-            self.price_history[symbol] = []
-
-        # 记录价格和时间戳
-        self.price_history[symbol].append((timestamp, price))
-
-        # 只保留最近24小时的数据
-        cutoff = timestamp - timedelta(hours=24)
-        self.price_history[symbol] = [
-            entry for entry in self.price_history[symbol] if entry[0] >= cutoff
-        ]
-
-    def _calculate_price_change(self, old_price, new_price):
-        """计算价格变化百分比"""
-        if old_price == 0:
-            return 0
-        return ((new_price - old_price) / old_price) * 100
-        
+        """更新价格历史记录，保留最近24小时（或策略最长窗口）的数据"""
+        timestamp = timestamp.timestamp()
+        self._get_history(symbol).append(timestamp, price)
+        indicators = self.indicators.get(symbol)
+        if indicators is None:
+            indicators = self.indicators[symbol] = StreamingIndicators(**self.indicator_options)
+        indicators.update(timestamp, price)
+        if self.tick_store is not None:
+            self.tick_store.append(symbol, timestamp, price)
+
+    async def _restore_history(self, symbols):
+        """从 tick 存储恢复最近窗口内的价格历史，文件读取在线程池中执行"""
+        for symbol in symbols:
+            history, indicators = await asyncio.to_thread(self._load_history, symbol)
+            if symbol not in self.rules or len(history) == 0:
+                continue
+            existing = self.price_history.get(symbol)
+            if existing is not None and len(existing):
+                continue
+            self.price_history[symbol] = history
+            self.indicators[symbol] = indicators
+            self.last_prices[symbol] = history.last()
+            logging.info(f"已恢复{symbol}价格历史: {len(history)}条")
+
+    def _load_history(self, symbol):
+        """读取 tick 存储并构建新的价格历史和流式指标（在线程池中执行，不修改共享状态）"""
+        history = self._new_history(symbol)
+        indicators = StreamingIndicators(**self.indicator_options)
+        timestamps, prices = self.tick_store.restore(symbol, time.time() - history.max_age)
+        for timestamp, price in zip(timestamps, prices):
+            history.append(timestamp, price)
+            indicators.update(timestamp, price)
+        return history, indicators
+
+    def _history_capacity(self, symbol, max_age):
+        """按拉取间隔估算保留时长内的记录数，流式价格源使用配置的容量上限"""
+        interval = self.feed_intervals.get(symbol)
+        if self.price_source.streaming or not interval:
+            return self.history_capacity
+        # 另加一条早于保留时长的窗口起点记录
+        return min(math.ceil(max_age / interval) + 2, self.history_capacity)
+
+    def _history_resolution(self, capacity, max_age):
+        """流式价格源的推送频率不固定（bookTicker 每秒多次），按容量降采样以覆盖保留时长"""
+        if not self.price_source.streaming or capacity < 3:
+            return 0.0
+        # 每条记录是所在间隔内的最后一次推送，最早一条需早于 max_age 才能作为窗口起点
+        return max_age / (capacity - 2)
+
+    def _check_history_span(self, symbol, history):
+        """规则窗口超出价格历史能覆盖的时长时记录警告，否则该规则因取不到窗口起点价格而从不触发"""
+        interval = self.feed_intervals.get(symbol)
+        step = history.resolution or (0 if self.price_source.streaming else interval)
+        if not step:
+            return
+        span = min((history.capacity - 1) * step, history.max_age)
+        for rule in self.rules[symbol]:
+            if rule.window > span:
+                logging.warning(
+                    f"{symbol}价格历史最多保留{self._format_time_interval(int(span))}"
+                    f"（PRICE_HISTORY_CAPACITY={history.capacity}），"
+                    f"短于{rule.describe()}的窗口，该规则可能无法触发"
+                )
+            elif rule.window < 10 * history.resolution:
+                logging.warning(
+                    f"{symbol}价格历史降采样为每{history.resolution:.1f}秒一条，"
+                    f"{rule.describe()}的窗口起点价格误差较大，可调大 PRICE_HISTORY_CAPACITY"
+                )
+
     def _format_time_interval(self, seconds):
         """将秒数转换为更易于理解的时间单位"""
         if seconds < 60:
@@ -186,16 +666,31 @@ class PriceMonitor:
             return f"{days}天{hours}小时"
 
     async def _send_volatility_alert(
-        self, symbol, current_price, last_price, change_percent, strategy
+        self, symbol, current_price, last_price, change_percent, strategy, rule=None,
+        volatility=None,
     ):
         """发送价格波动警报"""
         if change_percent > 0:
             trend = "上涨"
-            threshold = strategy["up_threshold"]
+            threshold = strategy.get("up_threshold")
         else:
             trend = "下跌"
-            threshold = strategy["down_threshold"]
+            threshold = strategy.get("down_threshold")
         change_abs = abs(change_percent)
+        reference_label = "上次价格"
+        threshold_text = f"{threshold}%"
+        volatility_line = ""
+        if rule is not None:
+            threshold = rule.threshold_for(change_percent, volatility)
+            reference_label = rule.reference_label
+            threshold_text = f"{threshold:g}%"
+            if volatility:
+                if rule.sigma_for(change_percent):
+                    threshold_text = f"{threshold:.2f}%，{rule.sigma_for(change_percent):g}σ"
+                volatility_line = (
+                    f"📐 波动率：{self._format_time_interval(rule.window)}σ={volatility:.2f}%，"
+                    f"本次变化{change_percent / volatility:+.1f}σ\n"
+                )
 
         # 构建Markdown格式的消息
         markdown_text = f"""
@@ -203,21 +698,20 @@ class PriceMonitor:
 \n
 📅 时间：{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n
 💰 当前价格：${current_price:.2f}\n
-📊 变化幅度：{trend}{change_abs:.2f}% (超过{trend}阈值{threshold}%)\n
-📉 上次价格：${last_price:.2f}\n
+📊 变化幅度：{trend}{change_abs:.2f}% (超过{trend}阈值{threshold_text})\n
+{volatility_line}📉 {reference_label}：${last_price:.2f}\n
 ⏱️ 监控策略：每{self._format_time_interval(strategy['interval'])}检查\n
 \n
 **请及时关注市场变化！**
 """
 
-        try:
-            await asyncio.to_thread(
-                send_dingtalk_notification,
-                f"📢{symbol}价格{trend}告警",
-                markdown_text,
-                CONFIG_MANAGER.get("DING_SECRET"),
-                CONFIG_MANAGER.get("DING_TOKEN"),
-            )
-            logging.info(f"{symbol}价格{trend}告警已发送: {change_percent:.2f}% (阈值:{threshold}%)")
-        except Exception as e:
-            logging.error(f"发送{symbol}价格波动通知失败: {str(e)}")
\ No newline at end of file
+        # 多进程模式下由通知进程按该键统一冷却，交易对迁移到其他工作进程后不会重复告警
+        alert = (
+            symbol,
+            change_percent,
+            strategy_key(strategy),
+            strategy.get("cooldown"),
+            strategy.get("escalation_step"),
+        )
+        get_dispatcher().enqueue(f"📢{symbol}价格{trend}告警", markdown_text, alert=alert)
+        logging.info(f"{symbol}价格{trend}告警已加入发送队列: {change_percent:.2f}% (阈值:{threshold_text})")
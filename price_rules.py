@@ -0,0 +1,273 @@
+# sbot/price_rules.py
+"""价格波动规则：基于价格历史窗口计算参考价格并判断是否触发告警
+
+策略配置示例（PRICE_MONITOR_CONFIG 中的单个策略）:
+    {"interval": 60, "up_threshold": 3, "down_threshold": 3}
+    {"interval": 60, "type": "drawdown", "window": 3600, "down_threshold": 5}
+    {"interval": 60, "type": "rally", "window": 3600, "up_threshold": 5}
+    {"interval": 60, "window": 300, "up_sigma": 3, "down_sigma": 3}
+    {"interval": 60, "window": 300, "up_threshold": 1, "up_sigma": 3}
+
+type 缺省为 change，window 缺省为 interval。
+阈值可以用百分比（up_threshold/down_threshold）或标准差倍数（up_sigma/down_sigma）
+表示，标准差为该交易对 window 秒收益率的波动率（见 utils.indicators）；
+同时设置时需同时超过两者，百分比阈值作为下限。
+"""
+import math
+
+# 尚未尝试导入 NumPy
+_UNLOADED = object()
+_np = _UNLOADED
+
+RULE_CHANGE = "change"
+RULE_DRAWDOWN = "drawdown"
+RULE_RALLY = "rally"
+
+
+def load_numpy():
+    """按需导入 NumPy，只有批量计算规则时才加载；未安装时返回 None
+
+    NumPy 为可选依赖，未安装时批量计算退化为逐条计算。
+    """
+    global _np
+    if _np is _UNLOADED:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def strategy_key(strategy):
+    """策略的唯一标识，用于区分同一交易对下的不同策略"""
+    return tuple(sorted(strategy.items()))
+
+
+def feed_interval(strategies):
+    """计算交易对价格源的拉取间隔：整数间隔取最大公约数，否则取最小值"""
+    intervals = [strategy["interval"] for strategy in strategies]
+    if all(float(interval).is_integer() for interval in intervals):
+        return math.gcd(*(int(interval) for interval in intervals))
+    return min(intervals)
+
+
+def combine_threshold(percent, sigma, volatility):
+    """单侧实际阈值：标准差阈值与百分比阈值取较大者，波动率未知时为百分比阈值"""
+    if not sigma or volatility is None or math.isnan(volatility):
+        return percent
+    if math.isinf(percent):
+        return sigma * volatility
+    return max(percent, sigma * volatility)
+
+
+class PriceRule:
+    """规则基类：子类实现 reference_price，返回用于计算涨跌幅的参考价格"""
+
+    kind = None
+    reference_label = "参考价格"
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.interval = strategy["interval"]
+        self.window = strategy.get("window", self.interval)
+        self.up_sigma = strategy.get("up_sigma", 0.0)
+        self.down_sigma = strategy.get("down_sigma", 0.0)
+        # 未配置百分比阈值的一侧为 inf：只按标准差阈值触发，波动率未知时不触发
+        self.up_threshold = strategy.get("up_threshold", math.inf)
+        self.down_threshold = strategy.get("down_threshold", math.inf)
+
+    @property
+    def uses_sigma(self):
+        return bool(self.up_sigma or self.down_sigma)
+
+    def windows(self):
+        """需要在价格历史上注册（查询最高价/最低价）的窗口"""
+        return ()
+
+    def prepare(self, history):
+        """在价格历史上注册规则需要的窗口"""
+        for seconds in self.windows():
+            history.track_window(seconds)
+
+    def reference_price(self, history, now, tolerance=0):
+        raise NotImplementedError
+
+    def evaluate(self, history, price, now, tolerance=0):
+        """返回 (涨跌幅百分比, 参考价格)，历史数据不足时返回 None"""
+        reference = self.reference_price(history, now, tolerance)
+        if not reference:
+            return None
+        return (price - reference) / reference * 100, reference
+
+    def thresholds(self, volatility=None):
+        """返回实际的 (上涨阈值, 下跌阈值) 百分比
+
+        volatility 为 window 秒收益率的标准差（%）。百分比阈值是标准差阈值的下限；
+        波动率未知时（样本不足）只按百分比阈值判断。
+        """
+        return (
+            combine_threshold(self.up_threshold, self.up_sigma, volatility),
+            combine_threshold(self.down_threshold, self.down_sigma, volatility),
+        )
+
+    def is_triggered(self, change, volatility=None):
+        up, down = self.thresholds(volatility)
+        return change >= up or change <= -down
+
+    def threshold_for(self, change, volatility=None):
+        up, down = self.thresholds(volatility)
+        return up if change > 0 else down
+
+    def sigma_for(self, change):
+        return self.up_sigma if change > 0 else self.down_sigma
+
+    def describe(self):
+        parts = [f"间隔{self.interval}秒", f"窗口{self.window}秒"]
+        if self.up_threshold not in (math.inf, 0.0):
+            parts.append(f"上涨阈值{self.up_threshold}%")
+        if self.up_sigma:
+            parts.append(f"上涨阈值{self.up_sigma}σ")
+        if self.down_threshold not in (math.inf, 0.0):
+            parts.append(f"下跌阈值{self.down_threshold}%")
+        if self.down_sigma:
+            parts.append(f"下跌阈值{self.down_sigma}σ")
+        return f"{self.kind}规则: " + ", ".join(parts)
+
+
+class ChangeRule(PriceRule):
+    """与 window 秒前的价格比较"""
+
+    kind = RULE_CHANGE
+    reference_label = "窗口起点价格"
+
+    def reference_price(self, history, now, tolerance=0):
+        # 允许一定误差，避免轮询抖动导致参考点落到更早的一次拉取
+        return history.price_at(now - self.window + tolerance)
+
+
+class DrawdownRule(PriceRule):
+    """相对窗口内最高价的回撤，只检查下跌"""
+
+    kind = RULE_DRAWDOWN
+    reference_label = "窗口最高价"
+
+    def __init__(self, strategy):
+        super().__init__(strategy)
+        self.up_threshold = math.inf
+        self.up_sigma = 0.0
+
+    def windows(self):
+        return (self.window,)
+
+    def reference_price(self, history, now, tolerance=0):
+        return history.window_max(self.window, now)
+
+
+class RallyRule(PriceRule):
+    """相对窗口内最低价的反弹，只检查上涨"""
+
+    kind = RULE_RALLY
+    reference_label = "窗口最低价"
+
+    def __init__(self, strategy):
+        super().__init__(strategy)
+        self.down_threshold = math.inf
+        self.down_sigma = 0.0
+
+    def windows(self):
+        return (self.window,)
+
+    def reference_price(self, history, now, tolerance=0):
+        return history.window_min(self.window, now)
+
+
+RULE_TYPES = {
+    RULE_CHANGE: ChangeRule,
+    RULE_DRAWDOWN: DrawdownRule,
+    RULE_RALLY: RallyRule,
+}
+
+
+def create_rule(strategy):
+    """根据策略配置创建规则"""
+    rule_type = strategy.get("type", RULE_CHANGE)
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"不支持的规则类型: {rule_type}")
+    return RULE_TYPES[rule_type](strategy)
+
+
+class RuleBatch:
+    """批量规则计算：一次向量化计算所有规则的涨跌幅并筛选触发的规则
+
+    安装了 NumPy 时使用向量化计算，否则逐条计算，两种方式结果一致。
+    """
+
+    def __init__(self, entries):
+        # entries: [(symbol, rule), ...]
+        self.entries = list(entries)
+        self.up_thresholds = [rule.up_threshold for _, rule in self.entries]
+        self.down_thresholds = [-rule.down_threshold for _, rule in self.entries]
+        self.up_sigmas = [rule.up_sigma for _, rule in self.entries]
+        self.down_sigmas = [rule.down_sigma for _, rule in self.entries]
+        # 有标准差阈值的规则需要调用方提供波动率
+        self.has_sigma = any(rule.uses_sigma for _, rule in self.entries)
+        self.np = np = load_numpy()
+        if np is not None:
+            self.up_thresholds = np.array(self.up_thresholds, dtype=float)
+            self.down_thresholds = np.array(self.down_thresholds, dtype=float)
+            self.up_sigmas = np.array(self.up_sigmas, dtype=float)
+            self.down_sigmas = np.array(self.down_sigmas, dtype=float)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def evaluate(self, prices, references, volatilities=None):
+        """返回触发规则的 [(行号, 涨跌幅百分比), ...]
+
+        prices 和 references 与 entries 按行对齐，参考价格为 NaN 的行不参与判断。
+        volatilities 为各行规则窗口的波动率（%），为 NaN 或未提供时标准差阈值不触发。
+        """
+        np = self.np
+        if np is None:
+            return self._evaluate_scalar(prices, references, volatilities)
+        prices = np.asarray(prices, dtype=float)
+        references = np.asarray(references, dtype=float)
+        up, down = self.up_thresholds, self.down_thresholds
+        if self.has_sigma:
+            if volatilities is None:
+                volatilities = np.full(len(self.entries), np.nan)
+            volatilities = np.asarray(volatilities, dtype=float)
+            # 与 combine_threshold 一致：波动率为 NaN 时保留百分比阈值，
+            # 未配置百分比阈值（inf）时以 0 为下限
+            known = ~np.isnan(volatilities)
+            up = np.where(
+                (self.up_sigmas > 0) & known,
+                np.maximum(np.where(np.isinf(up), 0.0, up), self.up_sigmas * volatilities),
+                up,
+            )
+            down = np.where(
+                (self.down_sigmas > 0) & known,
+                np.minimum(np.where(np.isinf(down), 0.0, down), -self.down_sigmas * volatilities),
+                down,
+            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            changes = (prices - references) / references * 100
+        fired = (changes >= up) | (changes <= down)
+        fired &= references != 0
+        return [(int(row), float(changes[row])) for row in np.flatnonzero(fired)]
+
+    def _evaluate_scalar(self, prices, references, volatilities=None):
+        fired = []
+        for row, (price, reference) in enumerate(zip(prices, references)):
+            if not reference or math.isnan(reference):
+                continue
+            change = (price - reference) / reference * 100
+            volatility = volatilities[row] if volatilities is not None else None
+            up = combine_threshold(self.up_thresholds[row], self.up_sigmas[row], volatility)
+            down = -combine_threshold(
+                -self.down_thresholds[row], self.down_sigmas[row], volatility
+            )
+            if change >= up or change <= down:
+                fired.append((row, change))
+        return fired
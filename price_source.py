@@ -0,0 +1,345 @@
+# sbot/price_source.py
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+import aiohttp
+from price_rules import feed_interval
+from utils.metrics import REGISTRY
+from utils.timing_wheel import WheelScheduler
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443"
+
+POLL_LAG = REGISTRY.histogram(
+    "sbot_price_poll_lag_seconds", "实际拉取时间晚于计划时间的秒数", ["symbol"]
+)
+
+
+class InvalidSymbolError(ValueError):
+    """币安以 400 / -1121 拒绝请求：批量请求中只要有一个无效交易对，整个请求都会失败"""
+
+
+class PriceSource:
+    """价格源基类：持续获取行情，并交给 PriceMonitor 检查波动"""
+
+    # 流式价格源在每个行情推送时检查所有策略，轮询价格源只检查到期策略
+    streaming = False
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    async def run(self):
+        raise NotImplementedError
+
+    def reconfigure(self, added, removed, changed):
+        """监控配置热更新后调整运行中的价格源，参数为变化的交易对列表"""
+
+    def update_intervals(self):
+        """监控配置确定后调整交易对的实际拉取间隔，在恢复价格历史之前调用"""
+
+
+class RestPriceSource(PriceSource):
+    """REST轮询价格源：所有交易对由一个时间轮调度器按拉取间隔定时拉取
+
+    拉取时间按固定计划执行，不随请求耗时漂移；同一 tick 到期的多个交易对
+    合并为一次批量请求，批量请求因无效交易对被拒绝时逐个拉取。上一次拉取尚未完成的交易对跳过本次拉取。
+    """
+
+    def __init__(self, monitor, tick=0.05, jitter=0.0):
+        super().__init__(monitor)
+        self.tick = tick
+        self.jitter = jitter
+        self.scheduler = None
+        # 交易对 -> 进行中的拉取任务
+        self.inflight = {}
+        # 导致批量请求失败的交易对，单独拉取
+        self.isolated = set()
+
+    async def run(self):
+        self.scheduler = WheelScheduler(self._on_due, tick=self.tick, jitter=self.jitter)
+        for symbol, interval in self.monitor.feed_intervals.items():
+            self.scheduler.add(symbol, interval)
+        try:
+            await self.scheduler.run()
+        finally:
+            self.scheduler = None
+            tasks = set(self.inflight.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.inflight = {}
+
+    def reconfigure(self, added, removed, changed):
+        """只调整新增、删除或策略变化的交易对的定时任务，变化的交易对立即拉取一次"""
+        if self.scheduler is None:
+            return
+        # 配置变化后重新尝试批量拉取
+        self.isolated.difference_update(removed + changed)
+        for symbol in removed + changed:
+            self.scheduler.remove(symbol)
+        for symbol in added + changed:
+            if symbol in self.monitor.feed_intervals:
+                self.scheduler.add(symbol, self.monitor.feed_intervals[symbol])
+
+    def _on_due(self, jobs, now):
+        symbols = []
+        for job in jobs:
+            POLL_LAG.observe(job.last_lag, job.key)
+            if job.key in self.inflight:
+                logging.warning(f"{job.key}上次价格拉取尚未完成，跳过本次拉取")
+            else:
+                symbols.append(job.key)
+        batch = [symbol for symbol in symbols if symbol not in self.isolated]
+        if batch:
+            self._start_poll(batch)
+        for symbol in symbols:
+            if symbol in self.isolated:
+                self._start_poll([symbol])
+
+    def _start_poll(self, symbols):
+        if len(symbols) == 1:
+            task = asyncio.create_task(self._poll_symbol(symbols[0]))
+        else:
+            task = asyncio.create_task(self._poll_symbols(symbols))
+        for symbol in symbols:
+            self.inflight[symbol] = task
+        task.add_done_callback(lambda _: self._finish(symbols, task))
+
+    def _finish(self, symbols, task):
+        for symbol in symbols:
+            if self.inflight.get(symbol) is task:
+                del self.inflight[symbol]
+
+    async def _poll_symbol(self, symbol):
+        """拉取单个交易对价格，并分发给订阅该交易对的所有策略，返回是否拉取成功"""
+        try:
+            return await self.monitor.check_prices(symbol) is not None
+        except Exception as e:
+            logging.error(f"{symbol}监控策略执行出错: {str(e)}")
+            return False
+
+    async def _poll_symbols(self, symbols):
+        """同时到期的多个交易对合并为一次批量请求"""
+        try:
+            current_time = datetime.now()
+            prices = await self.monitor.fetch_current_prices(symbols)
+        except InvalidSymbolError:
+            await self._poll_separately(symbols)
+            return
+        except Exception as e:
+            logging.error(f"批量价格监控执行出错: {str(e)}")
+            return
+        if prices is None:
+            # 限流或网络、服务端错误：跳过本轮，不逐个重试以免放大请求量
+            return
+        try:
+            await self.monitor.on_price_batch(prices, current_time)
+        except Exception as e:
+            logging.error(f"批量价格监控执行出错: {str(e)}")
+
+    async def _poll_separately(self, symbols):
+        """批量请求因无效交易对被拒绝时逐个拉取
+
+        其中一个交易对无效（如已下架）时币安会拒绝整个批量请求。逐个拉取后仍然失败的
+        交易对之后单独拉取，不再影响同一批的其他交易对。
+        """
+        logging.warning(f"批量请求中包含无效交易对，{len(symbols)}个交易对改为逐个拉取")
+        results = await asyncio.gather(*(self._poll_symbol(symbol) for symbol in symbols))
+        failed = [symbol for symbol, ok in zip(symbols, results) if not ok]
+        # 全部失败说明是网络或服务端问题，不单独隔离
+        if failed and len(failed) < len(symbols):
+            self.isolated.update(failed)
+            logging.warning(f"以下交易对拉取失败，之后单独拉取: {', '.join(failed)}")
+
+
+class BatchPriceSource(PriceSource):
+    """REST批量价格源：每轮一次请求拉取全部交易对，并批量检查所有规则"""
+
+    def __init__(self, monitor):
+        super().__init__(monitor)
+        self.interval = None
+        # 拉取间隔缩短时唤醒正在等待的拉取循环
+        self.interval_changed = asyncio.Event()
+
+    def update_intervals(self):
+        """所有交易对统一按批量间隔拉取，间隔缩短时唤醒正在等待的拉取循环"""
+        if not self.monitor.feed_intervals:
+            return
+        previous = self.interval
+        self.interval = feed_interval(
+            [
+                strategy
+                for symbol in self.monitor.feed_intervals
+                for strategy in self.monitor.monitor_config[symbol]
+            ]
+        )
+        for symbol in self.monitor.feed_intervals:
+            self.monitor.set_feed_interval(symbol, self.interval)
+        if self.interval != previous:
+            logging.info(f"批量价格拉取间隔: {self.interval}秒")
+        if previous is not None and self.interval < previous:
+            self.interval_changed.set()
+
+    def reconfigure(self, added, removed, changed):
+        self.update_intervals()
+
+    async def run(self):
+        self.update_intervals()
+        self.interval_changed.clear()
+        # 按固定计划拉取，请求耗时不会累积成漂移
+        deadline = time.monotonic()
+        while True:
+            try:
+                POLL_LAG.observe(max(time.monotonic() - deadline, 0.0), "*")
+                current_time = datetime.now()
+                prices = await self.monitor.fetch_current_prices()
+                if prices:
+                    await self.monitor.on_price_batch(prices, current_time)
+                deadline += self.interval
+                if deadline < time.monotonic():
+                    # 拉取耗时超过间隔，从当前时间重新开始计划
+                    deadline = time.monotonic()
+                try:
+                    await asyncio.wait_for(
+                        self.interval_changed.wait(), deadline - time.monotonic()
+                    )
+                except asyncio.TimeoutError:
+                    continue
+                # 间隔已缩短，立即拉取并按新间隔重新计划
+                self.interval_changed.clear()
+                deadline = time.monotonic()
+            except Exception as e:
+                logging.error(f"批量价格监控执行出错: {str(e)}")
+                await asyncio.sleep(60)
+                deadline = time.monotonic()
+
+
+class WebSocketPriceSource(PriceSource):
+    """WebSocket流式价格源：订阅币安组合行情流（miniTicker/bookTicker）
+
+    连接断开时按指数退避重连，重连期间使用REST轮询作为后备价格源。
+    """
+
+    streaming = True
+
+    def __init__(self, monitor, url=None, stream="miniTicker", max_backoff=60, **rest_options):
+        super().__init__(monitor)
+        self.url = (url or BINANCE_WS_URL).rstrip("/")
+        self.stream = stream
+        self.max_backoff = max_backoff
+        self.fallback = RestPriceSource(monitor, **rest_options)
+        self.ws = None
+        self._request_ids = 0
+        self._pending = set()
+
+    def _stream_name(self, symbol):
+        return f"{symbol.lower()}@{self.stream}"
+
+    def _stream_url(self):
+        """构建组合行情流地址"""
+        streams = "/".join(self._stream_name(symbol) for symbol in self.monitor.price_symbols)
+        return f"{self.url}/stream?streams={streams}"
+
+    def reconfigure(self, added, removed, changed):
+        """在当前连接上增减订阅，无需重连；断线期间由 REST 后备轮询处理"""
+        self.fallback.reconfigure(added, removed, changed)
+        if self.ws is None or self.ws.closed:
+            return
+        for method, symbols in (("SUBSCRIBE", added), ("UNSUBSCRIBE", removed)):
+            if symbols:
+                task = asyncio.create_task(self._send_subscription(method, symbols))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+
+    async def _send_subscription(self, method, symbols):
+        self._request_ids += 1
+        try:
+            await self.ws.send_json(
+                {
+                    "method": method,
+                    "params": [self._stream_name(symbol) for symbol in symbols],
+                    "id": self._request_ids,
+                }
+            )
+            logging.info(f"行情流{method}: {', '.join(symbols)}")
+        except Exception as e:
+            # 发送失败说明连接已断开，重连时按最新交易对订阅
+            logging.error(f"更新行情流订阅失败: {str(e)}")
+
+    async def run(self):
+        backoff = 1
+        fallback_task = None
+        try:
+            while True:
+                try:
+                    session = await self.monitor._get_session()
+                    async with session.ws_connect(
+                        self._stream_url(), proxy=self.monitor.proxy, heartbeat=30
+                    ) as ws:
+                        self.ws = ws
+                        logging.info(f"已连接币安行情流: {self.stream}")
+                        backoff = 1
+                        if fallback_task is not None:
+                            fallback_task.cancel()
+                            await asyncio.gather(fallback_task, return_exceptions=True)
+                            fallback_task = None
+                            logging.info("行情流已恢复，停止REST轮询")
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                await self._handle_message(msg.data)
+                            elif msg.type in (
+                                aiohttp.WSMsgType.CLOSED,
+                                aiohttp.WSMsgType.ERROR,
+                            ):
+                                break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"币安行情流连接出错: {str(e)}")
+
+                if fallback_task is None:
+                    fallback_task = asyncio.create_task(
+                        self.fallback.run(), name="price_source_fallback"
+                    )
+                    logging.warning("行情流不可用，临时切换为REST轮询")
+                logging.warning(f"行情流连接断开，{backoff}秒后重连")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        finally:
+            if fallback_task is not None:
+                fallback_task.cancel()
+                await asyncio.gather(fallback_task, return_exceptions=True)
+
+    async def _handle_message(self, raw):
+        """解析行情推送并触发价格检查"""
+        try:
+            payload = json.loads(raw)
+            if "result" in payload and "id" in payload:
+                # 订阅请求的响应
+                return
+            data = payload.get("data", payload)
+            symbol = data["s"]
+            if "c" in data:
+                # miniTicker：最新成交价
+                price = float(data["c"])
+            else:
+                # bookTicker：买一卖一中间价
+                price = (float(data["b"]) + float(data["a"])) / 2
+        except (ValueError, KeyError, TypeError) as e:
+            logging.error(f"解析行情推送失败: {str(e)}")
+            return
+        await self.monitor.on_price_tick(symbol, price, datetime.now())
+
+
+def create_price_source(
+    monitor, source_type="rest", url=None, stream="miniTicker", tick=0.05, jitter=0.0
+):
+    """根据配置创建价格源，未知类型时回退为REST轮询"""
+    if source_type == "websocket":
+        return WebSocketPriceSource(monitor, url=url, stream=stream, tick=tick, jitter=jitter)
+    if source_type == "batch":
+        return BatchPriceSource(monitor)
+    if source_type != "rest":
+        logging.warning(f"不支持的价格源类型: {source_type}，使用REST轮询")
+    return RestPriceSource(monitor, tick=tick, jitter=jitter)
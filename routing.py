@@ -0,0 +1,110 @@
+# encoding: utf-8
+"""Telegram 频道路由：根据配置把 chat_id 映射到有序的处理链
+
+TELEGRAM_ROUTES 配置示例:
+    {
+        "1636146879": ["keyword", "notify"],
+        "-1001456088978": ["keyword", "llm", "notify"],
+        "default": ["keyword", "notify"]
+    }
+
+处理链中任一步骤返回 False 即停止处理。步骤按开销排序，关键词过滤等廉价步骤
+总是在模型调用之前执行，大部分消息不会触发模型调用。
+"""
+import logging
+
+from strategy.base import BaseHandler, MessageContext
+
+DEFAULT_ROUTE = "default"
+
+# 步骤名 -> 开销等级，数值越小越先执行
+STEP_COSTS = {"keyword": 0, "llm": 1, "notify": 2}
+
+
+class HandlerRegistry:
+    """按需创建处理器实例，未使用模型步骤时不加载模型相关依赖"""
+
+    def __init__(self):
+        self._base = None
+        self._pannews = None
+
+    def base(self):
+        if self._base is None:
+            self._base = BaseHandler()
+        return self._base
+
+    def pannews(self):
+        if self._pannews is None:
+            from strategy.pannews import PANNewsHandler
+
+            self._pannews = PANNewsHandler()
+        return self._pannews
+
+    def step(self, name):
+        if name == "keyword":
+            return self.base().keyword_filter
+        if name == "llm":
+            return self.pannews().llm_filter
+        if name == "notify":
+            return self.base().notify
+        raise ValueError(f"不支持的处理步骤: {name}")
+
+
+class Route:
+    """一条路由的处理链"""
+
+    def __init__(self, name, steps):
+        self.name = name
+        # [(步骤名, 步骤函数), ...]
+        self.steps = steps
+
+    def describe(self):
+        return f"{self.name}: {' -> '.join(name for name, _ in self.steps)}"
+
+    async def __call__(self, event):
+        context = MessageContext(event)
+        for name, step in self.steps:
+            if not await step(context):
+                logging.info(f"消息在 {name} 步骤被过滤")
+                return False
+        return True
+
+
+class RouteTable:
+    """预编译的路由表：chat_id 到处理链的 O(1) 查找"""
+
+    def __init__(self, routes, default=None):
+        self.routes = routes
+        self.default = default
+
+    @property
+    def chat_ids(self):
+        return list(self.routes)
+
+    def resolve(self, chat_id):
+        return self.routes.get(chat_id, self.default)
+
+
+def _compile_steps(chat_id, names, registry):
+    ordered = sorted(names, key=lambda name: STEP_COSTS.get(name, len(STEP_COSTS)))
+    if ordered != list(names):
+        logging.warning(f"路由 {chat_id} 的处理步骤已按开销重新排序: {' -> '.join(ordered)}")
+    return Route(str(chat_id), [(name, registry.step(name)) for name in ordered])
+
+
+def build_route_table(config, registry):
+    """根据 TELEGRAM_ROUTES 配置构建路由表，配置有误时抛出 ValueError"""
+    routes = {}
+    default = None
+    for chat_id, names in config.items():
+        if not names:
+            continue
+        if chat_id == DEFAULT_ROUTE:
+            default = _compile_steps(chat_id, names, registry)
+            continue
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"无效的频道ID: {chat_id}")
+        routes[chat_id] = _compile_steps(chat_id, names, registry)
+    return RouteTable(routes, default)
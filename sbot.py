@@ -1,25 +1,47 @@
 # encoding: utf-8
 import asyncio
 import logging
+import sys
 from config import CONFIG_MANAGER
-from telegram_notifier import TelegramNotifier
-from price_monitor import PriceMonitor
-from utils.log import setup_logging
+from utils.log import setup_logging, shutdown_logging
+from utils.metrics import monitor_event_loop_lag, start_metrics_server
 
 
-# ========== 主程序入口 ==========
-async def main():
-    setup_logging()
-    logging.info("启动Telegram监听服务和价格监控服务")
+def start_logging(log_file=None):
+    setup_logging(
+        async_mode=CONFIG_MANAGER.get("LOG_ASYNC"),
+        json_format=CONFIG_MANAGER.get("LOG_JSON"),
+        info_rate=CONFIG_MANAGER.get("LOG_INFO_RATE", 0),
+        log_file=log_file or CONFIG_MANAGER.get("LOG_FILE", "sbot.log"),
+    )
 
-    tasks = []
-    if CONFIG_MANAGER.get('ENABLE_PRICE_MONITOR'):
-        price_monitor = PriceMonitor()
-        tasks.append(asyncio.create_task(price_monitor.start_monitoring()))
-    if CONFIG_MANAGER.get('ENABLE_TELEGRAM_LISTENER'):
-        telegram_notifier = TelegramNotifier()
-        tasks.append(asyncio.create_task(telegram_notifier.start_notifier()))
 
+def run_event_loop(coroutine):
+    """运行事件循环，配置启用且已安装 uvloop 时使用 uvloop"""
+    if CONFIG_MANAGER.get("USE_UVLOOP"):
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("未安装 uvloop，使用默认事件循环")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(coroutine)
+
+
+async def run_services(services, metrics_port=None):
+    """运行服务协程直到结束或出错，期间提供指标服务，退出时清理资源"""
+    metrics_server = None
+    lag_task = None
+    if metrics_port:
+        try:
+            metrics_server = await start_metrics_server(
+                CONFIG_MANAGER.get("METRICS_HOST"), metrics_port
+            )
+        except OSError as e:
+            logging.error(f"指标服务启动失败: {str(e)}")
+        lag_task = asyncio.create_task(monitor_event_loop_lag(), name="event_loop_lag")
+
+    tasks = [asyncio.create_task(service()) for service in services]
     try:
         await asyncio.gather(*tasks)
     except KeyboardInterrupt:
@@ -30,8 +52,51 @@ async def main():
         # 清理资源
         for task in tasks:
             task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if lag_task is not None:
+            lag_task.cancel()
+            await asyncio.gather(lag_task, return_exceptions=True)
+        if metrics_server is not None:
+            metrics_server.close()
+            await metrics_server.wait_closed()
+        # 只有用到钉钉通知的服务才会加载发送队列模块
+        dingtalk = sys.modules.get("utils.dingtalk")
+        if dingtalk is not None:
+            await dingtalk.close_dispatcher()
+
+
+# ========== 主程序入口 ==========
+async def main():
+    start_logging()
+    CONFIG_MANAGER.start_watching()
+    logging.info("启动Telegram监听服务和价格监控服务")
+
+    # 只导入已启用的服务，未启用 Telegram 监听时不加载 Telethon
+    services = []
+    if CONFIG_MANAGER.get('ENABLE_PRICE_MONITOR'):
+        from price_monitor import PriceMonitor
+
+        price_monitor = PriceMonitor()
+        services.append(price_monitor.start_monitoring)
+    if CONFIG_MANAGER.get('ENABLE_TELEGRAM_LISTENER'):
+        from telegram_notifier import TelegramNotifier
+
+        telegram_notifier = TelegramNotifier()
+        services.append(telegram_notifier.start_notifier)
+
+    try:
+        await run_services(services, CONFIG_MANAGER.get("METRICS_PORT"))
+    finally:
+        CONFIG_MANAGER.stop_watching()
         logging.info("程序已关闭")
+        shutdown_logging()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if CONFIG_MANAGER.get("PRICE_WORKERS", 0) > 0:
+        # 多进程模式：价格监控分片到多个工作进程
+        from cluster import Supervisor
+
+        Supervisor().run()
+    else:
+        run_event_loop(main())
@@ -1,26 +1,69 @@
 # encoding: utf-8
-import asyncio
 import logging
 from os import linesep
 from config import CONFIG_MANAGER
-from utils.dingtalk import send_dingtalk_notification
+from utils.cache import AlertSuppressor
+from utils.dingtalk import get_dispatcher
+from utils.keywords import KeywordMatcher
 
-# 需要转发的关键词
+# 需要转发的关键词（未配置 KEY_WORDS 时使用）
 KEY_WORDS = ["TGE", "xiaosongluo"]
 
+# 所有消息处理器共享的去重缓存，避免重试或重复转发时发送相同内容
+MESSAGE_SUPPRESSOR = AlertSuppressor(
+    cooldown=CONFIG_MANAGER.get("MESSAGE_DEDUP_TTL", 3600)
+)
+
+
+class MessageContext:
+    """一条消息在处理链中传递的上下文"""
+
+    def __init__(self, event):
+        self.event = event
+        self.text = event.message.text or ""
+        # 命中的关键词、附加到通知末尾的内容（如模型分析结果）
+        self.keywords = []
+        self.notes = []
+
 
 class BaseHandler:
     def __init__(self):
-        pass
+        self.keyword_matcher = KeywordMatcher()
+        self._keyword_config = None
 
     async def handle_message(self, event):
-        content = self._parse_message(event)
+        context = MessageContext(event)
+        if await self.keyword_filter(context):
+            await self.notify(context)
 
-        if any(keyword in content for keyword in KEY_WORDS):
-            markdown_text = self._format_message(content)
-            await self._send_notification(markdown_text)
-        else:
-            logging.info(f"非关注信息: {content.replace(linesep, ' ')}")
+    async def keyword_filter(self, context):
+        """处理链步骤：消息命中关键词时通过"""
+        context.keywords = self._match_keywords(context.text)
+        if not context.keywords:
+            logging.info(f"非关注信息: {context.text.replace(linesep, ' ')}")
+            return False
+        return True
+
+    async def notify(self, context):
+        """处理链步骤：发送钉钉通知"""
+        content = self._parse_message(context.event)
+        markdown_text = self._format_message(content, context.keywords)
+        await self._send_notification(markdown_text + "".join(context.notes))
+        return True
+
+    def _match_keywords(self, text):
+        """在原始消息文本中匹配关键词，配置热更新后增量更新关键词表"""
+        keywords = CONFIG_MANAGER.get("KEY_WORDS", KEY_WORDS)
+        if keywords is not self._keyword_config:
+            case_sensitive = CONFIG_MANAGER.get("KEYWORD_CASE_SENSITIVE", True)
+            if case_sensitive != self.keyword_matcher.case_sensitive:
+                # 大小写模式变化需要重建关键词表
+                self.keyword_matcher = KeywordMatcher(case_sensitive=case_sensitive)
+            self.keyword_matcher.whole_word = CONFIG_MANAGER.get("KEYWORD_WHOLE_WORD", False)
+            self.keyword_matcher.update(keywords)
+            self._keyword_config = keywords
+            logging.info(f"关键词列表已更新: {', '.join(keywords)}")
+        return self.keyword_matcher.find(text)
 
     def _parse_message(self, event):
         """解析消息内容"""
@@ -51,20 +94,16 @@ class BaseHandler:
                 media_info.append(f"🎥 视频：{msg.video.duration}秒\n")
         return media_info
 
-    def _format_message(self, content):
+    def _format_message(self, content, keywords=None):
         """格式化消息内容"""
+        if keywords:
+            content += f"\n🔑 关键词：{', '.join(keywords)}\n"
         return f"**Telegram 频道更新**\n\n{content}\n"
 
     async def _send_notification(self, markdown_text):
-        """发送钉钉通知"""
-        try:
-            await asyncio.to_thread(
-                send_dingtalk_notification,
-                "📢同步通知",
-                markdown_text,
-                CONFIG_MANAGER.get('DING_SECRET'),
-                CONFIG_MANAGER.get('DING_TOKEN'),
-            )
-            logging.info("钉钉通知发送成功")
-        except Exception as e:
-            logging.error(f"钉钉通知发送失败: {str(e)}")
+        """发送钉钉通知（加入异步发送队列）"""
+        if not MESSAGE_SUPPRESSOR.should_send_message(markdown_text):
+            logging.info("重复消息，已跳过发送")
+            return
+        get_dispatcher().enqueue("📢同步通知", markdown_text)
+        logging.info("钉钉通知已加入发送队列")
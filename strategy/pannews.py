@@ -1,32 +1,54 @@
 # encoding: utf-8
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
 from http import HTTPStatus
 import json
 import logging
 from os import linesep
 from config import CONFIG_MANAGER
-from strategy.base import BaseHandler
+from strategy.base import BaseHandler, MessageContext
+from utils.cache import DiskCache, TTLCache, content_hash
+from utils.simhash import SimHashIndex, simhash
 from dashscope import Application
 
 
 class PANNewsHandler(BaseHandler):
     def __init__(self):
-        pass
+        super().__init__()
+        # 同时进行的模型调用数上限；调用在专用线程池中执行，不阻塞事件循环，
+        # 超时未返回的调用也不会占满其他模块共用的默认线程池
+        concurrency = CONFIG_MANAGER.get("LLM_CONCURRENCY", 2)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        self.timeout = CONFIG_MANAGER.get("LLM_TIMEOUT", 60)
+        # 分析结果缓存：内存 LRU + 可选的磁盘缓存（重启后复用）
+        ttl = CONFIG_MANAGER.get("LLM_CACHE_TTL", 86400)
+        self.result_cache = TTLCache(maxsize=2048, ttl=ttl)
+        cache_path = CONFIG_MANAGER.get("LLM_CACHE_PATH")
+        self.disk_cache = DiskCache(cache_path, ttl) if cache_path else None
+        # 近似重复检测：转发/改写的新闻复用原文的分析结果
+        self.near_duplicates = SimHashIndex(
+            max_distance=CONFIG_MANAGER.get("LLM_SIMHASH_DISTANCE", 3), ttl=ttl
+        )
 
     async def handle_message(self, event):
         # 处理消息的逻辑
         logging.info(f"Handling PANNews message: {event}")
 
-        content = self._parse_message(event)
-        markdown_text = self._format_message(content)
-        msg = event.message
+        context = MessageContext(event)
+        if await self.llm_filter(context):
+            await self.notify(context)
 
-        analysis_result = await self._analyze_content(msg.text)
+    async def llm_filter(self, context):
+        """处理链步骤：模型判断为强相关且正在发生的有影响消息时通过"""
+        analysis_result = await self._get_analysis(context.text) if context.text else None
 
         if analysis_result:
             try:
                 # 解析 JSON 字符串
                 result_dict = json.loads(
-                    analysis_result.text.strip("```json\n").strip("```")
+                    analysis_result.strip("```json\n").strip("```")
                 )
                 if result_dict is not None:
                     if (
@@ -36,25 +58,82 @@ class PANNewsHandler(BaseHandler):
                         and result_dict.get("tense") == "PRESENT"
                         and result_dict.get("analysis") != "NONE"
                     ):
-                        await self._send_notification(
-                            markdown_text
-                            + f"\n分析结果: {result_dict['result']}\n分析详情: {result_dict['analysis']}"
+                        context.notes.append(
+                            f"\n分析结果: {result_dict['result']}\n分析详情: {result_dict['analysis']}"
                         )
+                        return True
                     else:
-                        logging.info(f"非关注信息: {content.replace(linesep, ' ')}")
+                        logging.info(f"非关注信息: {context.text.replace(linesep, ' ')}")
             except (json.JSONDecodeError, KeyError) as e:
                 logging.error(f"解析分析结果时出错: {e}")
         else:
-            logging.info(f"非关注信息: {content.replace(linesep, ' ')}")
+            logging.info(f"非关注信息: {context.text.replace(linesep, ' ')}")
+        return False
 
-    async def _analyze_content(self, content):
-        try:
-            logging.info(f"Handling PANNews message LLM prompt: {content}")
-            response = Application.call(
+    async def _get_analysis(self, text):
+        """获取分析结果：依次查找精确缓存、近似重复，最后调用模型"""
+        digest = content_hash(text)
+        result = await self._get_cached(digest)
+        if result is not None:
+            logging.info("命中分析结果缓存，跳过模型调用")
+            return result
+
+        fingerprint = simhash(text)
+        duplicate_digest = self.near_duplicates.find(fingerprint)
+        if duplicate_digest is not None:
+            result = await self._get_cached(duplicate_digest)
+            if result is not None:
+                logging.info("检测到近似重复消息，复用已有分析结果")
+                return result
+
+        result = await self._analyze_content(text)
+        if result is not None:
+            await self._set_cached(digest, result)
+            self.near_duplicates.add(fingerprint, digest)
+        return result
+
+    async def _get_cached(self, digest):
+        result = self.result_cache.get(digest)
+        if result is None and self.disk_cache is not None:
+            result = await asyncio.to_thread(self.disk_cache.get, digest)
+            if result is not None:
+                self.result_cache.set(digest, result)
+        return result
+
+    async def _set_cached(self, digest, result):
+        self.result_cache.set(digest, result)
+        if self.disk_cache is not None:
+            await asyncio.to_thread(self.disk_cache.set, digest, result)
+
+    async def _call_model(self, content):
+        """在专用线程池中调用模型
+
+        超时后不再等待结果，但线程中的调用无法中断，名额保留到调用实际结束，
+        因此同时运行的调用数始终不超过上限。
+        """
+        await self.semaphore.acquire()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            functools.partial(
+                Application.call,
                 api_key=CONFIG_MANAGER.get("DASHSCOPE_API_KEY"),
                 app_id=CONFIG_MANAGER.get("DASHSCOPE_APP_ID"),
                 prompt=content,
-            )
+            ),
+        )
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+
+    def _release(self, future):
+        self.semaphore.release()
+        # 标记异常已取出：超时后无人等待的调用出错时，不再报告异常未被处理
+        if not future.cancelled():
+            future.exception()
+
+    async def _analyze_content(self, content):
+        try:
+            logging.info(f"Handling PANNews message LLM prompt: {content}")
+            response = await self._call_model(content)
             if response.status_code != HTTPStatus.OK:
                 logging.error(f"request_id={response.request_id}")
                 logging.error(f"code={response.status_code}")
@@ -68,10 +147,13 @@ class PANNewsHandler(BaseHandler):
                     logging.info(
                         f"Handling PANNews message LLM raw result: {response.output}"
                     )
-                    return response.output
+                    return response.output.text
                 except AttributeError:
                     logging.error("无法从响应中获取输出信息。")
                     return None
+        except asyncio.TimeoutError:
+            logging.error(f"调用百炼模型超时（{self.timeout}秒）")
+            return None
         except Exception as e:
             logging.error(f"调用百炼模型时发生错误: {e}")
             return None
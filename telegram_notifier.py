@@ -2,12 +2,31 @@
 import asyncio
 from datetime import datetime
 import logging
-import traceback
+import time
 from telethon import TelegramClient, events
 from telethon.errors import RPCError
 from config import CONFIG_MANAGER
-import strategy.base
-import strategy.pannews
+from message_pipeline import MessagePipeline
+from routing import HandlerRegistry, RouteTable, build_route_table
+from utils.message_cursor import MessageCursors
+from utils.metrics import REGISTRY
+
+HANDLE_LATENCY = REGISTRY.histogram(
+    "sbot_telegram_handle_seconds", "Telegram 消息处理链耗时", ["route"]
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "sbot_telegram_queue_depth", "Telegram 消息流水线各阶段的消息数", ["stage"]
+)
+MESSAGES = REGISTRY.counter("sbot_telegram_messages_total", "Telegram 消息处理结果", ["result"])
+CATCHUP_MESSAGES = REGISTRY.counter(
+    "sbot_telegram_catchup_messages_total", "重连后补拉的离线消息数"
+)
+CATCHUP_LATENCY = REGISTRY.histogram("sbot_telegram_catchup_seconds", "补拉离线消息耗时")
+
+# 连接断开后重新连接前的等待时间（秒）
+RECONNECT_DELAY = 10
+# 连续重连失败时等待时间翻倍的上限（秒）
+MAX_RECONNECT_DELAY = 300
 
 
 class TelegramNotifier:
@@ -29,61 +48,161 @@ class TelegramNotifier:
         else:
             raise ValueError(f"不支持的环境: {env}")
 
-    async def start_notifier(self):
-        # 实例化
-        base_handler = strategy.base.BaseHandler()
-        pannews_handler = strategy.pannews.PANNewsHandler()
-
-        # 定义不同频道的处理策略
-        self.channel_handlers = {
-            1636146879: base_handler.handle_message,  # xiaosongluo
-            7995411861: base_handler.handle_message,  # cqulxs
-            -1002450025950: base_handler.handle_message,  # Binance Wallet Anncouncements
-            # -1001456088978: pannews_handler.handle_message,  # PANNews
-            # 默认处理函数
-            # "default": strategy.default.default_handler,
+        # 消息处理流水线：回调只负责接入，处理器在工作协程中并发执行
+        self.pipeline = MessagePipeline(
+            self._handle_event,
+            workers=CONFIG_MANAGER.get("TELEGRAM_WORKERS", 4),
+            maxsize=CONFIG_MANAGER.get("TELEGRAM_QUEUE_SIZE", 1000),
+            max_retries=CONFIG_MANAGER.get("TELEGRAM_MAX_RETRIES", 5),
+            retry_base=CONFIG_MANAGER.get("TELEGRAM_RETRY_BASE", 2.0),
+            retry_max=CONFIG_MANAGER.get("TELEGRAM_RETRY_MAX", 60.0),
+            retry_exceptions=(RPCError,),
+            on_done=self._on_message_done,
+        )
+        # 各频道已处理到的消息 ID，重连或重启后从该位置补拉离线期间的消息
+        self.cursors = MessageCursors(
+            CONFIG_MANAGER.get("TELEGRAM_CURSOR_FILE", "telegram_cursors.json")
+        )
+        # 补拉期间暂存的实时消息，补拉的消息全部接入后再按顺序接入
+        self.held_events = None
+        QUEUE_DEPTH.set_function(self._queue_depths)
+        MESSAGES.set_function(self._message_counts)
+
+    def _queue_depths(self):
+        stats = self.pipeline.stats()
+        return {(stage,): stats[stage] for stage in ("pending", "in_progress", "retry_pending")}
+
+    def _message_counts(self):
+        stats = self.pipeline.stats()
+        return {
+            (result,): stats[result] for result in ("processed", "failed", "retried", "dropped")
         }
-        # 从 channel_handlers 中形成 TARGET_CHANNELS
-        self.TARGET_CHANNELS = list(self.channel_handlers.keys())
-        if "default" in self.TARGET_CHANNELS:
-            self.TARGET_CHANNELS.remove("default")
-
-        # 初始化事件监听
-        self.client.add_event_handler(
-            self.on_channel_message, events.NewMessage(chats=self.TARGET_CHANNELS)
+
+    def _load_routes(self, config, previous=None):
+        """根据配置重建路由表，构建完成后整体替换，处理中的消息不受影响"""
+        try:
+            routes = build_route_table(config.get("TELEGRAM_ROUTES", {}), self.registry)
+        except ValueError as e:
+            logging.error(f"频道路由配置有误，保留原路由: {str(e)}")
+            return
+        self.routes = routes
+        for route in list(routes.routes.values()) + [routes.default]:
+            if route is not None:
+                logging.info(f"频道路由: {route.describe()}")
+
+    def start_pipeline(self):
+        """构建频道路由表并启动处理流水线，之后即可向 on_channel_message 投递消息"""
+        # 按配置构建频道路由表，.env 变更时重建
+        self.registry = HandlerRegistry()
+        self.routes = RouteTable({})
+        self._load_routes(CONFIG_MANAGER.config)
+        CONFIG_MANAGER.subscribe(
+            self._load_routes, keys=["TELEGRAM_ROUTES"], loop=asyncio.get_running_loop()
         )
+        self.pipeline.start()
 
-        await self.client.connect()
-        if not await self.client.is_user_authorized():
-            logging.error("Telegram客户端未授权，请检查API_ID和API_HASH")
-            exit(1)
-        await self.client.run_until_disconnected()
-
-        while True:
-            try:
-                utc_now = datetime.now()
-                logging.info(f"Telegram 事件监听中: {utc_now}")
-                await asyncio.sleep(60)
-            except Exception as e:
-                logging.error(f"Telegram 事件监听过程中发生错误: {str(e)}")
-                await asyncio.sleep(60)  # 发生错误时等待更长时间
+    async def start_notifier(self):
+        self.start_pipeline()
+        # 初始化事件监听：监听所有新消息，由路由表过滤，路由变更无需重新注册
+        self.client.add_event_handler(self.on_channel_message, events.NewMessage())
+        cursor_task = asyncio.create_task(self.cursors.run(), name="telegram_cursors")
 
-    async def on_channel_message(self, event):
-        """处理频道消息"""
+        delay = RECONNECT_DELAY
         try:
-            chat_id = (
-                event.chat_id if isinstance(event.chat_id, int) else str(event.chat_id)
-            )
-            logging.info(f"chat_id 转换: 转换前{event.chat_id}，转换后{chat_id}")
-            handler = self.channel_handlers.get(chat_id)
-            logging.info(f"handler锁定: {handler.__qualname__}")
-            if handler is not None:
-                await handler(event)
-        except RPCError as e:
-            logging.error(f"网络错误: {str(e)}, 10秒后重试")
-            await asyncio.sleep(10)
-            await self.on_channel_message(event)
-        except Exception as e:
-            # 打印详细的堆栈信息
-            stack_info = traceback.format_exc()
-            logging.error(f"处理消息失败: {str(e)}\n{stack_info}")
+            while True:
+                try:
+                    # 补拉完成前暂存实时消息，保证每个频道的消息按顺序处理
+                    self.held_events = []
+                    try:
+                        await self.client.connect()
+                        if not await self.client.is_user_authorized():
+                            logging.error("Telegram客户端未授权，请检查API_ID和API_HASH")
+                            exit(1)
+                        await self.catch_up()
+                    finally:
+                        # 补拉失败时丢弃暂存的消息，重连后由补拉重新获取
+                        held, self.held_events = self.held_events, None
+                    for event in held:
+                        await self._submit(event)
+                    delay = RECONNECT_DELAY
+                    logging.info(f"Telegram 事件监听中: {datetime.now()}")
+                    await self.client.run_until_disconnected()
+                    logging.warning(f"Telegram 连接已断开，{delay}秒后重连并补拉离线消息")
+                except (OSError, RPCError) as e:
+                    # Telethon 自动重连失败时 run_until_disconnected 抛出最后的网络错误
+                    logging.error(f"Telegram 连接出错: {str(e)}，{delay}秒后重连并补拉离线消息")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+        finally:
+            cursor_task.cancel()
+            await asyncio.gather(cursor_task, return_exceptions=True)
+
+    async def catch_up(self):
+        """补拉各频道离线期间的消息，按消息顺序接入处理流水线
+
+        只补拉路由表中明确配置且有已处理位置的频道（默认路由无法枚举频道）。
+        各频道并发拉取，每个频道一次 get_messages（Telethon 按每批100条分页），
+        离线消息超过 TELEGRAM_CATCHUP_LIMIT 条时只补拉最新的部分。
+        """
+        chat_ids = [chat_id for chat_id in self.routes.chat_ids if self.cursors.get(chat_id)]
+        if not chat_ids:
+            return
+        started_at = time.perf_counter()
+        limit = CONFIG_MANAGER.get("TELEGRAM_CATCHUP_LIMIT", 500)
+        semaphore = asyncio.Semaphore(CONFIG_MANAGER.get("TELEGRAM_CATCHUP_CONCURRENCY", 6))
+
+        async def fetch(chat_id):
+            async with semaphore:
+                return await self.client.get_messages(
+                    chat_id, limit=limit, min_id=self.cursors.get(chat_id)
+                )
+
+        results = await asyncio.gather(
+            *(fetch(chat_id) for chat_id in chat_ids), return_exceptions=True
+        )
+        total = 0
+        for chat_id, messages in zip(chat_ids, results):
+            if isinstance(messages, Exception):
+                logging.error(f"补拉频道{chat_id}离线消息失败: {str(messages)}")
+                continue
+            if len(messages) >= limit:
+                logging.warning(f"频道{chat_id}离线消息超过{limit}条，只补拉最新的{limit}条")
+            # get_messages 按从新到旧返回
+            for message in reversed(messages):
+                if await self._submit(events.NewMessage.Event(message)):
+                    total += 1
+        CATCHUP_MESSAGES.inc(amount=total)
+        CATCHUP_LATENCY.observe(time.perf_counter() - started_at)
+        logging.info(
+            f"已补拉{len(chat_ids)}个频道的{total}条离线消息，"
+            f"耗时{time.perf_counter() - started_at:.2f}秒"
+        )
+
+    async def on_channel_message(self, event):
+        """处理频道消息：有路由的消息接入处理流水线，流水线已满时等待"""
+        if self.routes.resolve(event.chat_id) is None:
+            return
+        if self.held_events is not None:
+            self.held_events.append(event)
+            return
+        await self._submit(event)
+
+    async def _submit(self, event):
+        """接入处理流水线，已接入过的消息（补拉与实时消息重叠）跳过"""
+        if not self.cursors.begin(event.chat_id, event.id):
+            return False
+        await self.pipeline.submit(event.chat_id, event)
+        return True
+
+    def _on_message_done(self, chat_id, event):
+        self.cursors.finish(chat_id, event.id)
+
+    async def _handle_event(self, event):
+        """在流水线工作协程中执行频道的处理链，RPCError 由流水线延迟重试"""
+        route = self.routes.resolve(event.chat_id)
+        if route is None:
+            logging.info(f"未配置路由的频道: {event.chat_id}")
+            return
+        logging.info(f"路由锁定: {route.describe()}")
+        with HANDLE_LATENCY.time(route.name):
+            await route(event)
@@ -0,0 +1,161 @@
+# encoding: utf-8
+"""WebSocketPriceSource 测试：用本地 aiohttp WebSocket 服务模拟币安组合行情流
+
+用法: python -m pytest tests 或 python -m unittest discover tests
+"""
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from price_source import WebSocketPriceSource  # noqa: E402
+
+# 等待异步条件成立的最长时间（秒）
+WAIT_TIMEOUT = 5
+
+
+class FakeMonitor:
+    """只实现价格源用到的 PriceMonitor 接口，记录收到的推送和后备轮询"""
+
+    def __init__(self, symbols, interval=0.1):
+        self.price_symbols = list(symbols)
+        self.feed_intervals = {symbol: interval for symbol in symbols}
+        self.proxy = None
+        self.session = None
+        self.ticks = []
+        self.polls = []
+
+    async def _get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        return self.session
+
+    async def on_price_tick(self, symbol, price, timestamp):
+        self.ticks.append((symbol, price))
+
+    async def check_prices(self, symbol):
+        self.polls.append(symbol)
+        return 1.0
+
+    async def fetch_current_prices(self, symbols=None):
+        self.polls.extend(symbols or self.price_symbols)
+        return {symbol: 1.0 for symbol in symbols or self.price_symbols}
+
+    async def on_price_batch(self, prices, timestamp):
+        pass
+
+
+class FakeStream:
+    """模拟 /stream 接口：每次连接依次发送 scripts 中对应的消息
+
+    drop 为 True 的连接发送完消息后由服务端关闭，否则保持连接直到测试结束。
+    """
+
+    def __init__(self, scripts):
+        self.scripts = list(scripts)
+        self.connections = 0
+        self.streams = []
+        self.closed = asyncio.Event()
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.streams.append(request.query.get("streams"))
+        messages, drop = self.scripts[min(self.connections, len(self.scripts) - 1)]
+        self.connections += 1
+        for message in messages:
+            await ws.send_str(message if isinstance(message, str) else json.dumps(message))
+        if not drop:
+            await self.closed.wait()
+        await ws.close()
+        return ws
+
+
+def mini_ticker(symbol, price):
+    stream = f"{symbol.lower()}@miniTicker"
+    return {"stream": stream, "data": {"e": "24hrMiniTicker", "s": symbol, "c": str(price)}}
+
+
+def book_ticker(symbol, bid, ask):
+    stream = f"{symbol.lower()}@bookTicker"
+    return {"stream": stream, "data": {"s": symbol, "b": str(bid), "a": str(ask)}}
+
+
+async def wait_for(condition):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WAIT_TIMEOUT
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.01)
+
+
+class WebSocketPriceSourceTest(unittest.IsolatedAsyncioTestCase):
+    async def start(self, scripts, symbols=("BTCUSDT", "ETHUSDT")):
+        self.stream = FakeStream(scripts)
+        app = web.Application()
+        app.router.add_get("/stream", self.stream.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+
+        self.monitor = FakeMonitor(symbols)
+        self.source = WebSocketPriceSource(
+            self.monitor, url=f"http://127.0.0.1:{port}/", max_backoff=1, tick=0.01
+        )
+        self.task = asyncio.create_task(self.source.run())
+
+    async def asyncTearDown(self):
+        self.stream.closed.set()
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        if self.monitor.session is not None:
+            await self.monitor.session.close()
+        await self.runner.cleanup()
+
+    async def test_parses_stream_messages(self):
+        messages = [
+            {"result": None, "id": 1},
+            "not json",
+            {"stream": "btcusdt@miniTicker", "data": {"s": "BTCUSDT"}},
+            mini_ticker("BTCUSDT", 100.5),
+            book_ticker("ETHUSDT", 2000, 2001),
+        ]
+        await self.start([(messages, False)])
+        await wait_for(lambda: len(self.monitor.ticks) == 2)
+
+        # 订阅响应和无法解析的推送被忽略，bookTicker 取买一卖一中间价
+        self.assertEqual(self.monitor.ticks, [("BTCUSDT", 100.5), ("ETHUSDT", 2000.5)])
+        self.assertEqual(self.stream.streams, ["btcusdt@miniTicker/ethusdt@miniTicker"])
+        self.assertEqual(self.monitor.polls, [])
+
+    async def test_fallback_until_stream_returns(self):
+        await self.start(
+            [([mini_ticker("BTCUSDT", 100)], True), ([mini_ticker("BTCUSDT", 101)], False)]
+        )
+
+        # 连接断开后在退避重连期间由 REST 轮询获取价格
+        await wait_for(lambda: self.stream.connections == 1 and self.monitor.polls)
+        self.assertIsNotNone(self.source.fallback.scheduler)
+
+        # 行情流恢复后停止 REST 轮询
+        await wait_for(lambda: ("BTCUSDT", 101.0) in self.monitor.ticks)
+        self.assertEqual(self.stream.connections, 2)
+        self.assertIsNone(self.source.fallback.scheduler)
+        polls = len(self.monitor.polls)
+        await asyncio.sleep(0.3)
+        self.assertEqual(len(self.monitor.polls), polls)
+        self.assertEqual(self.monitor.ticks, [("BTCUSDT", 100.0), ("BTCUSDT", 101.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# encoding: utf-8
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """带过期时间的LRU缓存：超过 maxsize 时淘汰最久未使用的条目"""
+
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # 时钟可替换，回测时使用模拟时间
+        self.clock = clock
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < self.clock():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (self.clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+
+def content_hash(content):
+    """消息内容的哈希，用作去重键"""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class AlertSuppressor:
+    """告警抑制：冷却期内相同告警只发送一次
+
+    价格告警按 (交易对, 方向, 策略) 去重，冷却期内只有涨跌幅比上次告警
+    再扩大 escalation_step 个百分点时才再次发送（"持续波动"升级告警）；
+    消息类告警按内容哈希去重。
+    """
+
+    def __init__(self, cooldown=300.0, escalation_step=2.0, maxsize=4096, clock=time.monotonic):
+        self.cooldown = cooldown
+        self.escalation_step = escalation_step
+        self._alerts = TTLCache(maxsize, cooldown, clock)
+
+    def should_send_price_alert(
+        self, symbol, change, strategy_id, cooldown=None, escalation_step=None
+    ):
+        """判断价格告警是否需要发送，需要发送时记录本次涨跌幅"""
+        direction = "up" if change > 0 else "down"
+        key = ("price", symbol, direction, strategy_id)
+        step = self.escalation_step if escalation_step is None else escalation_step
+        last_change = self._alerts.get(key)
+        if last_change is not None and abs(change) < last_change + step:
+            return False
+        self._alerts.set(key, abs(change), cooldown)
+        return True
+
+    def should_send_message(self, content, ttl=None):
+        """判断消息是否需要发送，冷却期内内容相同的消息只发送一次"""
+        key = ("message", content_hash(content))
+        if key in self._alerts:
+            return False
+        self._alerts.set(key, True, ttl)
+        return True
+
+
+class DiskCache:
+    """基于 SQLite 的持久化键值缓存，进程重启后仍可复用，条目按 ttl 过期"""
+
+    def __init__(self, path, ttl=86400.0):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        return row[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,42 @@
 # encoding: utf-8
+import asyncio
 import hmac
 import hashlib
 import base64
+import logging
+import queue
 import time
 import urllib.parse
 from datetime import datetime, timezone, timedelta
 
-import requests
+import aiohttp
+
+from config import CONFIG_MANAGER
+from utils.metrics import REGISTRY
+from utils.rate_limit import SlidingWindowLimiter
+
+DINGTALK_API_URL = "https://oapi.dingtalk.com/robot/send"
+# 钉钉 markdown 消息长度上限约 20000 字节（UTF-8 编码，中文每字3字节），合并消息时留出余量
+MAX_MESSAGE_BYTES = 15000
+# 合并消息之间的分隔线
+MESSAGE_SEPARATOR = "\n\n---\n\n"
+# 发送请求超时（秒）
+SEND_TIMEOUT = 5
+# 机器人发送过快（每分钟超过20条）时的错误码，之后约10分钟内的消息都会被拒绝
+RATE_LIMITED_ERRCODE = 130101
+RATE_LIMITED_PAUSE = 600
+
+SEND_LATENCY = REGISTRY.histogram("sbot_dingtalk_send_seconds", "钉钉消息发送耗时")
+SEND_FAILURES = REGISTRY.counter(
+    "sbot_dingtalk_send_failures_total", "钉钉消息发送失败次数（含重试）", ["reason"]
+)
+DROPPED = REGISTRY.counter("sbot_dingtalk_dropped_total", "重试后仍失败而丢弃的钉钉消息数")
+QUEUE_DEPTH = REGISTRY.gauge("sbot_dingtalk_queue_depth", "等待发送的钉钉消息数")
+
+
+def _message_size(message):
+    """消息按 UTF-8 编码后的字节数"""
+    return len(message.encode("utf-8"))
 
 
 def sign_dingtalk_secret(secret):
@@ -25,7 +55,7 @@ def beijing_time():
 
 def send_dingtalk_notification(title, message, secret, token):
     ts, sign = sign_dingtalk_secret(secret)
-    url = f"https://oapi.dingtalk.com/robot/send?access_token={token}&sign={sign}&timestamp={ts}"
+    url = f"{DINGTALK_API_URL}?access_token={token}&sign={sign}&timestamp={ts}"
 
     headers = {"Content-Type": "application/json"}
     payload = {
@@ -33,5 +63,213 @@ def send_dingtalk_notification(title, message, secret, token):
         "markdown": {"title": title, "text": message},
     }
 
+    # 同步发送接口已很少使用，按需导入 requests
+    import requests
+
     response = requests.post(url, json=payload, headers=headers, timeout=5)
     return response.json()
+
+
+class DingTalkDispatcher:
+    """异步钉钉通知发送队列
+
+    调用方通过 enqueue 非阻塞地加入消息，后台任务使用共享的HTTP连接池发送：
+    - 滑动窗口限流（钉钉机器人每分钟最多20条消息，超出后被禁言10分钟）
+    - 队列积压时将多条消息合并为一条 markdown 消息
+    - 发送失败按指数退避重试
+    """
+
+    def __init__(
+        self,
+        credentials,
+        rate=20,
+        period=60.0,
+        max_batch=10,
+        max_retries=3,
+        url=None,
+    ):
+        # credentials: 返回 (secret, token) 的可调用对象，便于配置热更新后生效
+        self.credentials = credentials
+        # 本地按发出时刻计数，钉钉按收到时刻计数：窗口加上请求超时时间，
+        # 避免网络延迟使前后两个窗口的请求在钉钉侧落入同一分钟
+        self.limiter = SlidingWindowLimiter(rate, period + SEND_TIMEOUT)
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.url = url or DINGTALK_API_URL
+        self.queue = None
+        self.session = None
+        self._worker = None
+        self._signature = None
+        # 合并时超出长度上限的消息，留到下一批发送
+        self._carry = None
+
+    def pending(self):
+        """等待发送的消息数"""
+        if self.queue is None:
+            return 0
+        return self.queue.qsize() + (self._carry is not None)
+
+    def enqueue(self, title, message, alert=None):
+        """加入发送队列，不阻塞事件循环
+
+        alert 为价格告警的冷却键 (交易对, 涨跌幅, 策略, 冷却时间, 升级幅度)，
+        只在多进程模式下由通知进程统一冷却，单进程时已由 PriceMonitor 处理。
+        """
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.queue.put_nowait((title, message))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(
+                self._run(), name="dingtalk_dispatcher"
+            )
+
+    async def close(self):
+        """停止后台发送任务并关闭HTTP会话"""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=SEND_TIMEOUT)
+            )
+        return self.session
+
+    def _sign(self, secret):
+        """复用签名，钉钉要求时间戳在1小时内，这里每10分钟重新签名"""
+        now = time.time()
+        if (
+            self._signature is None
+            or self._signature[0] != secret
+            or now - self._signature[1] > 600
+        ):
+            timestamp, sign = sign_dingtalk_secret(secret)
+            # 签名已做URL编码，作为请求参数传递时需还原
+            self._signature = (secret, now, timestamp, urllib.parse.unquote_plus(sign))
+        return self._signature[2], self._signature[3]
+
+    async def _run(self):
+        while True:
+            if self._carry is not None:
+                first, self._carry = self._carry, None
+            else:
+                first = await self.queue.get()
+            await self.limiter.acquire()
+            # 等待限流期间积压的消息合并发送
+            batch = [first]
+            size = _message_size(first[1])
+            while len(batch) < self.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                item_size = len(MESSAGE_SEPARATOR) + _message_size(item[1])
+                if size + item_size > MAX_MESSAGE_BYTES:
+                    self._carry = item
+                    break
+                batch.append(item)
+                size += item_size
+            title, message = self._merge(batch)
+            await self._send_with_retry(title, message)
+
+    def _merge(self, batch):
+        """合并多条消息为一条 markdown 消息"""
+        if len(batch) == 1:
+            return batch[0]
+        title = f"📢{len(batch)}条通知合并: {batch[0][0]}"
+        message = MESSAGE_SEPARATOR.join(message for _, message in batch)
+        logging.info(f"钉钉消息队列积压，合并{len(batch)}条消息发送")
+        return title, message
+
+    async def _send_with_retry(self, title, message):
+        attempt = 0
+        while attempt <= self.max_retries:
+            try:
+                with SEND_LATENCY.time():
+                    result = await self._send(title, message)
+                errcode = result.get("errcode", 0)
+                if errcode == 0:
+                    logging.info(f"钉钉通知发送成功: {title}")
+                    return True
+                if errcode == RATE_LIMITED_ERRCODE:
+                    # 被限流时短时间重试只会继续失败，等限流解除后重发，不计入重试次数
+                    SEND_FAILURES.inc("rate_limited")
+                    logging.error(f"钉钉机器人已被限流，{RATE_LIMITED_PAUSE}秒后重新发送: {result}")
+                    self.limiter.block(RATE_LIMITED_PAUSE)
+                    await self.limiter.acquire()
+                    continue
+                SEND_FAILURES.inc("errcode")
+                logging.error(f"钉钉通知发送失败: {result}")
+            except Exception as e:
+                SEND_FAILURES.inc("exception")
+                logging.error(f"钉钉通知发送失败: {str(e)}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(min(2**attempt, 30))
+                await self.limiter.acquire()
+            attempt += 1
+        DROPPED.inc()
+        logging.error(f"钉钉通知重试{self.max_retries}次后仍失败，已丢弃: {title}")
+        return False
+
+    async def _send(self, title, message):
+        secret, token = self.credentials()
+        timestamp, sign = self._sign(secret)
+        session = await self._get_session()
+        params = {"access_token": token, "sign": sign, "timestamp": timestamp}
+        payload = {
+            "msgtype": "markdown",
+            "markdown": {"title": title, "text": message},
+        }
+        async with session.post(self.url, params=params, json=payload) as response:
+            return await response.json(content_type=None)
+
+
+class QueueDispatcher:
+    """多进程模式下的发送队列：消息经进程间队列交给通知进程，由其统一限流和发送"""
+
+    def __init__(self, alerts):
+        self.alerts = alerts
+
+    def pending(self):
+        return 0
+
+    def enqueue(self, title, message, alert=None):
+        try:
+            self.alerts.put_nowait((title, message, alert))
+        except queue.Full:
+            DROPPED.inc()
+            logging.error(f"告警队列已满，已丢弃: {title}")
+
+    async def close(self):
+        pass
+
+
+_dispatcher = None
+
+
+def set_dispatcher(dispatcher):
+    """替换全局发送队列，多进程模式下工作进程改为转发给通知进程"""
+    global _dispatcher
+    _dispatcher = dispatcher
+
+
+def get_dispatcher():
+    """获取全局钉钉发送队列（单例）"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = DingTalkDispatcher(
+            lambda: (CONFIG_MANAGER.get("DING_SECRET"), CONFIG_MANAGER.get("DING_TOKEN")),
+            rate=CONFIG_MANAGER.get("DING_RATE_LIMIT", 20),
+            max_batch=CONFIG_MANAGER.get("DING_MAX_BATCH", 10),
+            url=CONFIG_MANAGER.get("DING_URL"),
+        )
+        QUEUE_DEPTH.set_function(_dispatcher.pending)
+    return _dispatcher
+
+
+async def close_dispatcher():
+    """关闭全局钉钉发送队列"""
+    if _dispatcher is not None:
+        await _dispatcher.close()
@@ -0,0 +1,31 @@
+# encoding: utf-8
+import bisect
+import hashlib
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """一致性哈希环：每个节点在环上放置 replicas 个虚拟节点
+
+    键映射到顺时针方向的第一个虚拟节点。增减节点时只有约 1/N 的键改变归属，
+    其余键保持在原节点上。
+    """
+
+    def __init__(self, nodes, replicas=160):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("一致性哈希环至少需要一个节点")
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
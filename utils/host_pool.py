@@ -0,0 +1,180 @@
+# encoding: utf-8
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+
+from utils.metrics import REGISTRY
+
+HOST_LATENCY = REGISTRY.histogram("sbot_api_host_seconds", "各接口地址的请求耗时", ["host"])
+HOST_FAILURES = REGISTRY.counter("sbot_api_host_failures_total", "各接口地址的请求失败次数", ["host"])
+HEDGED_REQUESTS = REGISTRY.counter("sbot_api_hedged_requests_total", "发出的对冲请求数")
+CIRCUIT_OPEN = REGISTRY.gauge("sbot_api_host_circuit_open", "接口地址是否处于熔断状态", ["host"])
+
+# 延迟样本不足时的对冲等待时间（秒）及下限
+DEFAULT_HEDGE_DELAY = 0.5
+MIN_HEDGE_DELAY = 0.05
+
+
+class HostUnavailableError(Exception):
+    """主机级错误（限流、5xx、连接失败等），计入熔断并换用其他地址"""
+
+
+class HostState:
+    """单个接口地址的延迟统计和熔断状态
+
+    - 延迟：EWMA 用于排序，最近 window 个样本的 p95 用于决定对冲等待时间
+    - 熔断：连续失败 failure_threshold 次后熔断 cooldown 秒；到期后进入半开状态，
+      只放行一个探测请求，成功则恢复，失败则熔断时间加倍（不超过 max_cooldown）
+    """
+
+    def __init__(self, url, alpha=0.2, window=100, failure_threshold=3,
+                 cooldown=30.0, max_cooldown=300.0):
+        self.url = url.rstrip("/")
+        self.alpha = alpha
+        self.samples = deque(maxlen=window)
+        self.ewma = None
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = None
+        self.probing = False
+
+    @property
+    def is_open(self):
+        return self.open_until is not None
+
+    def available(self, now):
+        """可以接收请求：未熔断，或熔断到期且没有进行中的探测"""
+        if self.open_until is None:
+            return True
+        return now >= self.open_until and not self.probing
+
+    def p95(self):
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(math.ceil(len(ordered) * 0.95) - 1, len(ordered) - 1)]
+
+    def hedge_delay(self):
+        delay = self.p95()
+        if delay is None:
+            delay = self.ewma * 2 if self.ewma is not None else DEFAULT_HEDGE_DELAY
+        return max(delay, MIN_HEDGE_DELAY)
+
+    def record_latency(self, latency):
+        self.samples.append(latency)
+        self.ewma = latency if self.ewma is None else self.alpha * latency + (1 - self.alpha) * self.ewma
+
+    def record_success(self, latency):
+        self.record_latency(latency)
+        self.failures = 0
+        self.probing = False
+        if self.open_until is not None:
+            logging.info(f"接口地址已恢复: {self.url}")
+            self.open_until = None
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.open_until is not None:
+            # 半开探测失败，延长熔断时间
+            self.probing = False
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.open_until = now + self.cooldown
+        elif self.failures >= self.failure_threshold:
+            self.open_until = now + self.cooldown
+            logging.warning(f"接口地址连续失败{self.failures}次，熔断{self.cooldown:g}秒: {self.url}")
+
+
+class HostPool:
+    """多地址请求池：优先使用延迟最低的健康地址，慢请求对冲，失败地址熔断
+
+    请求先发往 EWMA 延迟最低的可用地址；超过该地址 p95 延迟仍未返回时，
+    向次优地址发出对冲请求，取先成功的结果。请求失败时立即换用下一个地址。
+    """
+
+    def __init__(self, urls, hedge=True, **host_options):
+        if not urls:
+            raise ValueError("至少需要一个接口地址")
+        self.hosts = [HostState(url, **host_options) for url in urls]
+        self.hedge = hedge
+        CIRCUIT_OPEN.set_function(
+            lambda: {(host.url,): int(host.is_open) for host in self.hosts}
+        )
+
+    def ranked(self):
+        """按 EWMA 延迟排序的可用地址；没有样本的地址优先，以便尽快测出延迟"""
+        now = time.monotonic()
+        hosts = [host for host in self.hosts if host.available(now)]
+        if not hosts:
+            # 全部熔断时强制探测最早到期的地址
+            hosts = [min(self.hosts, key=lambda host: host.open_until)]
+        return sorted(hosts, key=lambda host: host.ewma if host.ewma is not None else 0.0)
+
+    async def request(self, fetch):
+        """执行请求：fetch(base_url) 为返回结果的协程函数，主机级错误应抛出异常
+
+        所有地址均失败时抛出最后一个异常。
+        """
+        candidates = self.ranked()
+        attempts = {}
+        last_error = None
+
+        def launch():
+            host = candidates.pop(0)
+            if host.is_open:
+                host.probing = True
+            task = asyncio.ensure_future(self._attempt(host, fetch))
+            attempts[task] = host
+            return host
+
+        primary = launch()
+        try:
+            while attempts:
+                timeout = None
+                if self.hedge and candidates and len(attempts) == 1:
+                    timeout = primary.hedge_delay()
+                done, _ = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 主请求超过 p95 延迟仍未返回，发出对冲请求
+                    HEDGED_REQUESTS.inc()
+                    launch()
+                    continue
+                for task in done:
+                    attempts.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                if not attempts and candidates:
+                    # 请求失败，立即换用下一个地址
+                    launch()
+            raise last_error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _attempt(self, host, fetch):
+        started_at = time.perf_counter()
+        try:
+            result = await fetch(host.url)
+        except asyncio.CancelledError:
+            # 对冲中落败被取消：已等待的时间作为延迟下限计入，否则持续变慢的地址
+            # 因请求总被取消而始终保持较低的 EWMA，一直被选为首选地址
+            host.probing = False
+            host.record_latency(time.perf_counter() - started_at)
+            raise
+        except Exception as e:
+            host.record_failure(time.monotonic())
+            HOST_FAILURES.inc(host.url)
+            logging.error(f"请求{host.url}失败: {str(e) or type(e).__name__}")
+            raise
+        latency = time.perf_counter() - started_at
+        host.record_success(latency)
+        HOST_LATENCY.observe(latency, host.url)
+        return result
@@ -0,0 +1,115 @@
+# encoding: utf-8
+import math
+
+# 指数加权的半衰期（秒）、ATR 的 K 线周期（秒）和平滑周期、波动率可用前的最少收益率样本数
+DEFAULT_HALFLIFE = 3600.0
+DEFAULT_BAR = 60.0
+DEFAULT_ATR_PERIOD = 14
+DEFAULT_MIN_SAMPLES = 30
+
+
+class StreamingIndicators:
+    """单个交易对的流式指标：每个 tick O(1) 增量更新，不回扫窗口，内存固定
+
+    - ewma：价格的指数加权均值
+    - 收益率波动：对数收益率按时间间隔归一化（r / sqrt(dt)）后，用 Welford 式的
+      指数加权增量公式估计每秒方差；权重按时间衰减（半衰期 halflife 秒），
+      1 秒推送和 60 秒轮询得到的波动率可直接比较
+    - zscore：最新一笔收益率相对更新前波动率的标准分
+    - atr：按 bar 秒聚合高/低/收，Wilder 平滑的真实波幅
+    """
+
+    __slots__ = (
+        "halflife", "bar", "atr_period", "min_samples",
+        "count", "last_timestamp", "last_price", "ewma",
+        "mean", "variance", "zscore",
+        "bar_start", "bar_high", "bar_low", "bar_close", "previous_close", "atr",
+    )
+
+    def __init__(self, halflife=DEFAULT_HALFLIFE, bar=DEFAULT_BAR,
+                 atr_period=DEFAULT_ATR_PERIOD, min_samples=DEFAULT_MIN_SAMPLES):
+        self.halflife = halflife
+        self.bar = bar
+        self.atr_period = atr_period
+        self.min_samples = min_samples
+        # 收益率样本数
+        self.count = 0
+        self.last_timestamp = None
+        self.last_price = None
+        self.ewma = None
+        # 归一化收益率的指数加权均值和方差（每秒）
+        self.mean = 0.0
+        self.variance = 0.0
+        self.zscore = None
+        self.bar_start = None
+        self.bar_high = None
+        self.bar_low = None
+        self.bar_close = None
+        self.previous_close = None
+        self.atr = None
+
+    def update(self, timestamp, price):
+        if price <= 0:
+            return
+        self._update_bar(timestamp, price)
+        if self.last_timestamp is None:
+            self.last_timestamp, self.last_price, self.ewma = timestamp, price, price
+            return
+        dt = timestamp - self.last_timestamp
+        if dt <= 0:
+            # 同一时刻的多次推送只更新最新价格
+            self.last_price = price
+            return
+        alpha = 1.0 - math.exp(-dt * math.log(2) / self.halflife)
+        self.ewma += alpha * (price - self.ewma)
+
+        value = math.log(price / self.last_price) / math.sqrt(dt)
+        diff = value - self.mean
+        if self.count >= self.min_samples and self.variance > 0:
+            self.zscore = diff / math.sqrt(self.variance)
+        # 指数加权的 Welford 增量更新（West 1979）
+        increment = alpha * diff
+        self.mean += increment
+        self.variance = (1.0 - alpha) * (self.variance + diff * increment)
+        self.count += 1
+        self.last_timestamp, self.last_price = timestamp, price
+
+    def _update_bar(self, timestamp, price):
+        if self.bar_start is None:
+            self.bar_start, self.bar_high, self.bar_low = timestamp, price, price
+        elif timestamp >= self.bar_start + self.bar:
+            high, low = self.bar_high, self.bar_low
+            if self.previous_close is None:
+                true_range = high - low
+            else:
+                true_range = max(
+                    high - low, abs(high - self.previous_close), abs(low - self.previous_close)
+                )
+            if self.atr is None:
+                self.atr = true_range
+            else:
+                self.atr += (true_range - self.atr) / self.atr_period
+            self.previous_close = self.bar_close
+            # 对齐到 bar 边界，长时间无数据时跳过空 bar
+            self.bar_start += (timestamp - self.bar_start) // self.bar * self.bar
+            self.bar_high, self.bar_low = price, price
+        else:
+            self.bar_high = max(self.bar_high, price)
+            self.bar_low = min(self.bar_low, price)
+        self.bar_close = price
+
+    @property
+    def ready(self):
+        return self.count >= self.min_samples and self.variance > 0
+
+    def volatility(self, seconds):
+        """seconds 秒收益率的标准差（百分比），样本不足时返回 None"""
+        if not self.ready:
+            return None
+        return math.sqrt(self.variance * seconds) * 100
+
+    def atr_percent(self):
+        """ATR 占均价的百分比"""
+        if self.atr is None or not self.ewma:
+            return None
+        return self.atr / self.ewma * 100
@@ -0,0 +1,128 @@
+# encoding: utf-8
+from collections import deque
+
+
+def _is_word_char(char):
+    # 只把ASCII字母数字和下划线视为单词字符，中文紧邻英文关键词时仍可整词匹配
+    return char.isascii() and (char.isalnum() or char == "_")
+
+
+class KeywordMatcher:
+    """基于 Aho-Corasick 自动机的多关键词匹配器
+
+    一次扫描文本即可找出所有命中的关键词，匹配耗时与关键词数量无关。
+    支持忽略大小写和整词匹配；关键词列表变化时只增删变化的关键词，
+    失配指针在下一次匹配前重新计算。
+    """
+
+    def __init__(self, keywords=(), case_sensitive=False, whole_word=False):
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        # 节点 i 的转移表、失配指针、以该节点结尾的关键词、输出链接
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        self._dict_link = [0]
+        self._keywords = {}
+        self._dirty = False
+        self.update(keywords)
+
+    def __len__(self):
+        return len(self._keywords)
+
+    @property
+    def keywords(self):
+        return list(self._keywords.values())
+
+    def _normalize(self, text):
+        return text if self.case_sensitive else text.lower()
+
+    def add(self, keyword):
+        key = self._normalize(keyword)
+        if not key or key in self._keywords:
+            return
+        self._keywords[key] = keyword
+        node = 0
+        for char in key:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+                self._dict_link.append(0)
+            node = next_node
+        self._output[node].add(key)
+        self._dirty = True
+
+    def remove(self, keyword):
+        key = self._normalize(keyword)
+        if self._keywords.pop(key, None) is None:
+            return
+        node = 0
+        for char in key:
+            node = self._goto[node][char]
+        self._output[node].discard(key)
+        self._dirty = True
+
+    def update(self, keywords):
+        """增量更新为新的关键词列表"""
+        wanted = {self._normalize(keyword): keyword for keyword in keywords if keyword}
+        for key in list(self._keywords):
+            if key not in wanted:
+                self.remove(self._keywords[key])
+        for key, keyword in wanted.items():
+            if key not in self._keywords:
+                self.add(keyword)
+
+    def _build(self):
+        """广度优先计算失配指针和输出链接"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._dict_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail
+                self._dict_link[child] = fail if self._output[fail] else self._dict_link[fail]
+                queue.append(child)
+        self._dirty = False
+
+    def find(self, text):
+        """返回文本中命中的关键词（保持配置中的原始写法，按首次出现顺序）"""
+        if not text or not self._keywords:
+            return []
+        if self._dirty:
+            self._build()
+        text = self._normalize(text)
+        goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+        matched = {}
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            candidate = node if output[node] else dict_link[node]
+            while candidate:
+                for key in output[candidate]:
+                    if key not in matched and self._accept(text, end, len(key)):
+                        matched[key] = self._keywords[key]
+                candidate = dict_link[candidate]
+        return list(matched.values())
+
+    def _accept(self, text, end, length):
+        if not self.whole_word:
+            return True
+        start = end - length + 1
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if end + 1 < len(text) and _is_word_char(text[end + 1]):
+            return False
+        return True
@@ -1,29 +1,174 @@
 # encoding: utf-8
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+from utils.rate_limit import TokenBucket
+
+CONSOLE_FORMAT = "[%(asctime)s] %(levelname)s: %(message)s"
+FILE_FORMAT = "[%(asctime)s] %(levelname)s [%(module)s:%(lineno)d]: %(message)s"
+
+# 异步模式下的后台写入线程，shutdown_logging 时停止
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化日志：每条记录输出一行 JSON"""
+
+    def format(self, record):
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """高频 INFO 日志限流：同一调用位置每 period 秒最多输出 rate 条
+
+    WARNING 及以上级别不受限制。被丢弃的条数附加在该位置下一条输出的日志后。
+    """
+
+    def __init__(self, rate, period=60.0, level=logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.period = period
+        self.level = level
+        # (文件, 行号) -> [令牌桶, 已丢弃条数]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [TokenBucket(self.rate, self.period), 0]
+            if not site[0].try_acquire():
+                site[1] += 1
+                return False
+            dropped, site[1] = site[1], 0
+        if dropped:
+            record.msg = f"{record.msg} [已省略{dropped}条同类日志]"
+        return True
+
+
+class _BatchFlushMixin:
+    """由 BatchQueueListener 在每批记录写完后统一 flush，而不是每条记录 flush 一次"""
+
+    auto_flush = True
+
+    def flush(self):
+        if self.auto_flush:
+            super().flush()
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchRotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    pass
+
+
+class BatchQueueListener(QueueListener):
+    """后台线程写日志：一次取出队列中积压的多条记录，写完后统一 flush"""
+
+    def __init__(self, log_queue, *handlers, batch_size=512, yield_every=16):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.yield_every = yield_every
+        for handler in handlers:
+            if isinstance(handler, _BatchFlushMixin):
+                handler.auto_flush = False
+
+    def _monitor(self):
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            for count, record in enumerate(batch, 1):
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    self.handle(record)
+                if count % self.yield_every == 0:
+                    # 主动释放 GIL，避免长批次拖慢事件循环线程的唤醒
+                    time.sleep(0)
+            for handler in self.handlers:
+                if isinstance(handler, _BatchFlushMixin):
+                    handler.flush_batch()
+            for _ in batch:
+                self.queue.task_done()
+
+
+def setup_logging(async_mode=False, json_format=False, info_rate=0, log_file="sbot.log"):
+    """配置根日志记录器
+
+    async_mode 为 True 时调用方只把记录放入内存队列，由后台线程批量写入控制台和文件，
+    不在事件循环中做阻塞的磁盘写入；info_rate 大于 0 时限制每个调用位置每分钟的
+    INFO 日志条数。
+    """
+    global _listener
 
-def setup_logging():
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
-    console_handler = logging.StreamHandler()
+    handler_class = BatchStreamHandler if async_mode else logging.StreamHandler
+    console_handler = handler_class(sys.stderr)
     console_handler.setFormatter(
-        logging.Formatter("[%(asctime)s] %(levelname)s: %(message)s")
+        JsonFormatter() if json_format else logging.Formatter(CONSOLE_FORMAT)
     )
 
     # 文件处理器（保持UTF-8编码）
-    file_handler = RotatingFileHandler(
-        "sbot.log",
+    handler_class = BatchRotatingFileHandler if async_mode else RotatingFileHandler
+    file_handler = handler_class(
+        log_file,
         maxBytes=10 * 1024 * 1024,
         backupCount=5,
         encoding="utf-8",
     )
     file_handler.setFormatter(
-        logging.Formatter(
-            "[%(asctime)s] %(levelname)s [%(module)s:%(lineno)d]: %(message)s"
-        )
+        JsonFormatter() if json_format else logging.Formatter(FILE_FORMAT)
     )
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
\ No newline at end of file
+    if not async_mode:
+        handlers = [console_handler, file_handler]
+    else:
+        log_queue = queue.Queue()
+        _listener = BatchQueueListener(log_queue, console_handler, file_handler)
+        _listener.start()
+        handlers = [QueueHandler(log_queue)]
+
+    for handler in handlers:
+        if info_rate > 0:
+            handler.addFilter(RateLimitFilter(info_rate))
+        logger.addHandler(handler)
+
+
+def shutdown_logging():
+    """停止后台写入线程，确保队列中的日志全部写入"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,91 @@
+# encoding: utf-8
+import asyncio
+import json
+import logging
+import os
+
+
+class MessageCursors:
+    """各频道已处理到的消息 ID，持久化到 JSON 文件，重连或重启后据此补拉离线消息
+
+    消息接入时 begin，处理结束（成功、失败或放弃重试）时 finish。保存的位置是
+    该频道所有已接入消息中"此前均已处理完"的最大 ID：较早的消息还在重试时位置
+    不会越过它，进程退出后补拉会重新获取这些消息。
+    """
+
+    def __init__(self, path, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        # 频道 -> 已处理到的消息 ID
+        self.positions = self._load()
+        # 频道 -> 已接入的最大消息 ID，用于丢弃补拉与实时消息之间的重复
+        self.seen = dict(self.positions)
+        # 频道 -> 已接入但尚未处理完的消息 ID
+        self.outstanding = {}
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return {int(chat_id): message_id for chat_id, message_id in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            logging.error(f"读取消息位置文件失败，将不补拉离线消息: {str(e)}")
+            return {}
+
+    def get(self, chat_id):
+        return self.positions.get(chat_id)
+
+    def begin(self, chat_id, message_id):
+        """记录接入的消息，已接入过的消息返回 False"""
+        if message_id <= self.seen.get(chat_id, 0):
+            return False
+        self.seen[chat_id] = message_id
+        self.outstanding.setdefault(chat_id, set()).add(message_id)
+        return True
+
+    def finish(self, chat_id, message_id):
+        pending = self.outstanding.get(chat_id)
+        if pending is None:
+            return
+        pending.discard(message_id)
+        position = min(pending) - 1 if pending else self.seen[chat_id]
+        if not pending:
+            del self.outstanding[chat_id]
+        if position > self.positions.get(chat_id, 0):
+            self.positions[chat_id] = position
+            self._dirty = True
+
+    def _snapshot(self):
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return {str(chat_id): message_id for chat_id, message_id in self.positions.items()}
+
+    def _write(self, data):
+        """原子写入文件（先写临时文件再替换）"""
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self._dirty = True
+            logging.error(f"保存消息位置失败: {str(e)}")
+
+    def flush(self):
+        data = self._snapshot()
+        if data is not None:
+            self._write(data)
+
+    async def run(self):
+        """定期保存（在事件循环中取快照，在线程中写文件），退出时保存最后一次"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                data = self._snapshot()
+                if data is not None:
+                    await asyncio.to_thread(self._write, data)
+        finally:
+            self.flush()
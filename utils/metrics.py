@@ -0,0 +1,210 @@
+# encoding: utf-8
+"""进程内指标：计数器、仪表盘和直方图，通过本地 HTTP /metrics 以 Prometheus 文本格式暴露
+
+指标在使用它的模块中定义，采集只涉及字典查找和几次加法，可以常驻生产环境:
+    FETCH_LATENCY = REGISTRY.histogram("sbot_price_fetch_seconds", "价格拉取耗时", ["symbol"])
+    FETCH_LATENCY.observe(0.12, "BTCUSDT")
+
+指标只在事件循环线程中更新，不做加锁。
+"""
+import asyncio
+import bisect
+import logging
+import math
+import time
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # 标签值元组 -> 数值
+        self._values = {}
+        self._function = None
+
+    def set_function(self, function):
+        """采集时调用 function 获取数值，返回单个数值或 {标签值元组: 数值}"""
+        self._function = function
+
+    def _samples(self):
+        if self._function is None:
+            return self._values.items()
+        result = self._function()
+        if isinstance(result, dict):
+            return result.items()
+        return [((), result)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._samples():
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # 每个标签组合：[各分桶计数（非累计）..., 总和, 总数]
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 3)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def time(self, *labels):
+        """计时上下文：with HISTOGRAM.time("label"): ..."""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        bounds = self.buckets + (math.inf,)
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                label_text = _format_labels(self.labels, labels, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{label_text} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started_at, *self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.error(f"采集指标{metric.name}失败: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "sbot_event_loop_lag_seconds",
+    "事件循环调度延迟",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+async def monitor_event_loop_lag(interval=0.5):
+    """定时休眠并测量实际唤醒时间比预期晚了多少"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - expected, 0.0))
+
+
+async def _handle_request(reader, writer, registry):
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        method, path = head.split(b" ", 2)[:2]
+        if method == b"GET" and path.split(b"?")[0] == b"/metrics":
+            status, content_type, body = "200 OK", CONTENT_TYPE, registry.render()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+        body = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii")
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host="127.0.0.1", port=9108, registry=REGISTRY):
+    """启动 /metrics HTTP 服务，返回 asyncio.Server"""
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_request(reader, writer, registry), host, port
+    )
+    logging.info(f"指标服务已启动: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,188 @@
+# encoding: utf-8
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+# 价格历史默认保留时长（秒）
+PRICE_HISTORY_MAX_AGE = 24 * 60 * 60
+
+
+class PriceHistory:
+    """单个交易对的定长环形价格历史
+
+    时间戳使用 epoch 秒（float），价格和时间戳分别存放在 array('d') 中，
+    内存占用固定为 capacity * 16 字节。追加和过期淘汰均摊 O(1)，
+    按时间查询价格 O(log n)；通过 track_window 注册的窗口使用单调队列，
+    窗口最高价/最低价查询均摊 O(1)，队列长度不超过窗口内的记录数。
+
+    resolution 为记录的最小时间间隔（秒）：同一间隔内的多次推送只保留最新的一条，
+    推送频率不固定的流式行情也能用固定容量覆盖 max_age 的历史。
+    """
+
+    def __init__(self, capacity=86400, max_age=PRICE_HISTORY_MAX_AGE, resolution=0.0):
+        self.capacity = max(int(capacity), 1)
+        self.max_age = max_age
+        self.resolution = resolution
+        # 最后一条记录所在间隔的起始时间
+        self._slot_start = None
+        self.timestamps = array("d", bytes(8 * self.capacity))
+        self.prices = array("d", bytes(8 * self.capacity))
+        self._start = 0
+        self._size = 0
+        # 窗口秒数 -> (最高价单调队列, 最低价单调队列)，队列元素为 (时间戳, 价格)
+        self._windows = {}
+
+    def __len__(self):
+        return self._size
+
+    def _index(self, offset):
+        return (self._start + offset) % self.capacity
+
+    def _pop_oldest(self):
+        self._start = (self._start + 1) % self.capacity
+        self._size -= 1
+
+    def append(self, timestamp, price):
+        """追加一条价格记录，并淘汰超出容量或过期的旧记录"""
+        if self._size and timestamp < self.last_timestamp():
+            # 保证时间戳单调递增，乱序记录按最新时间处理
+            timestamp = self.last_timestamp()
+
+        if self._size and timestamp - self._slot_start < self.resolution:
+            # 与最后一条记录在同一间隔内，覆盖为最新价格
+            index = self._index(self._size - 1)
+        else:
+            if self._size == self.capacity:
+                self._pop_oldest()
+            index = self._index(self._size)
+            self._size += 1
+            self._slot_start = timestamp
+        self.timestamps[index] = timestamp
+        self.prices[index] = price
+
+        # 保留最后一条不晚于 cutoff 的记录，price_at(now - max_age) 仍能取到窗口起点价格
+        cutoff = timestamp - self.max_age
+        while self._size > 1 and self.timestamps[self._index(1)] <= cutoff:
+            self._pop_oldest()
+
+        # 窗口队列记录每一次推送（极值不受 resolution 影响），并淘汰窗口外的元素
+        oldest = self.timestamps[self._start]
+        for seconds, (max_queue, min_queue) in self._windows.items():
+            while max_queue and max_queue[-1][1] <= price:
+                max_queue.pop()
+            max_queue.append((timestamp, price))
+            while min_queue and min_queue[-1][1] >= price:
+                min_queue.pop()
+            min_queue.append((timestamp, price))
+            window_cutoff = max(timestamp - seconds, oldest)
+            while max_queue[0][0] < window_cutoff:
+                max_queue.popleft()
+            while min_queue[0][0] < window_cutoff:
+                min_queue.popleft()
+
+    def track_window(self, seconds):
+        """注册需要频繁查询最高价/最低价的时间窗口"""
+        if seconds in self._windows:
+            return
+        max_queue, min_queue = deque(), deque()
+        self._windows[seconds] = (max_queue, min_queue)
+        if not self._size:
+            return
+        start = self._bisect(self.last_timestamp() - seconds)
+        for offset in range(start, self._size):
+            index = self._index(offset)
+            timestamp, price = self.timestamps[index], self.prices[index]
+            while max_queue and max_queue[-1][1] <= price:
+                max_queue.pop()
+            max_queue.append((timestamp, price))
+            while min_queue and min_queue[-1][1] >= price:
+                min_queue.pop()
+            min_queue.append((timestamp, price))
+
+    def retain_windows(self, windows):
+        """只保留 windows 中的窗口，注销不再使用的单调队列"""
+        for seconds in list(self._windows):
+            if seconds not in windows:
+                del self._windows[seconds]
+
+    def _bisect(self, timestamp):
+        """返回第一个时间戳 >= timestamp 的逻辑位置"""
+        if not self._size:
+            return 0
+        end = self._start + self._size
+        if end <= self.capacity:
+            return bisect_left(self.timestamps, timestamp, self._start, end) - self._start
+        # 数据跨越缓冲区末尾，分两段查找
+        end -= self.capacity
+        if timestamp <= self.timestamps[self.capacity - 1]:
+            return bisect_left(self.timestamps, timestamp, self._start) - self._start
+        offset = self.capacity - self._start
+        return offset + bisect_left(self.timestamps, timestamp, 0, end)
+
+    def last_timestamp(self):
+        if not self._size:
+            return None
+        return self.timestamps[self._index(self._size - 1)]
+
+    def last(self):
+        """最新价格"""
+        if not self._size:
+            return None
+        return self.prices[self._index(self._size - 1)]
+
+    def first(self, seconds=None, now=None):
+        """最近 seconds 秒内的第一条价格，未指定窗口时返回最早的价格"""
+        if not self._size:
+            return None
+        if seconds is None:
+            return self.prices[self._start]
+        now = self.last_timestamp() if now is None else now
+        offset = self._bisect(now - seconds)
+        if offset >= self._size:
+            return None
+        return self.prices[self._index(offset)]
+
+    def price_at(self, timestamp):
+        """timestamp 时刻（含）之前的最后一条价格，早于全部记录时返回 None"""
+        offset = self._bisect(timestamp)
+        if offset < self._size and self.timestamps[self._index(offset)] == timestamp:
+            return self.prices[self._index(offset)]
+        if offset == 0:
+            return None
+        return self.prices[self._index(offset - 1)]
+
+    def window_max(self, seconds, now=None):
+        """最近 seconds 秒内的最高价"""
+        return self._window_extreme(seconds, now, 0)
+
+    def window_min(self, seconds, now=None):
+        """最近 seconds 秒内的最低价"""
+        return self._window_extreme(seconds, now, 1)
+
+    def _window_extreme(self, seconds, now, side):
+        if not self._size:
+            return None
+        now = self.last_timestamp() if now is None else now
+        cutoff = max(now - seconds, self.timestamps[self._start])
+
+        queues = self._windows.get(seconds)
+        if queues is not None:
+            queue = queues[side]
+            while queue and queue[0][0] < cutoff:
+                queue.popleft()
+            return queue[0][1] if queue else None
+
+        # 未注册的窗口退化为区间扫描
+        prices = [
+            self.prices[self._index(offset)]
+            for offset in range(self._bisect(cutoff), self._size)
+        ]
+        if not prices:
+            return None
+        return max(prices) if side == 0 else min(prices)
+
+    def items(self):
+        """按时间顺序返回全部 (时间戳, 价格) 记录"""
+        for offset in range(self._size):
+            index = self._index(offset)
+            yield self.timestamps[index], self.prices[index]
@@ -0,0 +1,83 @@
+# encoding: utf-8
+import asyncio
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """令牌桶限流器：每 period 秒最多 rate 个令牌，允许突发至 capacity"""
+
+    def __init__(self, rate, period=60.0, capacity=None):
+        self.rate = rate
+        self.period = period
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate / self.period
+        )
+        self.updated_at = now
+
+    def try_acquire(self):
+        """尝试立即获取一个令牌"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """距离下一个令牌可用还需等待的秒数"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.period / self.rate
+
+    async def acquire(self):
+        """等待直到获取一个令牌"""
+        while not self.try_acquire():
+            await asyncio.sleep(self.wait_time())
+
+
+class SlidingWindowLimiter:
+    """滑动窗口限流器：任意 period 秒内最多放行 limit 次，没有令牌桶的额外突发"""
+
+    def __init__(self, limit, period=60.0):
+        self.limit = max(int(limit), 1)
+        self.period = period
+        # 窗口内每次放行的时间
+        self.events = deque()
+        # 服务端限流后暂停放行的截止时间
+        self.blocked_until = 0.0
+
+    def _expire(self, now):
+        while self.events and now - self.events[0] >= self.period:
+            self.events.popleft()
+
+    def try_acquire(self):
+        """尝试立即放行一次"""
+        if self.wait_time() > 0:
+            return False
+        self.events.append(time.monotonic())
+        return True
+
+    def wait_time(self):
+        """距离下一次可以放行还需等待的秒数"""
+        now = time.monotonic()
+        self._expire(now)
+        wait = self.blocked_until - now
+        if len(self.events) >= self.limit:
+            wait = max(wait, self.events[0] + self.period - now)
+        return max(wait, 0.0)
+
+    def block(self, seconds):
+        """seconds 秒内不再放行"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """等待直到可以放行"""
+        while not self.try_acquire():
+            await asyncio.sleep(self.wait_time())
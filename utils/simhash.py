@@ -0,0 +1,105 @@
+# encoding: utf-8
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+_URL = re.compile(r"(https?://|t\.me/|www\.)\S+", re.IGNORECASE)
+_NON_TEXT = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def simhash(text, ngram=3, bits=64):
+    """计算文本的 SimHash 指纹
+
+    使用字符 n-gram 作为特征（中英文通用），去除链接、空白和标点后再切分，
+    因此转发时增删少量字符、链接或表情的文本指纹仍然接近。
+    """
+    text = _NON_TEXT.sub("", _URL.sub("", text.lower()))
+    if len(text) < ngram:
+        features = [text] if text else []
+    else:
+        features = [text[i : i + ngram] for i in range(len(text) - ngram + 1)]
+
+    weights = [0] * bits
+    for feature in features:
+        value = int.from_bytes(
+            hashlib.blake2b(feature.encode("utf-8"), digest_size=bits // 8).digest(),
+            "big",
+        )
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """近似重复检测索引：查找汉明距离不超过 max_distance 的已有指纹
+
+    指纹按 max_distance + 1 段分桶（抽屉原理保证近似指纹至少有一段完全相同），
+    查询只比较同桶候选。条目按 ttl 过期，超过 maxsize 时淘汰最早的条目。
+    """
+
+    def __init__(self, max_distance=3, bits=64, ttl=86400.0, maxsize=10000):
+        self.max_distance = max_distance
+        self.bits = bits
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.bands = max_distance + 1
+        self.band_bits = bits // self.bands
+        # 指纹 -> (写入时间, 关联值)
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in range(self.bands)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [
+            fingerprint >> (band * self.band_bits) & mask for band in range(self.bands)
+        ]
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            fingerprint, (added_at, _) = next(iter(self._entries.items()))
+            if added_at >= cutoff and len(self._entries) <= self.maxsize:
+                break
+            self._discard(fingerprint)
+
+    def _discard(self, fingerprint):
+        self._entries.pop(fingerprint, None)
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(fingerprint)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def add(self, fingerprint, value=None):
+        self._discard(fingerprint)
+        self._entries[fingerprint] = (time.monotonic(), value)
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            self._buckets[band].setdefault(key, set()).add(fingerprint)
+        self._expire()
+
+    def find(self, fingerprint):
+        """返回最接近的已有指纹关联的值，没有近似指纹时返回 None"""
+        self._expire()
+        best = None
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for candidate in self._buckets[band].get(key, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+        if best is None:
+            return None
+        return self._entries[best[1]][1]
@@ -0,0 +1,138 @@
+# encoding: utf-8
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from array import array
+
+# 每条记录：时间戳（epoch 秒）+ 价格，均为本机字节序的 double
+RECORD = struct.Struct("dd")
+
+
+class TickStore:
+    """按交易对存储价格 tick 的追加式二进制文件
+
+    每个交易对一个定长记录文件（<目录>/<交易对>.ticks）。写入由后台线程
+    批量完成，调用方 append 不阻塞事件循环；启动时通过 mmap 二分查找
+    只读取最近窗口内的记录，文件再大也不影响启动速度。
+    """
+
+    def __init__(self, directory, batch_size=1000, flush_interval=1.0):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.Queue()
+        self._files = {}
+        self._thread = None
+
+    def _path(self, symbol):
+        return os.path.join(self.directory, f"{symbol}.ticks")
+
+    def load_window(self, symbol, since):
+        """读取时间戳 >= since 的记录，返回 (时间戳数组, 价格数组)"""
+        timestamps, prices = array("d"), array("d")
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return timestamps, prices
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            count = size // RECORD.size
+            if count == 0:
+                return timestamps, prices
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                low, high = 0, count
+                while low < high:
+                    middle = (low + high) // 2
+                    if RECORD.unpack_from(mm, middle * RECORD.size)[0] < since:
+                        low = middle + 1
+                    else:
+                        high = middle
+                records = array("d")
+                records.frombytes(mm[low * RECORD.size : count * RECORD.size])
+        return records[0::2], records[1::2]
+
+    def restore(self, symbol, since, max_stale=1_000_000):
+        """读取最近窗口内的记录；窗口之前的旧记录超过 max_stale 条时压缩文件
+
+        需在该交易对开始写入之前调用。
+        """
+        timestamps, prices = self.load_window(symbol, since)
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return timestamps, prices
+        stale = os.path.getsize(path) // RECORD.size - len(timestamps)
+        if stale > max_stale:
+            records = array("d", bytes(RECORD.size * len(timestamps)))
+            records[0::2] = timestamps
+            records[1::2] = prices
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                records.tofile(f)
+            os.replace(temp_path, path)
+            logging.info(f"已压缩{symbol}价格记录文件，清理{stale}条过期记录")
+        return timestamps, prices
+
+    def append(self, symbol, timestamp, price):
+        """加入写入队列，由后台线程批量写入"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="tick_store_writer", daemon=True
+            )
+            self._thread.start()
+        self._queue.put((symbol, timestamp, price))
+
+    def close(self):
+        """写入剩余记录并关闭文件（阻塞，应在线程池中调用）"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _open(self, symbol):
+        f = self._files.get(symbol)
+        if f is None:
+            f = open(self._path(symbol), "ab")
+            # 截掉异常退出时写了一半的记录，保证记录对齐
+            size = f.tell()
+            if size % RECORD.size:
+                f.truncate(size - size % RECORD.size)
+                f.seek(0, os.SEEK_END)
+            self._files[symbol] = f
+        return f
+
+    def _run(self):
+        pending = {}
+        count = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = ()
+            if item:
+                symbol, timestamp, price = item
+                pending.setdefault(symbol, array("d")).extend((timestamp, price))
+                count += 1
+            if item is None or count >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(pending)
+                pending = {}
+                count = 0
+                deadline = time.monotonic() + self.flush_interval
+            if item is None:
+                for f in self._files.values():
+                    f.close()
+                self._files = {}
+                return
+
+    def _flush(self, pending):
+        for symbol, records in pending.items():
+            try:
+                f = self._open(symbol)
+                records.tofile(f)
+                f.flush()
+            except OSError as e:
+                logging.error(f"写入{symbol}价格记录失败: {str(e)}")
@@ -0,0 +1,173 @@
+# encoding: utf-8
+import asyncio
+import logging
+import math
+import random
+import time
+
+from utils.metrics import REGISTRY
+
+SCHEDULER_LAG = REGISTRY.histogram(
+    "sbot_scheduler_lag_seconds",
+    "定时任务实际执行时间与计划时间之差",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+SCHEDULER_MISSED = REGISTRY.counter("sbot_scheduler_missed_total", "因严重延迟而跳过的执行次数")
+
+
+class Job:
+    """周期任务：第 n 次执行的计划时间为 origin + phase + n * interval，不随执行耗时漂移"""
+
+    __slots__ = ("key", "interval", "deadline", "tick", "cancelled", "last_lag", "max_lag", "runs")
+
+    def __init__(self, key, interval, deadline):
+        self.key = key
+        self.interval = interval
+        self.deadline = deadline
+        self.tick = 0
+        self.cancelled = False
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.runs = 0
+
+
+class TimingWheel:
+    """分层时间轮：插入和到期均为 O(1)（均摊），与任务数量无关
+
+    第 0 层每个槽对应一个 tick，第 i 层每个槽对应 slots**i 个 tick。
+    底层转完一圈时把上一层当前槽的任务重新分配到下层（级联）。
+    """
+
+    def __init__(self, slots=64, levels=4):
+        self.slots = slots
+        self.levels = levels
+        self.current = 0
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        # 超出最高层范围的任务，最高层转完一圈时重新分配
+        self.overflow = []
+        # 插入时已到期的任务，下次推进时返回
+        self.expired = []
+
+    def insert(self, job):
+        delta = job.tick - self.current
+        if delta <= 0:
+            self.expired.append(job)
+            return
+        span = 1
+        for level in range(self.levels):
+            if delta < span * self.slots:
+                self.wheels[level][(job.tick // span) % self.slots].append(job)
+                return
+            span *= self.slots
+        self.overflow.append(job)
+
+    def _cascade(self, level):
+        span = self.slots**level
+        slot = self.wheels[level][(self.current // span) % self.slots]
+        jobs = slot[:]
+        slot.clear()
+        for job in jobs:
+            if not job.cancelled:
+                self.insert(job)
+
+    def advance(self, tick):
+        """推进到 tick，返回期间到期的任务（不含已取消的任务）"""
+        due, self.expired = self.expired, []
+        while self.current < tick:
+            self.current += 1
+            # 由高到低级联：跨越某层的槽边界时，把该层当前槽的任务下放
+            span = self.slots ** self.levels
+            if self.current % span == 0 and self.overflow:
+                jobs, self.overflow = self.overflow, []
+                for job in jobs:
+                    if not job.cancelled:
+                        self.insert(job)
+            for level in range(self.levels - 1, 0, -1):
+                if self.current % (self.slots**level) == 0:
+                    self._cascade(level)
+            slot = self.wheels[0][self.current % self.slots]
+            if slot:
+                due.extend(slot)
+                slot.clear()
+            if self.expired:
+                due.extend(self.expired)
+                self.expired = []
+        return [job for job in due if not job.cancelled]
+
+
+class WheelScheduler:
+    """基于分层时间轮的周期任务调度器
+
+    单个协程驱动所有任务：每个 tick 唤醒一次，同一 tick 到期的任务合并为一批交给
+    callback(jobs, now)（同步调用，耗时操作应自行创建任务）。任务按固定的计划时间
+    执行，不受执行耗时影响；jitter 为每个任务随机的初始相位（占间隔的比例），
+    用于错开相同间隔的任务。延迟超过一个间隔时跳过错过的执行。
+    """
+
+    def __init__(self, callback, tick=0.05, jitter=0.0, slots=64, levels=4, clock=time.monotonic):
+        self.callback = callback
+        self.tick = tick
+        self.jitter = jitter
+        self.clock = clock
+        self.wheel = TimingWheel(slots, levels)
+        self.jobs = {}
+        self.origin = clock()
+
+    def _tick_of(self, deadline):
+        return math.ceil((deadline - self.origin) / self.tick - 1e-9)
+
+    def add(self, key, interval, delay=0.0):
+        """添加周期任务，首次执行时间为 delay 秒后（加上随机相位）"""
+        self.remove(key)
+        phase = random.uniform(0, self.jitter * interval) if self.jitter else 0.0
+        job = Job(key, interval, self.clock() + delay + phase)
+        job.tick = self._tick_of(job.deadline)
+        self.jobs[key] = job
+        self.wheel.insert(job)
+        return job
+
+    def remove(self, key):
+        job = self.jobs.pop(key, None)
+        if job is not None:
+            # 延迟删除：到期或级联时丢弃
+            job.cancelled = True
+
+    def stats(self):
+        """各任务最近一次和最大的执行延迟（秒）"""
+        return {
+            key: {"last_lag": job.last_lag, "max_lag": job.max_lag, "runs": job.runs}
+            for key, job in self.jobs.items()
+        }
+
+    def run_due(self, now):
+        """推进时间轮并执行到期任务，返回本次执行的任务"""
+        jobs = self.wheel.advance(math.floor((now - self.origin) / self.tick + 1e-9))
+        for job in jobs:
+            lag = now - job.deadline
+            job.last_lag = lag
+            job.max_lag = max(job.max_lag, lag)
+            job.runs += 1
+            SCHEDULER_LAG.observe(lag)
+            # 按计划时间推进，延迟超过一个间隔时跳过错过的执行
+            job.deadline += job.interval
+            if job.deadline <= now:
+                missed = math.floor((now - job.deadline) / job.interval) + 1
+                job.deadline += missed * job.interval
+                SCHEDULER_MISSED.inc(amount=missed)
+            job.tick = self._tick_of(job.deadline)
+            self.wheel.insert(job)
+        if jobs:
+            try:
+                self.callback(jobs, now)
+            except Exception as e:
+                logging.error(f"定时任务执行出错: {str(e)}")
+        return jobs
+
+    async def run(self):
+        while True:
+            # 按绝对时间对齐到下一个 tick，避免累积误差
+            target = self.origin + (self.wheel.current + 1) * self.tick
+            delay = target - self.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.run_due(self.clock())